@@ -0,0 +1,95 @@
+"""Pack transcript mapping exon positions
+
+Revision ID: 5e1c7a9f3b20
+Revises: 91add8ff6b2b
+Create Date: 2026-10-18 14:02:37.218504
+
+"""
+
+from __future__ import unicode_literals
+
+# revision identifiers, used by Alembic.
+revision = '5e1c7a9f3b20'
+down_revision = u'91add8ff6b2b'
+
+import array
+import sys
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import sql
+
+
+def pack(value):
+    positions = array.array(b'i', [int(s) for s in value.split(',') if s])
+    if sys.byteorder == 'big':
+        positions.byteswap()
+    return positions.tostring()
+
+
+def unpack(value):
+    positions = array.array(b'i')
+    positions.fromstring(bytes(value))
+    if sys.byteorder == 'big':
+        positions.byteswap()
+    return ','.join(unicode(i) for i in positions)
+
+
+def convert(source_type, target_type, convert_value):
+    # We add new columns for the converted exon positions, populate them,
+    # drop the old columns, and rename the new columns. Renaming and adding
+    # the NOT NULL constraint uses batch_alter_table for SQLite.
+    connection = op.get_bind()
+
+    op.add_column('transcript_mappings', sa.Column(
+        'exon_starts_new', target_type, nullable=True))
+    op.add_column('transcript_mappings', sa.Column(
+        'exon_stops_new', target_type, nullable=True))
+
+    # Inline table definition we can use in this migration.
+    transcript_mappings = sql.table(
+        'transcript_mappings',
+        sql.column('id', sa.Integer()),
+        sql.column('exon_starts', source_type),
+        sql.column('exon_stops', source_type),
+        sql.column('exon_starts_new', target_type),
+        sql.column('exon_stops_new', target_type))
+
+    result = connection.execute(
+        transcript_mappings.select().with_only_columns([
+            transcript_mappings.c.id,
+            transcript_mappings.c.exon_starts,
+            transcript_mappings.c.exon_stops]))
+
+    # Process a few rows at a time, since they will be read in memory.
+    while True:
+        chunk = result.fetchmany(1000)
+        if not chunk:
+            break
+
+        statement = transcript_mappings.update().where(
+            transcript_mappings.c.id == sql.bindparam('m_id')
+        ).values({'exon_starts_new': sql.bindparam('m_exon_starts'),
+                  'exon_stops_new': sql.bindparam('m_exon_stops')})
+
+        connection.execute(statement, [
+            {'m_id': m.id,
+             'm_exon_starts': convert_value(m.exon_starts),
+             'm_exon_stops': convert_value(m.exon_stops)}
+            for m in chunk])
+
+    with op.batch_alter_table('transcript_mappings') as batch_op:
+        batch_op.drop_column('exon_starts')
+        batch_op.drop_column('exon_stops')
+        batch_op.alter_column('exon_starts_new', new_column_name='exon_starts',
+                              nullable=False, existing_type=target_type)
+        batch_op.alter_column('exon_stops_new', new_column_name='exon_stops',
+                              nullable=False, existing_type=target_type)
+
+
+def upgrade():
+    convert(sa.Text(), sa.LargeBinary(), pack)
+
+
+def downgrade():
+    convert(sa.LargeBinary(), sa.Text(), unpack)
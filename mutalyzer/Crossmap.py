@@ -9,9 +9,87 @@ and stop and the orientation of a transcript.
 """
 #Public classes:
 #    - Crossmap ; Convert from g. to c. or n. notation or vice versa.
+#Public functions:
+#    - get_crossmap ; Get a (possibly shared) Crossmap object.
 
 from __future__ import unicode_literals
 
+import array
+import bisect
+
+from mutalyzer.config import settings
+from mutalyzer import util
+
+
+# In-process cache of Crossmap objects, created on first use.
+_crossmap_cache = None
+
+
+def _get_crossmap_cache():
+    """
+    Get the in-process cache of Crossmap objects.
+
+    Crossmap objects are keyed by their splice sites, CDS and orientation and
+    the cache size is the number of objects (see the `CROSSMAP_CACHE_SIZE`
+    configuration setting).
+
+    @return: The Crossmap cache.
+    @rtype: util.LRUCache
+    """
+    global _crossmap_cache
+    if _crossmap_cache is None:
+        _crossmap_cache = util.LRUCache(settings.CROSSMAP_CACHE_SIZE)
+    return _crossmap_cache
+#_get_crossmap_cache
+
+
+def _reset_crossmap_cache(value):
+    """
+    Discard the Crossmap cache so that it is recreated on next use.
+    """
+    global _crossmap_cache
+    _crossmap_cache = None
+#_reset_crossmap_cache
+
+
+# Recreate the Crossmap cache if configuration is updated.
+settings.on_update(_reset_crossmap_cache, 'CROSSMAP_CACHE_SIZE')
+
+
+def get_crossmap(RNA, CDS, orientation) :
+    """
+    Get a Crossmap object for a transcript.
+
+    Crossmap objects are shared between callers with the same splice sites,
+    CDS and orientation, so they must not be modified.
+
+    @arg RNA: The list of RNA splice sites
+    @type RNA: list or array.array
+    @arg CDS: CDS start and stop (if present, may be empty)
+    @type CDS: list
+    @arg orientation: The orientation of the transcript
+        - 1 = forward
+        - E{-}1 = reverse
+    @type orientation: integer
+
+    @return: A Crossmap object
+    @rtype: Crossmap
+    """
+    cache = _get_crossmap_cache()
+    if isinstance(RNA, array.array):
+        # Packed splice sites are keyed by their bytes.
+        key = RNA.tostring(), tuple(CDS or []), orientation
+    else:
+        key = tuple(RNA), tuple(CDS or []), orientation
+
+    crossmap = cache.get(key)
+    if crossmap is None:
+        crossmap = Crossmap(RNA, CDS, orientation)
+        cache.put(key, crossmap)
+    return crossmap
+#get_crossmap
+
+
 class Crossmap() :
     """
     Convert from I{g.} to I{c.} or I{n.} notation or vice versa.
@@ -45,6 +123,8 @@ class Crossmap() :
         - main2int(s) ; Translate from '*' to __STOP notation.
         - g2x(a) ; Translate from I{g.} notation to I{c.} or I{n.} notation.
         - x2g(a, b) ; Translate I{c.} or I{n.} notation to I{g.} notation.
+        - g2x_many(positions) ; Translate many positions with g2x().
+        - x2g_many(positions) ; Translate many positions with x2g().
         - int2offset(t) ; Convert a tuple of integers to offset-notation.
         - offset2int(s) ; Convert an offset in HGVS notation to an integer.
         - tuple2string(t) ; Convert a tuple (main, offset) in __STOP notation
@@ -68,9 +148,12 @@ class Crossmap() :
                                the RNA list.
             - __trans_start  ; Transcription start site in I{c.} notation.
             - __trans_end    ; Transcription end side in I{c.} notation.
+            - __x_starts     ; The oriented I{c.} or I{n.} positions of the
+                               exon starts, used for binary search in x2g().
 
-        @arg RNA: The list of RNA splice sites
-        @type RNA: list
+        @arg RNA: The list of RNA splice sites (a packed array is copied
+            as is)
+        @type RNA: list or array.array
         @arg CDS: CDS start and stop (if present, may be empty)
         @type CDS: list
         @arg orientation: The orientation of the transcript
@@ -86,7 +169,10 @@ class Crossmap() :
 
         self.__STOP = None
         self.__crossmapping = len(RNA) * [None]
-        self.RNA = list(RNA)
+        if isinstance(RNA, array.array):
+            self.RNA = RNA[:]
+        else:
+            self.RNA = list(RNA)
         self.CDS = list(CDS)
         self.orientation = orientation
 
@@ -98,6 +184,11 @@ class Crossmap() :
 
         if not self.__STOP :
             self.__STOP = self.__trans_end
+
+        # The crossmapping is monotone in the direction of the transcript,
+        # so the oriented exon starts are sorted.
+        self.__x_starts = [orientation * self.__crossmapping[i]
+                           for i in xrange(0, len(RNA), 2)]
     #__init__
 
     def __plus(self, a, b) :
@@ -315,25 +406,39 @@ class Crossmap() :
             return (self.__crossmapping[RNAlen - y - 1],
                     d * (a - self.RNA[RNAlen - y - 1]))
 
-        for i in xrange(RNAlen) : # A "normal" position.
-            if i % 2 :            # We're checking the intron positions.
-                if self.RNA[i] < a and a < self.RNA[i + 1] : # Intron.
-                    if d * (a - self.RNA[i]) > d * (self.RNA[i + 1] - a) :
-                        # The position was closer to the next exon.
-                        return (self.__crossmapping[i + 1 - c],
-                                -d * (self.RNA[i + 1 - c] - a))
-                    # The position was closer to the previous exon.
-                    return (self.__crossmapping[i + c],
-                            d * (a - self.RNA[i + c]))
-                #if
-            else :                # We're checking the exon positions.
-                if self.RNA[i] <= a and a <= self.RNA[i + 1] :
-                    return (self.__plus(self.__crossmapping[i + c],
-                                        d * (a - self.RNA[i + c])), 0)
-                #if
-        #for
+        # A "normal" position. Find the first exon (even i) or intron (odd
+        # i) containing it, where exons include their boundaries.
+        i = bisect.bisect_left(self.RNA, a)
+        if self.RNA[i] > a or i % 2 :
+            i -= 1
+
+        if i % 2 :                # It is in an intron.
+            if d * (a - self.RNA[i]) > d * (self.RNA[i + 1] - a) :
+                # The position was closer to the next exon.
+                return (self.__crossmapping[i + 1 - c],
+                        -d * (self.RNA[i + 1 - c] - a))
+            # The position was closer to the previous exon.
+            return (self.__crossmapping[i + c],
+                    d * (a - self.RNA[i + c]))
+        #if
+        return (self.__plus(self.__crossmapping[i + c],
+                            d * (a - self.RNA[i + c])), 0)
     #g2x
 
+    def g2x_many(self, positions) :
+        """
+        Translate many I{g.} positions to I{c.} or I{n.} notation.
+
+        @arg positions: The genomic positions that must be translated
+        @type positions: iterable(integer)
+
+        @return: The I{c.} or I{n.} notation of the positions (see g2x())
+        @rtype: list(tuple(integer, integer))
+        """
+        g2x = self.g2x
+        return [g2x(a) for a in positions]
+    #g2x_many
+
     def x2g(self, a, b) :
         """
         This function calculates either:
@@ -384,11 +489,11 @@ class Crossmap() :
             # It is after the last exon.
             ret = self.RNA[RNAlen - 1] + \
                   d * (a - self.__crossmapping[RNAlen - 1])
-        for i in range(0, RNAlen, 2) : # Is it in an exon?
-            if d * self.__crossmapping[i] <= d * a and \
-               d * a <= d * self.__crossmapping[i + 1] :
-                ret = self.RNA[i + c] - d * \
-                      self.__minusr(self.__crossmapping[i + c], a)
+        # Is it in an exon? Find the last exon starting before it.
+        i = 2 * (bisect.bisect_right(self.__x_starts, d * a) - 1)
+        if i >= 0 and d * a <= d * self.__crossmapping[i + 1] :
+            ret = self.RNA[i + c] - d * \
+                  self.__minusr(self.__crossmapping[i + c], a)
         ret += d * b # Add the intron count.
 
         if a < 0 and self.__crossmapping[d - c] == 1 : # Patch for CDS start on
@@ -397,6 +502,21 @@ class Crossmap() :
         return ret
     #x2g
 
+    def x2g_many(self, positions) :
+        """
+        Translate many I{c.} or I{n.} positions to I{g.} notation.
+
+        @arg positions: The I{n.} or I{c.} positions with their offsets to be
+            translated
+        @type positions: iterable(tuple(integer, integer))
+
+        @return: The I{g.} positions (see x2g())
+        @rtype: list(integer)
+        """
+        x2g = self.x2g
+        return [x2g(a, b) for a, b in positions]
+    #x2g_many
+
     def int2main(self, a) :
         """
         This method converts the __STOP notation to the '*' notation.
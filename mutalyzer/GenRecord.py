@@ -10,6 +10,7 @@ search for them each time.
 # Public classes:
 #     - PList     ; Store a general location and a list of splice sites.
 #     - Locus     ; Store data about the mRNA and CDS splice sites.
+#     - ReferenceCDS ; Store the CDS of a transcript and its translations.
 #     - Gene      ; Store a list of Locus objects and the orientation.
 #     - Record    ; Store a geneList and other additional information.
 #     - GenRecord ; Convert a GenBank record to a nested dictionary.
@@ -17,13 +18,98 @@ search for them each time.
 
 from __future__ import unicode_literals
 
+import bisect
+
+from Bio.Alphabet import IUPAC
+from Bio.Data import CodonTable
+
 from mutalyzer import util
 from mutalyzer import Crossmap
+from mutalyzer.config import settings
 
 
 SPLICE_ALARM = 2
 SPLICE_WARN = 5
 
+# Splice the transcript sequence from the CDS start.
+_nsplice = util.__nsplice
+
+# Number of codons translated at once when looking for the stop codon of an
+# out of frame variant protein.
+TRANSLATION_CHUNK_SIZE = 100
+
+
+# In-process cache of ReferenceCDS objects, created on first use.
+_cds_cache = None
+
+
+def _get_cds_cache():
+    """
+    Get the in-process cache of ReferenceCDS objects.
+
+    ReferenceCDS objects are keyed by record checksum and the mRNA and CDS
+    splice sites, orientation and translation table of their transcript, and
+    the cache size is measured in total CDS length, including the 3' UTR (see
+    the `CDS_CACHE_SIZE` configuration setting).
+
+    @return: The ReferenceCDS cache.
+    @rtype: util.LRUCache
+    """
+    global _cds_cache
+    if _cds_cache is None:
+        _cds_cache = util.LRUCache(settings.CDS_CACHE_SIZE,
+                                   weigh=lambda cds: len(cds.downstream))
+    return _cds_cache
+#_get_cds_cache
+
+
+def _reset_cds_cache(value):
+    """
+    Discard the ReferenceCDS cache so that it is recreated on next use.
+    """
+    global _cds_cache
+    _cds_cache = None
+#_reset_cds_cache
+
+
+# Recreate the ReferenceCDS cache if configuration is updated.
+settings.on_update(_reset_cds_cache, 'CDS_CACHE_SIZE')
+
+
+def _translate(sequence, table) :
+    """
+    Translate a sequence, ignoring a partial codon at the end.
+
+    @arg sequence: The sequence.
+    @type sequence: Bio.Seq.Seq
+    @arg table: The translation table.
+    @type table: int
+
+    @return: The protein sequence (including stop codons).
+    @rtype: Bio.Seq.Seq
+    """
+    return sequence[:len(sequence) - len(sequence) % 3].translate(table=table)
+#_translate
+
+
+def _until_stop(protein) :
+    """
+    Cut a protein sequence after the first stop codon (not counting a stop
+    at the first position, since the start codon is always translated as M).
+
+    @arg protein: The protein sequence.
+    @type protein: Bio.Seq.Seq
+
+    @return: The protein sequence up to and including the first stop, or the
+        entire sequence.
+    @rtype: Bio.Seq.Seq
+    """
+    stop = protein.find('*', 1)
+    if stop == -1 :
+        return protein
+    return protein[:stop + 1]
+#_until_stop
+
 
 class PList(object) :
     """
@@ -143,6 +229,140 @@ class Locus(object) :
 #Locus
 
 
+class ReferenceCDS(object) :
+    """
+    The CDS of a transcript in the reference sequence (in the orientation
+    of the transcript) and its translations.
+
+    ReferenceCDS objects only depend on the reference sequence, so they are
+    shared between requests (see Record.reference_cds) and must not be
+    modified.
+
+    Public variables:
+        - cds        ; The CDS sequence.
+        - downstream ; The transcript sequence from the CDS start, this is
+                       the CDS followed by the 3' UTR.
+        - table      ; The translation table.
+    """
+
+    def __init__(self, seq, transcript) :
+        """
+        Splice the CDS from the reference sequence.
+
+        @arg seq: The reference sequence.
+        @type seq: Bio.Seq.Seq
+        @arg transcript: The transcript.
+        @type transcript: Locus
+        """
+        cds = util.splice(seq, transcript.CDS.positionList)
+        cds.alphabet = IUPAC.unambiguous_dna
+        downstream = _nsplice(seq, transcript.mRNA.positionList,
+                              transcript.CDS.location,
+                              transcript.CM.orientation)
+        downstream.alphabet = IUPAC.unambiguous_dna
+        if transcript.CM.orientation == -1 :
+            cds = cds.reverse_complement()
+            downstream = downstream.reverse_complement()
+
+        self.cds = cds
+        self.downstream = downstream
+        self.table = transcript.txTable
+        self.__translations = {}
+        self.__downstream_translation = None
+    #__init__
+
+    def translate(self, cds=False) :
+        """
+        Translate the CDS, the translation is computed only once.
+
+        @arg cds: Translate as a complete CDS (see Bio.Seq.Seq.translate).
+        @type cds: bool
+
+        @return: The protein sequence.
+        @rtype: Bio.Seq.Seq
+
+        @raise CodonTable.TranslationError: The CDS could not be translated
+            as a complete CDS.
+        """
+        if cds not in self.__translations :
+            try :
+                self.__translations[cds] = self.cds.translate(
+                    table=self.table, cds=cds)
+            except CodonTable.TranslationError as e :
+                self.__translations[cds] = e
+
+        translation = self.__translations[cds]
+        if isinstance(translation, CodonTable.TranslationError) :
+            raise translation
+        return translation
+    #translate
+
+    def translate_variant(self, cds_variant, incremental=True) :
+        """
+        Translate a variant of the transcript sequence from the CDS start
+        (see `downstream`) up to and including the first stop codon. A stop
+        codon at the first position is ignored, since callers translate the
+        start codon to M.
+
+        The variant sequence is compared to the reference sequence and only
+        the part from the first changed codon is translated: up to where the
+        sequences are the same again for in frame variants, or up to the new
+        stop codon for out of frame variants. The rest is taken from the
+        reference translation.
+
+        @arg cds_variant: Variant transcript sequence from the CDS start.
+        @type cds_variant: Bio.Seq.Seq
+        @arg incremental: If False, the entire variant sequence is translated
+            (this gives the same result).
+        @type incremental: bool
+
+        @return: The variant protein sequence.
+        @rtype: Bio.Seq.Seq
+        """
+        if not incremental :
+            return _until_stop(_translate(cds_variant, self.table))
+
+        if self.__downstream_translation is None :
+            self.__downstream_translation = _translate(self.downstream,
+                                                       self.table)
+        reference = unicode(self.downstream)
+        variant = unicode(cds_variant)
+
+        prefix = len(util.longest_common_prefix(reference, variant))
+        suffix = len(util.longest_common_suffix(reference[prefix:],
+                                                variant[prefix:]))
+        shift = len(variant) - len(reference)
+
+        # Codons before the first changed codon are unchanged.
+        first = prefix // 3
+        protein = self.__downstream_translation[:first]
+        if protein.find('*', 1) != -1 :
+            return _until_stop(protein)
+
+        if not shift % 3 :
+            # In frame, codons after the last changed codon are unchanged.
+            last = -(-(len(variant) - suffix) // 3)
+            protein += _translate(cds_variant[first * 3:last * 3],
+                                  self.table)
+            protein += self.__downstream_translation[last - shift // 3:]
+            return _until_stop(protein)
+
+        # Out of frame, translate until we find a stop codon.
+        position = first * 3
+        while position < len(variant) :
+            chunk = _translate(
+                cds_variant[position:position + TRANSLATION_CHUNK_SIZE * 3],
+                self.table)
+            stop = chunk.find('*', max(1 - len(protein), 0))
+            if stop != -1 :
+                return protein + chunk[:stop + 1]
+            protein += chunk
+            position += TRANSLATION_CHUNK_SIZE * 3
+        return protein
+    #translate_variant
+#ReferenceCDS
+
+
 class Gene(object) :
     """
     A Gene object, to store a list of Locus objects and the orientation of
@@ -278,6 +498,15 @@ class Record(object) :
                           which one).
             - source    ; A fake gene that can be used when no gene
                           information is present.
+            - checksum  ; Checksum of the file the record was parsed from,
+                          if known.
+            - proteinLinks ; Protein accession numbers linked to the
+                             transcripts by the NCBI when the record was
+                             parsed (or None), by transcript accession
+                             number and version.
+            - proteinLinksVersion ; Version of the transcript-protein links
+                                    (see ncbi.links_version) when the record
+                                    was parsed.
         """
 
         self.geneList = []
@@ -293,6 +522,10 @@ class Record(object) :
         self.chromDescription = ""
         self.orientation = 1
         self.recordId = None
+        self.checksum = None
+        self.proteinLinks = {}
+        self.proteinLinksVersion = None
+        self._transcript_index = None
     #__init__
 
     def findGene(self, name) :
@@ -327,6 +560,91 @@ class Record(object) :
                     return gene.name, transcript.name
     #getInfoByTranscriptID
 
+    def build_transcript_index(self):
+        """
+        Build an index of the transcripts by their extent (mRNA and CDS) on
+        the record, used by overlapping_transcripts. This should be done
+        after the record is checked, since only then the transcript extents
+        are known.
+
+        Transcripts without a crossmapper are not indexed.
+        """
+        transcripts = []
+        for gene in self.geneList:
+            for transcript in gene.transcriptList:
+                if not transcript.CM:
+                    continue
+                positions = list(transcript.CM.RNA)
+                if transcript.CDS and transcript.CDS.location:
+                    positions.extend(transcript.CDS.location)
+                transcripts.append((min(positions), max(positions),
+                                    len(transcripts), gene, transcript))
+        transcripts.sort(key=lambda t: t[0])
+
+        self._transcript_index = (
+            [t[0] for t in transcripts],
+            max([t[1] - t[0] for t in transcripts] or [0]),
+            transcripts)
+    #build_transcript_index
+
+    def overlapping_transcripts(self, start, stop):
+        """
+        Find the transcripts overlapping a range, using the index built by
+        build_transcript_index (it is built if needed).
+
+        The index is sorted by start position, so together with the maximum
+        transcript length this bounds the part of the index that can overlap
+        the range, which we find by bisection. The result is sorted back by
+        position in the record.
+
+        @arg start: Start of the range (g. position, inclusive)
+        @type start: integer
+        @arg stop: Stop of the range (g. position, inclusive)
+        @type stop: integer
+
+        @return: Tuples of gene and transcript, in the order of the record.
+        @rtype: list(tuple(Gene, Locus))
+        """
+        if self._transcript_index is None:
+            self.build_transcript_index()
+        starts, max_length, transcripts = self._transcript_index
+
+        first = bisect.bisect_left(starts, start - max_length)
+        last = bisect.bisect_right(starts, stop)
+        return [(gene, transcript) for _, _, _, gene, transcript in
+                sorted((t for t in transcripts[first:last] if t[1] >= start),
+                       key=lambda t: t[2])]
+    #overlapping_transcripts
+
+    def reference_cds(self, transcript):
+        """
+        Get the CDS of a transcript in the reference sequence with its
+        translations.
+
+        If the record checksum is known, the result is cached in this
+        process, so the reference CDS is only spliced and translated once.
+
+        @arg transcript: A transcript with CDS.
+        @type transcript: Locus
+
+        @return: The reference CDS.
+        @rtype: ReferenceCDS
+        """
+        if not self.checksum:
+            return ReferenceCDS(self.seq, transcript)
+
+        cache = _get_cds_cache()
+        key = (self.checksum, tuple(transcript.mRNA.positionList),
+               tuple(transcript.CDS.positionList), transcript.CM.orientation,
+               transcript.txTable)
+
+        reference_cds = cache.get(key)
+        if reference_cds is None:
+            reference_cds = ReferenceCDS(self.seq, transcript)
+            cache.put(key, reference_cds)
+        return reference_cds
+    #reference_cds
+
     def listGenes(self) :
         """
         List the names of all genes found in this record.
@@ -410,6 +728,9 @@ class GenRecord() :
         """
         self.__output = output
         self.record = None
+        self.__variants = []
+        self.__described = []
+        self.__named = {}
     #__init__
 
     def __checkExonList(self, exonList, CDSpos) :
@@ -614,20 +935,22 @@ class GenRecord() :
                         j.transcribe = True
                         j.translate = True
                     #if
-                    j.CM = Crossmap.Crossmap(j.mRNA.positionList,
-                                             j.CDS.location, i.orientation)
+                    j.CM = Crossmap.get_crossmap(j.mRNA.positionList,
+                                                 j.CDS.location, i.orientation)
                 #if
                 else :
                     j.molType = 'n'
                     if j.mRNA.positionList :
-                        j.CM = Crossmap.Crossmap(j.mRNA.positionList,
-                                                 [], i.orientation)
+                        j.CM = Crossmap.get_crossmap(j.mRNA.positionList,
+                                                     [], i.orientation)
                         j.transcribe = True
                     else :
                         j.description = '?'
                 #else
             #for
         #for
+
+        self.record.build_transcript_index()
     #checkRecord
 
     def current_transcript(self):
@@ -758,82 +1081,151 @@ class GenRecord() :
                 self.record.addToChromDescription("%s%c>%c" % (
                     chromStart, chromArg1, chromArg2))
 
-        for i in self.record.geneList :
-            for j in i.transcriptList :
-                if j.CM :
-                    orientedStart = forwardStart
-                    orientedStop = forwardStop
-                    if i.orientation == -1 :
-                        orientedStart = reverseStart
-                        orientedStop = reverseStop
-                    #if
-
-                    # Turn of translation to protein if we hit splice sites.
-                    # For the current transcript, this is handled with more
-                    # care in variantchecker.py.
-                    if not j.current and \
-                           util.over_splice_site(orientedStart, orientedStop,
-                                                 j.CM.RNA):
-                        j.translate = False
-
-                    # And check whether the variant hits CDS start.
-                    if j.molType == 'c' and forwardStop >= j.CM.x2g(1, 0) \
-                       and forwardStart <= j.CM.x2g(3, 0) :
-                        self.__output.addMessage(__file__, 2, "WSTART",
-                            "Mutation in start codon of gene %s transcript " \
-                            "%s." % (i.name, j.name))
-                        if not j.current:
-                            j.translate = False
-
-                    # FIXME Check whether the variant hits a splice site.
-
-                    if varType != "subst" :
-                        if orientedStart != orientedStop :
-                            if (start_fuzzy or stop_fuzzy) and not j.current:
-                                # Don't generate descriptions on transcripts
-                                # other than the current in the case of fuzzy
-                                # positions.
-                                j.cancelDescription()
-                            else:
-                                j.addToDescription("%s_%s%s%s" % (
-                                    j.CM.g2c(orientedStart, start_fuzzy),
-                                    j.CM.g2c(orientedStop, stop_fuzzy),
-                                    varType, self.__maybeInvert(i, arg1, arg1_reverse)))
-                                self.checkIntron(i, j, orientedStart)
-                                self.checkIntron(i, j, orientedStop)
-                        #if
-                        else :
-                            if start_fuzzy and not j.current:
-                                # Don't generate descriptions on transcripts
-                                # other than the current in the case of fuzzy
-                                # positions.
-                                j.cancelDescription()
-                            else:
-                                j.addToDescription("%s%s%s" % (
-                                    j.CM.g2c(orientedStart, start_fuzzy),
-                                    varType,
-                                    self.__maybeInvert(i, arg1, arg1_reverse)))
-                                self.checkIntron(i, j, orientedStart)
-                        #else
-                    #if
-                    else :
-                        if start_fuzzy and not j.current:
-                            # Don't generate descriptions on transcripts
-                            # other than the current in the case of fuzzy
-                            # positions.
-                            j.cancelDescription()
-                        else:
-                            j.addToDescription("%s%c>%c" % (
-                                j.CM.g2c(orientedStart, start_fuzzy),
-                                self.__maybeInvert(i, arg1, arg1_reverse),
-                                self.__maybeInvert(i, arg2)))
-                            self.checkIntron(i, j, orientedStart)
-                    #else
-                #if
-            #for
+        # Once a transcript is near one of the variants, it is described
+        # with all variants. So a transcript that was not near earlier
+        # variants is named for these now.
+        variant = (forwardStart, forwardStop, reverseStart, reverseStop,
+                   varType, arg1, arg2, arg1_reverse, start_fuzzy, stop_fuzzy)
+        self.__variants.append(variant)
+
+        positions = forwardStart, forwardStop, reverseStart, reverseStop
+        for i, j in self.__transcriptsNear(min(positions), max(positions)) :
+            if id(j) not in self.__named :
+                self.__described.append((i, j))
+                self.__named[id(j)] = 0
+
+        for i, j in self.__described :
+            for variant in self.__variants[self.__named[id(j)]:] :
+                self.__nameTranscript(i, j, *variant)
+            self.__named[id(j)] = len(self.__variants)
         #for
     #name
 
+    def __transcriptsNear(self, start, stop) :
+        """
+        Find the transcripts to name a variant on: those overlapping the
+        variant with a flank of TRANSCRIPT_FLANK bases, and the current
+        transcript (first, if it is not near the variant). If TRANSCRIPT_FLANK
+        is None, all transcripts are used.
+
+        @arg start: start position
+        @type start: integer
+        @arg stop: stop position
+        @type stop: integer
+
+        @return: Tuples of gene and transcript
+        @rtype: list(tuple(Gene, Locus))
+        """
+        if settings.TRANSCRIPT_FLANK is None :
+            return [(i, j) for i in self.record.geneList
+                    for j in i.transcriptList if j.CM]
+
+        transcripts = self.record.overlapping_transcripts(
+            start - settings.TRANSCRIPT_FLANK, stop + settings.TRANSCRIPT_FLANK)
+
+        if not any(j.current for i, j in transcripts) :
+            for i in self.record.geneList :
+                for j in i.transcriptList :
+                    if j.current and j.CM :
+                        transcripts.insert(0, (i, j))
+        return transcripts
+    #__transcriptsNear
+
+    def __nameTranscript(self, i, j, forwardStart, forwardStop, reverseStart,
+                         reverseStop, varType, arg1, arg2, arg1_reverse,
+                         start_fuzzy, stop_fuzzy) :
+        """
+        Add a variant to the description of a transcript. See name for the
+        arguments.
+
+        @arg i: Gene
+        @type i: object
+        @arg j: transcript
+        @type j: object
+        """
+        orientedStart = forwardStart
+        orientedStop = forwardStop
+        if i.orientation == -1 :
+            orientedStart = reverseStart
+            orientedStop = reverseStop
+        #if
+
+        # Turn of translation to protein if we hit splice sites.
+        # For the current transcript, this is handled with more
+        # care in variantchecker.py.
+        if not j.current and \
+               util.over_splice_site(orientedStart, orientedStop,
+                                     j.CM.RNA):
+            j.translate = False
+
+        # And check whether the variant hits CDS start.
+        if j.molType == 'c' and forwardStop >= j.CM.x2g(1, 0) \
+           and forwardStart <= j.CM.x2g(3, 0) :
+            self.__output.addMessage(__file__, 2, "WSTART",
+                "Mutation in start codon of gene %s transcript " \
+                "%s." % (i.name, j.name))
+            if not j.current:
+                j.translate = False
+
+        # FIXME Check whether the variant hits a splice site.
+
+        if varType != "subst" :
+            if orientedStart != orientedStop :
+                if (start_fuzzy or stop_fuzzy) and not j.current:
+                    # Don't generate descriptions on transcripts
+                    # other than the current in the case of fuzzy
+                    # positions.
+                    j.cancelDescription()
+                else:
+                    j.addToDescription("%s_%s%s%s" % (
+                        j.CM.g2c(orientedStart, start_fuzzy),
+                        j.CM.g2c(orientedStop, stop_fuzzy),
+                        varType, self.__maybeInvert(i, arg1, arg1_reverse)))
+                    self.checkIntron(i, j, orientedStart)
+                    self.checkIntron(i, j, orientedStop)
+            #if
+            else :
+                if start_fuzzy and not j.current:
+                    # Don't generate descriptions on transcripts
+                    # other than the current in the case of fuzzy
+                    # positions.
+                    j.cancelDescription()
+                else:
+                    j.addToDescription("%s%s%s" % (
+                        j.CM.g2c(orientedStart, start_fuzzy),
+                        varType,
+                        self.__maybeInvert(i, arg1, arg1_reverse)))
+                    self.checkIntron(i, j, orientedStart)
+            #else
+        #if
+        else :
+            if start_fuzzy and not j.current:
+                # Don't generate descriptions on transcripts
+                # other than the current in the case of fuzzy
+                # positions.
+                j.cancelDescription()
+            else:
+                j.addToDescription("%s%c>%c" % (
+                    j.CM.g2c(orientedStart, start_fuzzy),
+                    self.__maybeInvert(i, arg1, arg1_reverse),
+                    self.__maybeInvert(i, arg2)))
+                self.checkIntron(i, j, orientedStart)
+        #else
+    #__nameTranscript
+
+    def cancelDistantDescriptions(self) :
+        """
+        Set the description on transcripts that were not named because they
+        are not near any of the variants (see TRANSCRIPT_FLANK) to 'unknown'.
+        """
+        if not self.__variants :
+            return
+        for i in self.record.geneList :
+            for j in i.transcriptList :
+                if j.CM and id(j) not in self.__named :
+                    j.cancelDescription()
+    #cancelDistantDescriptions
+
     def checkIntron(self, gene, transcript, position):
         """
         Checks if a position is on or near a splice site
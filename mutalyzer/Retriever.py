@@ -11,9 +11,12 @@ from __future__ import unicode_literals
 
 import bz2
 import chardet
+import copy
+import cPickle
 import hashlib
 import io
 import os
+import tempfile
 import urllib2
 
 from Bio import Entrez
@@ -24,6 +27,9 @@ from httplib import HTTPException
 from sqlalchemy.orm.exc import NoResultFound
 from xml.dom import DOMException
 
+from mutalyzer import ncbi
+from mutalyzer import recordstore
+from mutalyzer import stats
 from mutalyzer import util
 from mutalyzer.config import settings
 from mutalyzer.db import session
@@ -32,6 +38,136 @@ from mutalyzer.parsers import genbank
 from mutalyzer.parsers import lrg
 
 
+# In-process cache of parsed GenBank records, created on first use.
+_record_cache = None
+
+
+def _get_record_cache():
+    """
+    Get the in-process cache of parsed GenBank records.
+
+    Records are keyed by accession number and checksum, and the cache size is
+    measured in total sequence length (see the `RECORD_CACHE_SIZE`
+    configuration setting).
+
+    :returns: The record cache.
+    :rtype: util.LRUCache
+    """
+    global _record_cache
+    if _record_cache is None:
+        _record_cache = util.LRUCache(settings.RECORD_CACHE_SIZE,
+                                      weigh=lambda record: len(record.seq))
+    return _record_cache
+
+
+def _reset_record_cache(value):
+    """
+    Discard the record cache so that it is recreated on next use.
+    """
+    global _record_cache
+    _record_cache = None
+
+
+# Recreate the record cache if configuration is updated.
+settings.on_update(_reset_record_cache, 'RECORD_CACHE_SIZE')
+settings.on_update(_reset_record_cache, 'CACHE_DIR')
+
+
+#: Version of the serialized record format. Increment this whenever a change
+#: in the GenBank parser or the GenRecord classes affects parsed records, this
+#: invalidates all existing serialized records.
+PARSED_RECORD_FORMAT = 4
+
+
+def parsed_record_file(accession):
+    """
+    Get the filename for the serialized parsed GenBank record of an accession
+    number. It is stored next to the GenBank file in the cache directory.
+
+    :arg unicode accession: The accession number.
+
+    :returns: A filename.
+    :rtype: unicode
+    """
+    return os.path.join(settings.CACHE_DIR, '{}.gb.record'.format(accession))
+
+
+def protein_links_current(record):
+    """
+    Check if the transcript-protein links used for parsing a GenBank record
+    are still current.
+
+    Only the version of the links is compared (see :func:`ncbi.links_version`),
+    so this does not query the database or the NCBI.
+
+    :arg GenRecord.Record record: The parsed record.
+
+    :returns: `True` if the links did not change since the record was parsed,
+      `False` otherwise.
+    :rtype: bool
+    """
+    if not record.proteinLinks:
+        return True
+    return record.proteinLinksVersion == ncbi.links_version()
+
+
+def read_parsed_record(accession, checksum):
+    """
+    Read a serialized parsed GenBank record.
+
+    :arg unicode accession: The accession number.
+    :arg unicode checksum: Checksum of the GenBank file the record must have
+      been parsed from.
+
+    :returns: The parsed record, or `None` if there is no serialized record
+      for this accession number, checksum, and format version, or if its
+      transcript-protein links are outdated.
+    :rtype: GenRecord.Record
+    """
+    try:
+        with open(parsed_record_file(accession), 'rb') as handle:
+            # The header is pickled separately, so we don't need to unpickle
+            # the record if it is outdated.
+            if cPickle.load(handle) != (PARSED_RECORD_FORMAT, checksum):
+                return None
+            record = cPickle.load(handle)
+    except (IOError, EOFError, ValueError, AttributeError, ImportError,
+            cPickle.UnpicklingError):
+        return None
+    if not protein_links_current(record):
+        return None
+    return record
+
+
+def write_parsed_record(accession, checksum, record):
+    """
+    Write a serialized parsed GenBank record.
+
+    The file is written under a temporary name and then renamed, so readers
+    never see a partially written record.
+
+    :arg unicode accession: The accession number.
+    :arg unicode checksum: Checksum of the GenBank file the record was parsed
+      from.
+    :arg GenRecord.Record record: The parsed record.
+
+    :returns: `True` if the record was written, `False` otherwise.
+    :rtype: bool
+    """
+    try:
+        handle = tempfile.NamedTemporaryFile(
+            dir=settings.CACHE_DIR, prefix='.{}.'.format(accession),
+            delete=False)
+        with handle:
+            cPickle.dump((PARSED_RECORD_FORMAT, checksum), handle,
+                         cPickle.HIGHEST_PROTOCOL)
+            cPickle.dump(record, handle, cPickle.HIGHEST_PROTOCOL)
+        os.rename(handle.name, parsed_record_file(accession))
+    except (IOError, OSError):
+        return False
+    return True
+
+
 class Retriever(object):
     """
     Retrieve a record from either the cache or the NCBI.
@@ -63,7 +199,8 @@ class Retriever(object):
 
     def _write(self, raw_data, filename):
         """
-        Write raw data to a compressed file.
+        Write raw data to a compressed file. The file is also written to the
+        shared record store, if configured.
 
         :arg str raw_data: The raw_data to be compressed and written.
         :arg unicode filename: The intended name of the output filename.
@@ -71,6 +208,10 @@ class Retriever(object):
         :returns: The full path and name of the file written.
         :rtype: unicode
         """
+        # The record store is addressed by the checksum we store in the
+        # database, which is calculated before any re-encoding.
+        checksum = self._calculate_hash(raw_data)
+
         result = chardet.detect(raw_data)
         if result['confidence'] > 0.5:
             encoding = unicode(result['encoding'])
@@ -95,9 +236,60 @@ class Retriever(object):
         out_handle.write(data)
         out_handle.close()
 
+        store = recordstore.get_record_store()
+        if store is not None:
+            store.put(checksum, data)
+
         # Return the full path to the file.
         return out_handle.name
 
+    def _restore(self, reference):
+        """
+        Restore the file for a reference from the shared record store, if
+        configured.
+
+        :arg Reference reference: The reference.
+
+        :returns: The full path and name of the file restored, or `None` if
+          the file is not in the record store.
+        :rtype: unicode
+        """
+        store = recordstore.get_record_store()
+        if store is None:
+            return None
+
+        data = store.get(reference.checksum)
+        if data is None:
+            stats.increment_counter_locally('record-store/miss')
+            return None
+        stats.increment_counter_locally('record-store/hit')
+
+        filename = self._name_to_file(reference.accession)
+        try:
+            handle = tempfile.NamedTemporaryFile(
+                dir=settings.CACHE_DIR,
+                prefix='.{}.'.format(reference.accession), delete=False)
+            with handle:
+                handle.write(data)
+            os.rename(handle.name, filename)
+        except (IOError, OSError):
+            return None
+        return filename
+
+    def _has_file(self, reference):
+        """
+        Check if the file for a reference is in the cache directory,
+        restoring it from the shared record store if needed.
+
+        :arg Reference reference: The reference.
+
+        :returns: `True` if the file is in the cache directory, `False`
+          otherwise.
+        :rtype: bool
+        """
+        return (os.path.isfile(self._name_to_file(reference.accession)) or
+                self._restore(reference) is not None)
+
     def _calculate_hash(self, content):
         """
         Calculate the md5sum of a piece of text.
@@ -362,7 +554,7 @@ class GenBankRetriever(Retriever):
             source='ncbi_slice',
             source_data=source_data
         ).first()
-        if reference and os.path.isfile(self._name_to_file(reference.accession)):
+        if reference and self._has_file(reference):
             # It's still present.
             return reference.accession
 
@@ -589,7 +781,7 @@ class GenBankRetriever(Retriever):
                         session.add(reference)
                         session.commit()
                 else:
-                    if (os.path.isfile(self._name_to_file(reference.accession)) or
+                    if (self._has_file(reference) or
                             self.write(raw_data, reference.accession, 0)):
                         ud = reference.accession
 
@@ -628,7 +820,7 @@ class GenBankRetriever(Retriever):
                 session.commit()
                 return ud
         else:
-            if os.path.isfile(self._name_to_file(reference.accession)):
+            if self._has_file(reference):
                 return reference.accession
             else:
                 return (self.write(raw_data, reference.accession, 0) and
@@ -641,10 +833,11 @@ class GenBankRetriever(Retriever):
         The record is found by trying the following options in order:
 
         1. Returned from the cache if it is there.
-        2. Re-created (if it was created by slicing) or re-downloaded (if it
+        2. Restored from the shared record store if it is there.
+        3. Re-created (if it was created by slicing) or re-downloaded (if it
            was created by URL) if we have information on its source in the
            database.
-        3. Fetched from the NCBI.
+        4. Fetched from the NCBI.
 
         :arg unicode accession: A RefSeq accession number.
 
@@ -654,6 +847,21 @@ class GenBankRetriever(Retriever):
         """
         reference = Reference.query.filter_by(accession=accession).first()
 
+        cached_filename = None
+
+        if reference is not None:
+            # The checksum identifies the record contents, so a cached record
+            # is valid even if it was parsed from a since removed file, as
+            # long as its transcript-protein links did not change. We hand
+            # out copies since the record is modified by its users.
+            record_cache = _get_record_cache()
+            cache_key = reference.accession, reference.checksum
+            record = record_cache.get(cache_key)
+            if record is not None and protein_links_current(record):
+                stats.increment_counter_locally('record-cache/hit')
+                return copy.deepcopy(record)
+            stats.increment_counter_locally('record-cache/miss')
+
         if reference is None:
             # We don't know it, fetch it from NCBI.
             filename = self.fetch(accession)
@@ -662,9 +870,9 @@ class GenBankRetriever(Retriever):
             # We have seen it before.
             filename = self._name_to_file(reference.accession)
 
-            if os.path.isfile(filename):
+            if self._has_file(reference):
                 # It is still in the cache, so filename is valid.
-                pass
+                cached_filename = filename
 
             elif reference.source == 'ncbi_slice':
                 # It was previously created by slicing.
@@ -702,15 +910,31 @@ class GenBankRetriever(Retriever):
             self._output.addOutput('BatchFlags', ('S1', accession))
             return None
 
-        # Now we have the file, so we can parse it.
-        genbank_parser = genbank.GBparser()
-        record = genbank_parser.create_record(filename)
+        # Now we have the file, so we can parse it, unless we have a parsed
+        # record stored for this version of the file.
+        record = None
+        if filename == cached_filename:
+            record = read_parsed_record(reference.accession,
+                                        reference.checksum)
+
+        if record is None:
+            genbank_parser = genbank.GBparser()
+            record = genbank_parser.create_record(filename)
+            if filename == cached_filename:
+                write_parsed_record(reference.accession, reference.checksum,
+                                    record)
 
         if reference:
             record.id = reference.accession
         else:
             record.id = record.source_id
 
+        # The checksum is only known if we did not retrieve the file again.
+        if filename == cached_filename:
+            record.checksum = reference.checksum
+        else:
+            record.checksum = None
+
         # Todo: This will change once we support protein references.
         if isinstance(record.seq.alphabet, ProteinAlphabet):
             self._output.addMessage(
@@ -718,6 +942,14 @@ class GenBankRetriever(Retriever):
                 'Protein reference sequences are not supported.')
             return None
 
+        # Only cache records we loaded under a known checksum, the checksum
+        # may have changed if the record was retrieved again.
+        if (reference is not None and filename == cached_filename and
+                record_cache.max_size):
+            for _ in range(record_cache.put(cache_key,
+                                            copy.deepcopy(record))):
+                stats.increment_counter_locally('record-cache/eviction')
+
         return record
 
 
@@ -746,9 +978,15 @@ class LRGRetriever(Retriever):
         # Make a filename based upon the identifier.
         filename = self._name_to_file(identifier)
 
-        if not os.path.isfile(filename):
+        reference = Reference.query.filter_by(accession=identifier).first()
+
+        checksum = None
+        if not (os.path.isfile(filename) or
+                (reference is not None and self._restore(reference))):
             # We can't find the file.
             filename = self.fetch(identifier)
+        elif reference is not None:
+            checksum = reference.checksum
 
         if filename is None:
             # Notify batch to skip all instance of identifier.
@@ -767,6 +1005,7 @@ class LRGRetriever(Retriever):
         # as source_id.
         record.id = identifier
         record.source_id = identifier
+        record.checksum = checksum
 
         return record
 
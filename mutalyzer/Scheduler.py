@@ -17,12 +17,20 @@ Module used to add and manage the Batch Jobs.
 
 from __future__ import unicode_literals
 
+from collections import namedtuple, OrderedDict
+import gzip
 import io
+import multiprocessing
 import os                               # os.path.exists
+import shutil
+import signal
 import smtplib                          # smtplib.STMP
+import tempfile
+import time
 from email.mime.text import MIMEText    # MIMEText
 from sqlalchemy import func
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import StaticPool
 
 from mutalyzer.config import settings
 from mutalyzer.db import queries, session
@@ -36,7 +44,198 @@ from mutalyzer.mapping import Converter
 from mutalyzer import website
 
 
-__all__ = ["Scheduler"]
+__all__ = ["Scheduler", "get_result_file"]
+
+
+# Buffered batch job results are written to the result file if they exceed
+# this size (in characters) or are older than this interval (in seconds).
+RESULT_BUFFER_SIZE = 64 * 1024
+RESULT_FLUSH_INTERVAL = 10
+
+
+# Column headers of the batch job result files, per job type.
+RESULT_HEADERS = {
+    'name-checker': ['Input',
+                     'Errors and warnings',
+                     'AccNo',
+                     'Genesymbol',
+                     'Variant',
+                     'Reference Sequence Start Descr.',
+                     'Coding DNA Descr.',
+                     'Protein Descr.',
+                     'GeneSymbol Coding DNA Descr.',
+                     'GeneSymbol Protein Descr.',
+                     'Genomic Reference',
+                     'Coding Reference',
+                     'Protein Reference',
+                     'Affected Transcripts',
+                     'Affected Proteins',
+                     'Restriction Sites Created',
+                     'Restriction Sites Deleted'],
+    'syntax-checker': ['Input', 'Status'],
+    'position-converter': ['Input Variant',
+                           'Errors',
+                           'Chromosomal Variant',
+                           'Coding Variant(s)'],
+    'snp-converter': ['Input Variant',
+                      'HGVS description(s)',
+                      'Errors and warnings']}
+
+
+# The fields of a batch job needed to process its items. We use this instead
+# of the BatchJob model, so it can be passed to worker processes.
+BatchJobInfo = namedtuple('BatchJobInfo',
+                          ['id', 'job_type', 'argument', 'result_id'])
+
+
+def get_result_file(result_id):
+    """
+    Get the path to the result file of a batch job.
+
+    @arg result_id: Identifier of the batch job result.
+    @type result_id: unicode
+
+    @return: Tuple of the path to the result file and a boolean indicating
+        whether it is gzip compressed. The path is None if there is no result
+        file.
+    @rtype: tuple(unicode, bool)
+    """
+    filename = os.path.join(settings.CACHE_DIR, 'batch-job-%s.txt' % result_id)
+    if os.path.isfile(filename + '.gz'):
+        return filename + '.gz', True
+    if os.path.isfile(filename):
+        return filename, False
+    return None, False
+#get_result_file
+
+
+class ResultWriter(object):
+    """
+    Buffered writer for the result file of a batch job.
+
+    The result file is kept open and results are written to it when the
+    buffer exceeds RESULT_BUFFER_SIZE, when the oldest buffered result is
+    older than RESULT_FLUSH_INTERVAL, and on {flush} and {close}.
+    """
+    def __init__(self, job):
+        """
+        Open the result file for appending, creating it with a header if it
+        does not yet exist.
+
+        @arg job: The batch job.
+        @type job: BatchJobInfo
+        """
+        self.filename = os.path.join(settings.CACHE_DIR,
+                                     'batch-job-%s.txt' % job.result_id)
+        exists = os.path.exists(self.filename)
+        self._handle = io.open(self.filename, mode='a', encoding='utf-8')
+        self._buffer = []
+        self._buffered = 0
+        self._since = None
+
+        if not exists:
+            # We need a tab delimited string.
+            self.write("%s\n" % "\t".join(RESULT_HEADERS[job.job_type]))
+    #__init__
+
+    def write(self, result):
+        """
+        Write a result line (including separator).
+
+        @arg result: Result line.
+        @type result: unicode
+        """
+        if self._since is None:
+            self._since = time.time()
+        self._buffer.append(result)
+        self._buffered += len(result)
+
+        if (self._buffered >= RESULT_BUFFER_SIZE or
+                time.time() - self._since >= RESULT_FLUSH_INTERVAL):
+            self.flush()
+    #write
+
+    def flush(self):
+        """
+        Write buffered results to the result file.
+        """
+        if self._buffer:
+            self._handle.write(''.join(self._buffer))
+            self._handle.flush()
+        self._buffer = []
+        self._buffered = 0
+        self._since = None
+    #flush
+
+    def close(self, compress=False):
+        """
+        Flush and close the result file.
+
+        @arg compress: Replace the result file by a gzip compressed version.
+        @type compress: bool
+        """
+        self.flush()
+        self._handle.close()
+
+        if compress:
+            # Write to a temporary file first, so the compressed result file
+            # appears atomically.
+            handle, filename = tempfile.mkstemp(
+                dir=settings.CACHE_DIR, prefix='batch-job-', suffix='.tmp')
+            with os.fdopen(handle, 'wb') as temporary, \
+                    io.open(self.filename, 'rb') as original:
+                compressed = gzip.GzipFile(
+                    filename=os.path.basename(self.filename), mode='wb',
+                    fileobj=temporary)
+                shutil.copyfileobj(original, compressed)
+                compressed.close()
+            os.rename(filename, self.filename + '.gz')
+            os.unlink(self.filename)
+    #close
+#ResultWriter
+
+
+def _init_worker():
+    """
+    Initialize a batch worker process. Shutdown is handled by the scheduler
+    process, so we ignore SIGINT.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+#_init_worker
+
+
+def _process_items(job, batch_queue_items):
+    """
+    Process batch queue items of a job in a worker process.
+
+    @arg job: The batch job.
+    @type job: BatchJobInfo
+    @arg batch_queue_items: Batch queue items as tuples of id, item and
+        flags.
+    @type batch_queue_items: list(tuple)
+
+    @return: Result lines for the batch job result file, in the same order.
+    @rtype: list(unicode)
+    """
+    return Scheduler(processes=1)._processItems(job, batch_queue_items)
+#_process_items
+
+
+def _reference_key(item):
+    """
+    Get the reference sequence accession (without version) of a name checker
+    batch queue item. It is only used to group items, so we don't bother
+    parsing the item properly.
+
+    @arg item: The batch queue item.
+    @type item: unicode
+
+    @return: Reference sequence accession.
+    @rtype: unicode
+    """
+    return item.split(':', 1)[0].split('(', 1)[0].split('.', 1)[0]
+#_reference_key
 
 
 class Scheduler() :
@@ -55,14 +254,23 @@ class Scheduler() :
         - Batch Position Converter
     """
 
-    def __init__(self) :
+    def __init__(self, processes=None) :
         #TODO: documentation
         """
         Initialize the Scheduler, which requires a database connection.
 
+        @arg processes: Number of worker processes used to process batch
+            queue items. If 1, items are processed in the scheduler process
+            itself. Default is the BATCH_PROCESSES configuration setting.
+        @type processes: int
+
         @todo: documentation
         """
         self.__run = True
+        self._processes = processes or settings.BATCH_PROCESSES
+
+        # Result writers per batch job id.
+        self.__writers = {}
     #__init__
 
     def stop(self):
@@ -211,7 +419,8 @@ Mutalyzer batch scheduler""" % download_url)
         return False
     #__processFlags
 
-    def __alterBatchEntries(self, jobID, old, new, flag, nselector, O) :
+    def __alterBatchEntries(self, jobID, old, new, flag, nselector, O,
+                            pending=None) :
         """
         Replace within one JobID all entries matching old with new, if they do
         not match the negative selector.
@@ -246,7 +455,17 @@ Mutalyzer batch scheduler""" % download_url)
         @type flag:
         @arg nselector:
         @type nselector:
+        @arg pending: Entries of jobID that are already taken from the
+            database, as lists of item and flags. They are altered in place.
+        @type pending: list(list)
         """
+        for entry in pending or []:
+            if (entry[0].startswith(old + ':') and
+                    not entry[0].startswith(nselector) and
+                    'S2' not in entry[1]):
+                entry[0] = entry[0].replace(old, new)
+                entry[1] += flag
+
         #query = '''UPDATE batch_queue_items
         #             SET item = REPLACE(item, :old, :new),
         #                 flags = flags || :flag
@@ -276,7 +495,7 @@ Mutalyzer batch scheduler""" % download_url)
         session.commit()
     #__alterBatchEntries
 
-    def __skipBatchEntries(self, jobID, flag, selector) :
+    def __skipBatchEntries(self, jobID, flag, selector, pending=None) :
         """
         Skip all batch entries that match a certain selector.
 
@@ -289,7 +508,14 @@ Mutalyzer batch scheduler""" % download_url)
         @type flag:
         @arg selector:
         @type selector:
+        @arg pending: Entries of jobID that are already taken from the
+            database, as lists of item and flags. They are flagged in place.
+        @type pending: list(list)
         """
+        for entry in pending or []:
+            if entry[0].startswith(selector):
+                entry[1] += flag
+
         #update `BatchQueue` set
         #  `Flags` = CONCAT(IFNULL(`Flags`, ""), %s)
         #  where `JobID` = %s AND
@@ -302,7 +528,7 @@ Mutalyzer batch scheduler""" % download_url)
         session.commit()
     #__skipBatchEntries
 
-    def _updateDbFlags(self, O, jobID) :
+    def _updateDbFlags(self, O, jobID, pending=None) :
         """
             Check and set the flags for other entries of jobID.
 
@@ -318,6 +544,9 @@ Mutalyzer batch scheduler""" % download_url)
             @arg jobID: ID of job, so that the altering is only done within one
             job
             @type jobID:
+            @arg pending: Entries of jobID that are already taken from the
+            database, as lists of item and flags. They are updated in place.
+            @type pending: list(list)
         """
 
         flags = O.getOutput("BatchFlags")
@@ -340,7 +569,7 @@ Mutalyzer batch scheduler""" % download_url)
                 O.addMessage(__file__, 2, "WBSKIP",
                         "All further occurrences with '%s' will be "
                         "skipped" % selector)
-                self.__skipBatchEntries(jobID, flag, selector)
+                self.__skipBatchEntries(jobID, flag, selector, pending)
                 return
             #if
         #for
@@ -351,7 +580,8 @@ Mutalyzer batch scheduler""" % download_url)
                 O.addMessage(__file__, 2, "WBSUBST",
                         "All further occurrences of %s will be substituted "
                         "by %s" % (old, new))
-                self.__alterBatchEntries(jobID, old, new, flag, nselector, O)
+                self.__alterBatchEntries(jobID, old, new, flag, nselector, O,
+                                         pending)
             #if
         #for
     #_updateDbFlags
@@ -376,9 +606,11 @@ Mutalyzer batch scheduler""" % download_url)
                             to send the build version.
 
         If the jobList is not empty, the method will iterate once over the
-        list and fetch the first entry of a job from the database table
-        BatchQueue. This request returns both the input for the batch and
-        the flags for the job.
+        list and fetch the first entries (at most BATCH_CHUNK_SIZE) of a job
+        from the database table BatchQueue. This request returns both the
+        input for the batch and the flags for the job. The entries are
+        removed from the database after their results are written, so
+        entries that were not completed are processed again after a crash.
 
         #Flags
         A job can be flagged in three ways:
@@ -399,62 +631,262 @@ Mutalyzer batch scheduler""" % download_url)
 
         A Flag consists of either an A, S or C followed by a digit, which
         refers to the reason of alteration / skip.
-        """
-        while not self.stopped():
-            # Group batch jobs by email address and retrieve the oldest for
-            # each address. This improves fairness when certain users have
-            # many jobs.
-            batch_jobs = BatchJob.query.filter(BatchJob.id.in_(
-                session.query(func.min(BatchJob.id)).group_by(BatchJob.email))
-            ).all()
 
-            if len(batch_jobs) == 0:
-                break
+        With more than one worker process, the entries of a job are processed
+        in a pool of worker processes. Entries are still taken from the
+        database only by this process (so each entry is processed once) and
+        results are written in the original order per job.
+        """
+        # The worker pool is started when we have the first item to process.
+        pool = None
 
-            for batch_job in batch_jobs:
-                if self.stopped():
+        try:
+            while not self.stopped():
+                # Group batch jobs by email address and retrieve the oldest
+                # for each address. This improves fairness when certain users
+                # have many jobs.
+                batch_jobs = BatchJob.query.filter(BatchJob.id.in_(
+                    session.query(func.min(BatchJob.id)).group_by(BatchJob.email))
+                ).all()
+
+                if len(batch_jobs) == 0:
                     break
 
-                batch_queue_item = queries.pop_batch_queue_item(batch_job)
+                for batch_job in batch_jobs:
+                    if self.stopped():
+                        break
+
+                    job = BatchJobInfo(batch_job.id, batch_job.job_type,
+                                       batch_job.argument, batch_job.result_id)
+                    batch_queue_items = queries.get_batch_queue_items(
+                        batch_job, settings.BATCH_CHUNK_SIZE)
 
-                if batch_queue_item is not None:
-                    item, flags = batch_queue_item
+                    if batch_queue_items:
+                        if self._processes > 1 and pool is None:
+                            pool = self.__startPool()
+                        self.__processItems(job, batch_queue_items, pool)
 
-                    if batch_job.job_type == 'name-checker':
-                        self._processNameBatch(batch_job, item, flags)
-                    elif batch_job.job_type == 'syntax-checker':
-                        self._processSyntaxCheck(batch_job, item, flags)
-                    elif batch_job.job_type == 'position-converter':
-                        self._processConversion(batch_job, item, flags)
-                    elif batch_job.job_type == 'snp-converter':
-                        self._processSNP(batch_job, item, flags)
                     else:
-                        # Unknown job type, should never happen.
-                        # Todo: Log some screaming message.
-                        pass
+                        # The result file may have been written by an
+                        # earlier run, in which case we reopen it to finish
+                        # it (unless it was already compressed). Jobs
+                        # without any results have no result file.
+                        writer = self.__writers.pop(job.id, None)
+                        if writer is None:
+                            path, compressed = get_result_file(job.result_id)
+                            if path is not None and not compressed:
+                                writer = ResultWriter(job)
+                        if writer is not None:
+                            writer.close(
+                                compress=settings.BATCH_RESULTS_GZIP)
+                        print ('Job %s finished, email %s file %s' %
+                               (batch_job.id, batch_job.email, batch_job.result_id))
+                        self.__sendMail(batch_job.email, batch_job.result_id)
+                        session.delete(batch_job)
+                        session.commit()
 
-                else:
-                    print ('Job %s finished, email %s file %s' %
-                           (batch_job.id, batch_job.email, batch_job.result_id))
-                    self.__sendMail(batch_job.email, batch_job.result_id)
-                    session.delete(batch_job)
-                    session.commit()
+        finally:
+            for writer in self.__writers.values():
+                writer.close()
+            self.__writers.clear()
+            if pool is not None:
+                pool.close()
+                pool.join()
     #process
 
-    def _processNameBatch(self, batch_job, cmd, flags):
+    def __startPool(self):
         """
-        Process an entry from the Name Batch, write the results
-        to the job-file. If an Exception is raised, catch and continue.
+        Start a pool of worker processes.
 
-        Side-effect:
-            - Output written to outputfile.
+        Worker processes must not share database connections with this
+        process, so we close them before forking (new connections are created
+        on demand). An SQLite in-memory database cannot be shared this way,
+        worker processes get a copy of its current state.
 
+        @return: The worker pool.
+        @rtype: multiprocessing.Pool
+        """
+        session.remove()
+        engine = session.get_bind()
+        if not isinstance(engine.pool, StaticPool):
+            engine.dispose()
+        return multiprocessing.Pool(self._processes, _init_worker)
+    #__startPool
+
+    def __processItems(self, job, batch_queue_items, pool=None):
+        """
+        Process a chunk of batch queue items of a job and write the results
+        in order to the batch job result file.
+
+        Name checker items are processed in groups per reference sequence,
+        so each reference sequence is loaded only once. SNP converter items
+        are processed in groups of `ncbi.SNP_FETCH_BATCH_SIZE`, so their
+        dbSNP records are retrieved together.
+
+        Written items are removed from the database afterwards. If we are
+        stopped halfway, the remaining items are left in the database.
+
+        @arg job: The batch job.
+        @type job: BatchJobInfo
+        @arg batch_queue_items: Batch queue items as tuples of `id`, `item`
+            and `flags`.
+        @type batch_queue_items: list(tuple)
+        @arg pool: Pool of worker processes, if None the items are processed
+            in this process.
+        @type pool: multiprocessing.Pool
+        """
+        if job.job_type == 'name-checker':
+            groups = OrderedDict()
+            for batch_queue_item in batch_queue_items:
+                groups.setdefault(_reference_key(batch_queue_item[1]),
+                                  []).append(batch_queue_item)
+            groups = groups.values()
+        elif job.job_type == 'snp-converter':
+            groups = [batch_queue_items[i:i + ncbi.SNP_FETCH_BATCH_SIZE]
+                      for i in range(0, len(batch_queue_items),
+                                     ncbi.SNP_FETCH_BATCH_SIZE)]
+        else:
+            groups = [[batch_queue_item]
+                      for batch_queue_item in batch_queue_items]
+
+        if pool is not None:
+            async_results = [pool.apply_async(_process_items, (job, group))
+                             for group in groups]
+
+        results = {}
+        processed = []
+        try:
+            for i, group in enumerate(groups):
+                if pool is None:
+                    group_results = self._processItems(job, group)
+                else:
+                    group_results = async_results[i].get()
+                for (id_, _, _), result in zip(group, group_results):
+                    results[id_] = result
+
+                # Write results in the original order, as far as we have them.
+                while len(processed) < len(batch_queue_items):
+                    id_ = batch_queue_items[len(processed)][0]
+                    if id_ not in results:
+                        break
+                    self.__writeResult(job, results.pop(id_))
+                    processed.append(id_)
+
+                if self.stopped():
+                    break
+        finally:
+            # Results must be written before we remove their items.
+            if job.id in self.__writers:
+                self.__writers[job.id].flush()
+            queries.remove_batch_queue_items(processed)
+    #__processItems
+
+    def __writeResult(self, job, result):
+        """
+        Write a result line to the batch job result file, creating the file
+        with a header if it does not yet exist.
+
+        @arg job: The batch job.
+        @type job: BatchJobInfo
+        @arg result: Result line (including separator), None is ignored.
+        @type result: unicode
+        """
+        if result is None:
+            return
+
+        if job.id not in self.__writers:
+            self.__writers[job.id] = ResultWriter(job)
+        self.__writers[job.id].write(result)
+    #__writeResult
+
+    def _processItems(self, job, batch_queue_items):
+        """
+        Process batch queue items of a job in order.
+
+        Name checker items are expected to share their reference sequence,
+        which is loaded only once. Batch flags set by processing a name
+        checker item are also applied to the remaining items. The dbSNP
+        records for SNP converter items are retrieved at once.
+
+        @arg job: The batch job.
+        @type job: BatchJobInfo
+        @arg batch_queue_items: Batch queue items as tuples of id, item and
+            flags.
+        @type batch_queue_items: list(tuple)
+
+        @return: Result lines for the batch job result file, in the same
+            order.
+        @rtype: list(unicode)
+        """
+        if job.job_type == 'snp-converter':
+            ncbi.fetch_rsid_descriptions(
+                [item for _, item, flags in batch_queue_items
+                 if not flags or 'S' not in flags])
+
+        if job.job_type != 'name-checker':
+            return [self._processItem(job, item, flags)
+                    for _, item, flags in batch_queue_items]
+
+        records = {}
+        pending = [[item, flags] for _, item, flags in batch_queue_items]
+        results = []
+
+        for i, (item, flags) in enumerate(pending):
+            results.append(self._processNameBatch(
+                job, item, flags, records=records, pending=pending[i + 1:]))
+
+        return results
+    #_processItems
+
+    def _processItem(self, job, item, flags):
+        """
+        Process a batch queue item according to the job type.
+
+        @arg job: The batch job.
+        @type job: BatchJobInfo
+        @arg item: The batch queue item.
+        @type item: unicode
+        @arg flags: Flags of the batch queue item.
+        @type flags: unicode
+
+        @return: Result line for the batch job result file (including
+            separator), or None for an unknown job type.
+        @rtype: unicode
+        """
+        if job.job_type == 'name-checker':
+            return self._processNameBatch(job, item, flags)
+        elif job.job_type == 'syntax-checker':
+            return self._processSyntaxCheck(job, item, flags)
+        elif job.job_type == 'position-converter':
+            return self._processConversion(job, item, flags)
+        elif job.job_type == 'snp-converter':
+            return self._processSNP(job, item, flags)
+        else:
+            # Unknown job type, should never happen.
+            # Todo: Log some screaming message.
+            return None
+    #_processItem
+
+    def _processNameBatch(self, batch_job, cmd, flags, records=None,
+                          pending=None):
+        """
+        Process an entry from the Name Batch and return the result line
+        for the job-file. If an Exception is raised, catch and continue.
+
+        @arg batch_job: The batch job
+        @type batch_job: BatchJobInfo
         @arg cmd: The NameChecker input
         @type cmd:
-        @arg i: The JobID
-        @type i:
         @arg flags: Flags of the current entry
         @type flags:
+        @arg records: Loaded records by record id, shared between entries
+        @type records: dict
+        @arg pending: Remaining entries of the job that are already taken
+            from the database, as lists of item and flags
+        @type pending: list(list)
+
+        @return: Result line (including separator)
+        @rtype: unicode
         """
         O = Output(__file__)
         O.addMessage(__file__, -1, "INFO",
@@ -468,7 +900,7 @@ Mutalyzer batch scheduler""" % download_url)
         if not skip :
             #Run mutalyzer and get values from Output Object 'O'
             try :
-                variantchecker.check_variant(cmd, O)
+                variantchecker.check_variant(cmd, O, records=records)
             except Exception:
                 #Catch all exceptions related to the processing of cmd
                 O.addMessage(__file__, 4, "EBATCHU",
@@ -487,7 +919,7 @@ Mutalyzer batch scheduler""" % download_url)
             #except
             finally :
                 #check if we need to update the database
-                self._updateDbFlags(O, batch_job.id)
+                self._updateDbFlags(O, batch_job.id, pending)
         #if
 
         batchOutput = O.getOutput("batchDone")
@@ -498,60 +930,31 @@ Mutalyzer batch scheduler""" % download_url)
         if batchOutput :
             outputline += batchOutput[0]
 
-        #Output
-        filename = "%s/batch-job-%s.txt" % (settings.CACHE_DIR, batch_job.result_id)
-        if not os.path.exists(filename) :
-            # If the file does not yet exist, create it with the correct
-            # header above it. The header is read from the config file as
-            # a list. We need a tab delimited string.
-            header = ['Input',
-                      'Errors and warnings',
-                      'AccNo',
-                      'Genesymbol',
-                      'Variant',
-                      'Reference Sequence Start Descr.',
-                      'Coding DNA Descr.',
-                      'Protein Descr.',
-                      'GeneSymbol Coding DNA Descr.',
-                      'GeneSymbol Protein Descr.',
-                      'Genomic Reference',
-                      'Coding Reference',
-                      'Protein Reference',
-                      'Affected Transcripts',
-                      'Affected Proteins',
-                      'Restriction Sites Created',
-                      'Restriction Sites Deleted']
-            handle = io.open(filename, mode='a', encoding='utf-8')
-            handle.write("%s\n" % "\t".join(header))
-        #if
-        else :
-            handle = io.open(filename, mode='a', encoding='utf-8')
-
         if flags and 'C' in flags:
             separator = '\t'
         else:
             separator = '\n'
 
-        handle.write("%s%s" % (outputline, separator))
-        handle.close()
+        result = "%s%s" % (outputline, separator)
         O.addMessage(__file__, -1, "INFO",
             "Finished NameChecker batchvariant " + cmd)
+        return result
     #_processNameBatch
 
     def _processSyntaxCheck(self, batch_job, cmd, flags):
         """
-        Process an entry from the Syntax Check, write the results
-        to the job-file.
-
-        Side-effect:
-            - Output written to outputfile
+        Process an entry from the Syntax Check and return the result line
+        for the job-file.
 
+        @arg batch_job: The batch job
+        @type batch_job: BatchJobInfo
         @arg cmd:   The Syntax Checker input
         @type cmd:
-        @arg i:     The JobID
-        @type i:
         @arg flags: Flags of the current entry
         @type flags:
+
+        @return: Result line (including separator)
+        @rtype: unicode
         """
         output = Output(__file__)
         grammar = Grammar(output)
@@ -573,48 +976,34 @@ Mutalyzer batch scheduler""" % download_url)
         else :
             result = "|".join(output.getBatchMessages(2))
 
-        #Output
-        filename = "%s/batch-job-%s.txt" % (settings.CACHE_DIR, batch_job.result_id)
-        if not os.path.exists(filename) :
-            # If the file does not yet exist, create it with the correct
-            # header above it. The header is read from the config file as
-            # a list. We need a tab delimited string.
-            header = ['Input', 'Status']
-            handle = io.open(filename, mode='a', encoding='utf-8')
-            handle.write("%s\n" % "\t".join(header))
-        #if
-        else :
-            handle = io.open(filename, mode='a', encoding='utf-8')
-
         if flags and 'C' in flags:
             separator = '\t'
         else:
             separator = '\n'
 
-        handle.write("%s\t%s%s" % (cmd, result, separator))
-        handle.close()
+        result = "%s\t%s%s" % (cmd, result, separator)
         output.addMessage(__file__, -1, "INFO",
                           "Finished SyntaxChecker batchvariant " + cmd)
+        return result
     #_processSyntaxCheck
 
     def _processConversion(self, batch_job, cmd, flags):
         """
-        Process an entry from the Position Converter, write the results
-        to the job-file. The Position Converter is wrapped in a try except
-        block which ensures that he Batch Process keeps running. Errors
-        are caught and the user will be notified.
-
-        Side-effect:
-            - Output written to outputfile.
-
+        Process an entry from the Position Converter and return the result
+        line for the job-file. The Position Converter is wrapped in a try
+        except block which ensures that he Batch Process keeps running.
+        Errors are caught and the user will be notified.
+
+        @arg batch_job: The batch job, its argument is the build to use for
+            the converter
+        @type batch_job: BatchJobInfo
         @arg cmd: The Syntax Checker input
         @type cmd: unicode
-        @arg i: The JobID
-        @type i: integer
-        @arg build: The build to use for the converter
-        @type build: unicode
         @arg flags: Flags of the current entry
         @type flags:
+
+        @return: Result line (including separator)
+        @rtype: unicode
         """
         O = Output(__file__)
         variant = cmd
@@ -682,48 +1071,32 @@ Mutalyzer batch scheduler""" % download_url)
 
         error = "%s" % "|".join(O.getBatchMessages(2))
 
-        #Output
-        filename = "%s/batch-job-%s.txt" % (settings.CACHE_DIR, batch_job.result_id)
-        if not os.path.exists(filename) :
-            # If the file does not yet exist, create it with the correct
-            # header above it. The header is read from the config file as
-            # a list. We need a tab delimited string.
-            header = ['Input Variant',
-                      'Errors',
-                      'Chromosomal Variant',
-                      'Coding Variant(s)']
-            handle = io.open(filename, mode='a', encoding='utf-8')
-            handle.write("%s\n" % "\t".join(header))
-        #if
-        else :
-            handle = io.open(filename, mode='a', encoding='utf-8')
-
         if flags and 'C' in flags:
             separator = '\t'
         else:
             separator = '\n'
 
-        handle.write("%s\t%s\t%s\t%s%s" % (cmd, error, gName, "\t".join(cNames), separator))
-        handle.close()
+        result = "%s\t%s\t%s\t%s%s" % (cmd, error, gName, "\t".join(cNames), separator)
         O.addMessage(__file__, -1, "INFO",
             "Finisehd PositionConverter batchvariant " + cmd)
+        return result
     #_processConversion
 
 
     def _processSNP(self, batch_job, cmd, flags):
         """
-        Process an entry from the SNP converter Batch, write the results
-        to the job-file. If an Exception is raised, catch and continue.
-
-        Side-effect:
-            - Output written to outputfile.
+        Process an entry from the SNP converter Batch and return the result
+        line for the job-file. If an Exception is raised, catch and continue.
 
+        @arg batch_job: The batch job
+        @type batch_job: BatchJobInfo
         @arg cmd: The SNP converter input
         @type cmd:
-        @arg i: The JobID
-        @type i:
         @arg flags: Flags of the current entry
         @type flags:
+
+        @return: Result line (including separator)
+        @rtype: unicode
         """
         O = Output(__file__)
         O.addMessage(__file__, -1, "INFO",
@@ -744,30 +1117,15 @@ Mutalyzer batch scheduler""" % download_url)
         outputline += "%s\t" % "|".join(descriptions)
         outputline += "%s\t" % "|".join(O.getBatchMessages(2))
 
-        #Output
-        filename = "%s/batch-job-%s.txt" % (settings.CACHE_DIR, batch_job.result_id)
-        if not os.path.exists(filename) :
-            # If the file does not yet exist, create it with the correct
-            # header above it. The header is read from the config file as
-            # a list. We need a tab delimited string.
-            header = ['Input Variant',
-                      'HGVS description(s)',
-                      'Errors and warnings']
-            handle = io.open(filename, mode='a', encoding='utf-8')
-            handle.write("%s\n" % "\t".join(header))
-        #if
-        else :
-            handle = io.open(filename, mode='a', encoding='utf-8')
-
         if flags and 'C' in flags:
             separator = '\t'
         else:
             separator = '\n'
 
-        handle.write("%s%s" % (outputline, separator))
-        handle.close()
+        result = "%s%s" % (outputline, separator)
         O.addMessage(__file__, -1, "INFO",
                      "Finished SNP converter batch rs%s" % cmd)
+        return result
     #_processSNP
 
     def addJob(self, email, queue, columns, job_type, argument=None):
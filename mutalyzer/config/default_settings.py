@@ -25,6 +25,38 @@ BATCH_NOTIFICATION_EMAIL = None
 # reference files from NCBI or user) and batch job results.
 CACHE_DIR = '/tmp'
 
+# Shared record store for reference files, used by all hosts in addition to
+# their own cache directory. Either a directory (e.g., on a network file
+# system) or a Redis URI (e.g., 'redis://localhost'). If `None`, no shared
+# record store is used.
+RECORD_STORE = None
+
+# Maximum total sequence length of parsed GenBank records kept in memory by
+# each process (in bases). Set to 0 to disable the in-memory record cache.
+RECORD_CACHE_SIZE = 50 * 1000 * 1000 # 50 Mbp
+
+# Maximum number of parsed variant descriptions kept in memory by each process.
+# Set to 0 to disable the in-memory parse cache.
+PARSE_CACHE_SIZE = 10000
+
+# Maximum number of transcript coordinate mappers (crossmappers) kept in memory
+# by each process. Set to 0 to disable the in-memory crossmapper cache.
+CROSSMAP_CACHE_SIZE = 10000
+
+# Maximum total length of reference CDS sequences including their 3' UTR (with
+# their translations) kept in memory by each process (in bases). Set to 0 to
+# disable the in-memory CDS cache.
+CDS_CACHE_SIZE = 10 * 1000 * 1000 # 10 Mbp
+
+# Variants are described on transcripts overlapping the variant with this
+# flank (in bases) and on the selected transcript. Set to `None` to describe
+# variants on all transcripts in the reference sequence.
+TRANSCRIPT_FLANK = 5000
+
+# Analyse the effects of variants on restriction sites. Set to `False` if the
+# restriction sites are not used (e.g., only batch or webservice use).
+RESTRICTION_ANALYSIS = True
+
 # Maximum size for uploaded and downloaded files (in bytes).
 MAX_FILE_SIZE = 10 * 1048576 # 10 MB
 
@@ -70,10 +102,32 @@ LRG_PREFIX_URL = 'ftp://ftp.ebi.ac.uk/pub/databases/lrgex/'
 # Allow for this fraction of errors in batch jobs.
 BATCH_JOBS_ERROR_THRESHOLD = 0.05
 
+# Number of worker processes used by the batch processor. With 1, batch jobs
+# are processed in the batch processor process itself.
+BATCH_PROCESSES = 1
+
+# Maximum number of batch queue items taken from a batch job at once by the
+# batch processor.
+BATCH_CHUNK_SIZE = 20
+
+# Store batch job result files gzip compressed.
+BATCH_RESULTS_GZIP = False
+
 # Cache expiration time for negative transcript<->protein links from the NCBI
 # (in seconds).
 NEGATIVE_LINK_CACHE_EXPIRATION = 60 * 60 * 24 * 30
 
+# Cache expiration time for HGVS descriptions of dbSNP records from the NCBI
+# (in seconds).
+SNP_CACHE_EXPIRATION = 60 * 60 * 24 * 7
+
+# Cache expiration time for non-existing dbSNP records (in seconds).
+NEGATIVE_SNP_CACHE_EXPIRATION = 60 * 60 * 24
+
+# Use an in-memory index of the transcript mappings for range queries (e.g.,
+# in the position converter) instead of querying the database.
+TRANSCRIPT_MAPPING_INDEX = False
+
 # URL to the website root (without trailing slash). Used for generating
 # download links in the batch scheduler.
 WEBSITE_ROOT_URL = None
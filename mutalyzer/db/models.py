@@ -5,14 +5,16 @@ Models backed by SQL using SQLAlchemy.
 
 from __future__ import unicode_literals
 
+import array
 from datetime import datetime
 import sqlite3
+import sys
 import uuid
 
 import binning
 from sqlalchemy import event, or_
 from sqlalchemy import (Boolean, Column, DateTime, Enum, ForeignKey, Index,
-                        Integer, String, Text, TypeDecorator)
+                        Integer, LargeBinary, String, TypeDecorator)
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import backref, relationship
 
@@ -42,26 +44,35 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
 
 class Positions(TypeDecorator):
     """
-    Represents an immutable list of integers as a concatentation of their
-    string serializations.
+    Represents an immutable list of integers as a packed array of 32-bit
+    signed integers in little-endian byte order.
+
+    Values are :class:`array.array` objects (lists of integers can also be
+    bound), decoded in bulk by the :mod:`array` module instead of parsing the
+    integers one by one.
 
     Adapted from the `Marshal JSON Strings
     <http://docs.sqlalchemy.org/en/latest/core/types.html#marshal-json-strings>`_
     example in the SQLAlchemy documentation.
     """
-    impl = Text
+    impl = LargeBinary
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            value = ','.join(unicode(i) for i in value)
+            positions = array.array(b'i', value)
+            if sys.byteorder == 'big':
+                positions.byteswap()
+            value = positions.tostring()
         return value
 
     def process_result_value(self, value, dialect):
         if value is None:
             return None
-        if value == '':
-            return []
-        return [int(s) for s in value.split(',')]
+        positions = array.array(b'i')
+        positions.fromstring(bytes(value))
+        if sys.byteorder == 'big':
+            positions.byteswap()
+        return positions
 
 
 class BatchJob(db.Base):
@@ -354,12 +365,14 @@ class TranscriptMapping(db.Base):
     cds_stop = Column(Integer)
 
     #: The exon start positions of the transcript on the chromosome
-    #: (one-based, inclusive, in chromosomal orientation).
-    exon_starts = Column(Positions, nullable=False)
+    #: (one-based, inclusive, in chromosomal orientation) as a packed
+    #: :class:`array.array`. Use :attr:`exon_starts` for a list.
+    packed_exon_starts = Column('exon_starts', Positions, nullable=False)
 
-    #: The exon start positions of the transcript on the chromosome
-    #: (one-based, inclusive, in chromosomal orientation).
-    exon_stops = Column(Positions, nullable=False)
+    #: The exon stop positions of the transcript on the chromosome
+    #: (one-based, inclusive, in chromosomal orientation) as a packed
+    #: :class:`array.array`. Use :attr:`exon_stops` for a list.
+    packed_exon_stops = Column('exon_stops', Positions, nullable=False)
 
     #: If `False`, variant descriptions can use just the accession number
     #: without gene and transcript selector (e.g., ``NM_000020:c.1del``,
@@ -436,6 +449,30 @@ class TranscriptMapping(db.Base):
                    transcript=transcript, cds=cds,
                    select_transcript=select_transcript, version=version)
 
+    @property
+    def exon_starts(self):
+        """
+        List of exon start positions of the transcript on the chromosome
+        (one-based, inclusive, in chromosomal orientation).
+        """
+        return self.packed_exon_starts.tolist()
+
+    @exon_starts.setter
+    def exon_starts(self, exon_starts):
+        self.packed_exon_starts = array.array(b'i', exon_starts)
+
+    @property
+    def exon_stops(self):
+        """
+        List of exon stop positions of the transcript on the chromosome
+        (one-based, inclusive, in chromosomal orientation).
+        """
+        return self.packed_exon_stops.tolist()
+
+    @exon_stops.setter
+    def exon_stops(self, exon_stops):
+        self.packed_exon_stops = array.array(b'i', exon_stops)
+
     @property
     def coding(self):
         """
@@ -495,3 +532,53 @@ Index('transcript_mapping_transcript',
       TranscriptMapping.gene, TranscriptMapping.transcript,
       TranscriptMapping.chromosome_id,
       unique=True)
+
+
+class TranscriptProteinLink(db.Base):
+    """
+    Link between a transcript and its protein product, imported in bulk from
+    a local copy of the NCBI gene2refseq file.
+
+    These links are consulted before the transcript-protein link cache and
+    the NCBI Entrez service (see :mod:`mutalyzer.ncbi`).
+    """
+    __tablename__ = 'transcript_protein_links'
+    __table_args__ = {'mysql_engine': 'InnoDB', 'mysql_charset': 'utf8'}
+
+    id = Column(Integer, primary_key=True)
+
+    #: Accession number for the transcript, not including the version number
+    #: (e.g., ``NM_018195``).
+    transcript_accession = Column(String(20), nullable=False)
+
+    #: Version number for the transcript.
+    transcript_version = Column(Integer, nullable=False)
+
+    #: Accession number for the protein, not including the version number
+    #: (e.g., ``NP_060665``).
+    protein_accession = Column(String(20), nullable=False)
+
+    #: Version number for the protein.
+    protein_version = Column(Integer, nullable=False)
+
+    def __init__(self, transcript_accession, transcript_version,
+                 protein_accession, protein_version):
+        self.transcript_accession = transcript_accession
+        self.transcript_version = transcript_version
+        self.protein_accession = protein_accession
+        self.protein_version = protein_version
+
+    def __repr__(self):
+        return ('<TranscriptProteinLink transcript=%r protein=%r>'
+                % ('%s.%d' % (self.transcript_accession,
+                              self.transcript_version),
+                   '%s.%d' % (self.protein_accession, self.protein_version)))
+
+
+Index('transcript_protein_link_transcript',
+      TranscriptProteinLink.transcript_accession,
+      TranscriptProteinLink.transcript_version,
+      unique=True)
+Index('transcript_protein_link_protein',
+      TranscriptProteinLink.protein_accession,
+      TranscriptProteinLink.protein_version)
@@ -9,42 +9,248 @@ Queries on database models.
 
 from __future__ import unicode_literals
 
-from mutalyzer.db import session
-from mutalyzer.db.models import BatchQueueItem
+import bisect
+from collections import defaultdict
+from operator import attrgetter
+import threading
+import time
 
+import binning
+
+from mutalyzer.config import settings
+from mutalyzer.db import session, session_factory
+from mutalyzer.db.models import BatchQueueItem, Chromosome, TranscriptMapping
+from mutalyzer.redisclient import client as redis
 
-def pop_batch_queue_item(batch_job):
-    """
-    Get the next batch queue item for the given batch job. Return its fields
-    as a tuple `item`, `flags` and remove it from the database.
 
-    If no batch queue item could be found for this batch job, return `None`.
+#: Redis key for the version of the transcript mappings. It is incremented
+#: each time transcript mappings are changed.
+TRANSCRIPT_MAPPINGS_VERSION_KEY = 'transcript-mappings/version'
 
-    .. note:: Originally, finding the next batch queue item was done using a
-        more complicated query::
+# Minimum interval between checks of the transcript mappings version (in
+# seconds).
+TRANSCRIPT_MAPPINGS_VERSION_INTERVAL = 1
 
-            SELECT QueueID, Input, Flags
-            FROM BatchQueue
-            WHERE QueueID = (
-                SELECT MIN(QueueID)
-                FROM BatchQueue
-                GROUP BY JobID
-                HAVING JobID = {batch_job.id}
-            );
 
-        However, I couldn't see any significant performance difference in my
-        latest benchmarks, so we stick with the more obvious query for now.
+def get_batch_queue_items(batch_job, count):
+    """
+    Get the next batch queue items for the given batch job, at most `count`
+    of them. Return their fields as a list of tuples `id`, `item`, `flags`.
+
+    The batch queue items are not removed from the database, use
+    :func:`remove_batch_queue_items` for that once they are processed. This
+    way, batch queue items that were not completed are not lost (e.g., in
+    case of a crash).
     """
-    batch_queue_item = BatchQueueItem.query \
+    return session.query(BatchQueueItem.id,
+                         BatchQueueItem.item,
+                         BatchQueueItem.flags) \
         .filter_by(batch_job=batch_job) \
         .order_by(BatchQueueItem.id.asc()) \
-        .first()
-    if batch_queue_item is None:
-        return None
+        .limit(count) \
+        .all()
 
-    item, flags = batch_queue_item.item, batch_queue_item.flags
 
-    session.delete(batch_queue_item)
+def remove_batch_queue_items(ids):
+    """
+    Remove batch queue items by id in one transaction.
+    """
+    if not ids:
+        return
+
+    BatchQueueItem.query \
+        .filter(BatchQueueItem.id.in_(ids)) \
+        .delete(synchronize_session=False)
     session.commit()
 
-    return item, flags
+
+# Order of transcript mappings returned by range queries.
+_transcript_mapping_order = attrgetter(
+    'start', 'stop', 'gene', 'accession', 'version', 'transcript')
+
+
+class TranscriptMappingIndex(object):
+    """
+    In-memory index of the transcript mappings in an assembly for range
+    queries.
+
+    Per chromosome, the transcript mappings are stored in a list sorted by
+    start position (and further in the same order as the SQL range queries).
+    Together with the maximum transcript length on the chromosome, this
+    bounds the part of the list that can overlap a given range, which we find
+    by bisection.
+
+    The transcript mappings are detached from any database session and must
+    not be modified.
+    """
+    def __init__(self, mappings):
+        """
+        :arg mappings: Transcript mappings to index.
+        :type mappings: iterable(TranscriptMapping)
+        """
+        by_chromosome = defaultdict(list)
+        for mapping in mappings:
+            by_chromosome[mapping.chromosome_id].append(mapping)
+
+        self._chromosomes = {}
+        for chromosome_id, mappings in by_chromosome.items():
+            mappings.sort(key=_transcript_mapping_order)
+            self._chromosomes[chromosome_id] = (
+                [mapping.start for mapping in mappings],
+                max(mapping.stop - mapping.start for mapping in mappings),
+                mappings)
+
+    def overlapping(self, chromosome_id, start, stop):
+        """
+        Get transcript mappings overlapping a range.
+
+        :arg int chromosome_id: Chromosome database id.
+        :arg int start: Start of the range (one-based, inclusive).
+        :arg int stop: Stop of the range (one-based, inclusive).
+
+        :returns: Transcript mappings overlapping the range.
+        :rtype: list(TranscriptMapping)
+        """
+        try:
+            starts, max_length, mappings = self._chromosomes[chromosome_id]
+        except KeyError:
+            return []
+
+        first = bisect.bisect_left(starts, start - max_length)
+        last = bisect.bisect_right(starts, stop)
+        return [mapping for mapping in mappings[first:last]
+                if mapping.stop >= start]
+
+    def contained(self, chromosome_id, start, stop):
+        """
+        Get transcript mappings contained in a range.
+
+        :arg int chromosome_id: Chromosome database id.
+        :arg int start: Start of the range (one-based, inclusive).
+        :arg int stop: Stop of the range (one-based, inclusive).
+
+        :returns: Transcript mappings contained in the range.
+        :rtype: list(TranscriptMapping)
+        """
+        try:
+            starts, _, mappings = self._chromosomes[chromosome_id]
+        except KeyError:
+            return []
+
+        first = bisect.bisect_left(starts, start)
+        last = bisect.bisect_right(starts, stop)
+        return [mapping for mapping in mappings[first:last]
+                if mapping.stop <= stop]
+
+
+# Transcript mapping indices by assembly id, the transcript mappings version
+# they are valid for, and the time we last checked that version.
+_transcript_mapping_indices = {}
+_transcript_mapping_state = {'version': None, 'checked': 0}
+_transcript_mapping_lock = threading.Lock()
+
+
+def _reset_transcript_mapping_indices(value=None):
+    """
+    Discard all transcript mapping indices.
+    """
+    with _transcript_mapping_lock:
+        _transcript_mapping_indices.clear()
+        _transcript_mapping_state.update(version=None, checked=0)
+
+
+settings.on_update(_reset_transcript_mapping_indices, 'DATABASE_URI')
+settings.on_update(_reset_transcript_mapping_indices, 'REDIS_URI')
+
+
+def _get_transcript_mapping_index(assembly_id):
+    """
+    Get the transcript mapping index for an assembly, loading it from the
+    database if needed.
+
+    Loaded indices are discarded if the transcript mappings version in Redis
+    changed, which is checked at most every
+    `TRANSCRIPT_MAPPINGS_VERSION_INTERVAL` seconds.
+    """
+    with _transcript_mapping_lock:
+        now = time.time()
+        if (now - _transcript_mapping_state['checked'] >=
+                TRANSCRIPT_MAPPINGS_VERSION_INTERVAL):
+            version = redis.get(TRANSCRIPT_MAPPINGS_VERSION_KEY)
+            if version != _transcript_mapping_state['version']:
+                _transcript_mapping_indices.clear()
+            _transcript_mapping_state.update(version=version, checked=now)
+
+        try:
+            return _transcript_mapping_indices[assembly_id]
+        except KeyError:
+            pass
+
+        # We use a separate session, so the transcript mappings are detached
+        # when we close it.
+        load_session = session_factory()
+        try:
+            mappings = load_session.query(TranscriptMapping) \
+                .join(TranscriptMapping.chromosome) \
+                .filter(Chromosome.assembly_id == assembly_id) \
+                .all()
+        finally:
+            load_session.close()
+
+        index = TranscriptMappingIndex(mappings)
+        _transcript_mapping_indices[assembly_id] = index
+        return index
+
+
+def invalidate_transcript_mappings():
+    """
+    Mark the transcript mappings as changed, so transcript mapping indices
+    are reloaded by all processes.
+    """
+    redis.incr(TRANSCRIPT_MAPPINGS_VERSION_KEY)
+    _reset_transcript_mapping_indices()
+
+
+def get_transcript_mappings(chromosome, start, stop, contained=False):
+    """
+    Get the transcript mappings on a chromosome overlapping a range, ordered
+    by start, stop, gene, accession, version, and transcript.
+
+    If the `TRANSCRIPT_MAPPING_INDEX` configuration setting is `True`, we
+    use an in-memory index of the transcript mappings instead of querying the
+    database.
+
+    :arg chromosome: Chromosome.
+    :type chromosome: mutalyzer.db.models.Chromosome
+    :arg int start: Start of the range (one-based, inclusive).
+    :arg int stop: Stop of the range (one-based, inclusive).
+    :arg bool contained: If `True`, only get transcript mappings that are
+      completely contained in the range.
+
+    :returns: Transcript mappings.
+    :rtype: list(mutalyzer.db.models.TranscriptMapping)
+    """
+    if settings.TRANSCRIPT_MAPPING_INDEX:
+        index = _get_transcript_mapping_index(chromosome.assembly_id)
+        if contained:
+            return index.contained(chromosome.id, start, stop)
+        return index.overlapping(chromosome.id, start, stop)
+
+    if contained:
+        bins = binning.contained_bins(start - 1, stop)
+        range_filter = (TranscriptMapping.bin.in_(bins),
+                        TranscriptMapping.start >= start,
+                        TranscriptMapping.stop <= stop)
+    else:
+        bins = binning.overlapping_bins(start - 1, stop)
+        range_filter = (TranscriptMapping.bin.in_(bins),
+                        TranscriptMapping.start <= stop,
+                        TranscriptMapping.stop >= start)
+
+    return chromosome.transcript_mappings.filter(*range_filter).order_by(
+        TranscriptMapping.start,
+        TranscriptMapping.stop,
+        TranscriptMapping.gene,
+        TranscriptMapping.accession,
+        TranscriptMapping.version,
+        TranscriptMapping.transcript).all()
@@ -9,6 +9,7 @@ import argparse
 import codecs
 import json
 import locale
+import multiprocessing
 import os
 
 import alembic.command
@@ -19,11 +20,16 @@ from sqlalchemy.orm.exc import NoResultFound
 
 from . import _cli_string
 from .. import announce
+from ..config import settings
 from .. import db
 from ..db import session
-from ..db.models import Assembly, BatchJob, BatchQueueItem, Chromosome
+from ..db.models import (Assembly, BatchJob, BatchQueueItem, Chromosome,
+                         Reference)
 from .. import mapping
+from .. import ncbi
 from .. import output
+from ..parsers import genbank
+from .. import Retriever
 from .. import sync
 from .. import util
 
@@ -152,6 +158,21 @@ def import_reference(assembly_name_or_alias, reference):
     mapping.import_from_reference(assembly, reference)
 
 
+def import_protein_links(gene2refseq_file, encoding, taxonomy_id=9606):
+    """
+    Import transcript-protein links from an NCBI gene2refseq file.
+    """
+    # For long-running processes it can be convenient to have a short and
+    # human-readable process name.
+    util.set_process_name('mutalyzer: protein-links-import')
+
+    gene2refseq_file = codecs.getreader(encoding)(gene2refseq_file)
+
+    count = ncbi.import_links_from_gene2refseq(gene2refseq_file,
+                                               taxonomy_id=taxonomy_id)
+    print 'Imported %d transcript-protein links' % count
+
+
 def sync_cache(wsdl_url, url_template, history=7):
     """
     Synchronize the database cache with another Mutalyzer instance.
@@ -222,6 +243,59 @@ def list_batch_jobs():
             **lengths)
 
 
+def _preparse_record(reference):
+    """
+    Parse a cached GenBank file and store the serialized record. Worker for
+    :func:`preparse_records`.
+    """
+    accession, checksum = reference
+    try:
+        record = genbank.GBparser().create_record(
+            os.path.join(settings.CACHE_DIR, '%s.gb.bz2' % accession))
+    except Exception as e:
+        return accession, unicode(e)
+    record.id = accession
+    if not Retriever.write_parsed_record(accession, checksum, record):
+        return accession, 'could not write serialized record'
+    return accession, None
+
+
+def preparse_records(processes=None, force=False):
+    """
+    Store serialized parsed records for GenBank files in the cache.
+
+    Files are parsed in parallel by a pool of worker processes. Parsed records
+    that are up to date are skipped unless `force` is set.
+    """
+    # For long-running processes it can be convenient to have a short and
+    # human-readable process name.
+    util.set_process_name('mutalyzer: preparse-records')
+
+    references = [(reference.accession, reference.checksum)
+                  for reference in Reference.query.order_by(Reference.id)]
+    db.session.remove()
+
+    references = [
+        (accession, checksum) for accession, checksum in references
+        if os.path.isfile(os.path.join(settings.CACHE_DIR,
+                                       '%s.gb.bz2' % accession)) and
+        (force or Retriever.read_parsed_record(accession, checksum) is None)]
+
+    pool = multiprocessing.Pool(processes)
+    parsed = 0
+    try:
+        for accession, error in pool.imap_unordered(_preparse_record,
+                                                    references):
+            if error is None:
+                parsed += 1
+            else:
+                print 'Could not parse %s: %s' % (accession, error)
+    finally:
+        pool.terminate()
+
+    print 'Stored %d parsed records.' % parsed
+
+
 def set_announcement(body, url=None):
     """
     Set announcement to show to the user.
@@ -402,6 +476,41 @@ def main():
         description=list_batch_jobs.__doc__.split('\n\n')[0])
     p.set_defaults(func=list_batch_jobs)
 
+    # Subparser 'preparse-records'.
+    p = subparsers.add_parser(
+        'preparse-records', help='store parsed records for cached files',
+        description=preparse_records.__doc__.split('\n\n')[0],
+        epilog='Parsed records are used instead of the GenBank files when '
+        'loading references, this converts the existing cache.')
+    p.add_argument(
+        '-p', '--processes', metavar='NUMBER', dest='processes', type=int,
+        help='number of worker processes (default: number of CPUs)')
+    p.add_argument(
+        '-f', '--force', dest='force', action='store_true',
+        help='also parse files that have an up to date parsed record')
+    p.set_defaults(func=preparse_records)
+
+    # Subparser 'import-protein-links'.
+    p = subparsers.add_parser(
+        'import-protein-links',
+        help='import transcript-protein links from NCBI gene2refseq file',
+        description=import_protein_links.__doc__.split('\n\n')[0],
+        epilog='All existing links are replaced. Links are used when parsing '
+        'GenBank records, before querying the cache and the NCBI.')
+    p.add_argument(
+        'gene2refseq_file', metavar='FILE', type=argparse.FileType('rb'),
+        help='uncompressed gene2refseq file from the NCBI (example: '
+        'gene2refseq), use - for standard input')
+    p.add_argument(
+        '--encoding', metavar='ENCODING', type=_cli_string,
+        default=default_encoding,
+        help='input file encoding (default: %s)' % default_encoding)
+    p.add_argument(
+        '-t', '--taxonomy', metavar='TAXONOMY_ID', dest='taxonomy_id',
+        type=int, default=9606,
+        help='import only links for this NCBI taxonomy id (default: 9606)')
+    p.set_defaults(func=import_protein_links)
+
     # Subparser 'sync-cache'.
     p = subparsers.add_parser(
         'sync-cache', help='synchronize cache with remote Mutalyzer',
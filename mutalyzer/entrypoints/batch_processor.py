@@ -19,15 +19,18 @@ from .. import Scheduler
 from .. import util
 
 
-def process():
+def process(processes=None):
     """
     Run forever in a loop processing scheduled batch jobs.
+
+    :arg int processes: Number of worker processes (default is the
+      `BATCH_PROCESSES` configuration setting).
     """
     # For long-running processes it can be convenient to have a short and
     # human-readable process name.
     util.set_process_name('mutalyzer: batch-processor')
 
-    scheduler = Scheduler.Scheduler()
+    scheduler = Scheduler.Scheduler(processes=processes)
 
     def handle_exit(signum, stack_frame):
         if scheduler.stopped():
@@ -66,8 +69,13 @@ def main():
         epilog='The process can be shutdown gracefully by sending a SIGINT '
         '(Ctrl+C) or SIGTERM signal.')
 
-    parser.parse_args()
-    process()
+    parser.add_argument(
+        '-p', '--processes', metavar='NUMBER', dest='processes', type=int,
+        help='number of worker processes (default: BATCH_PROCESSES '
+        'configuration setting)')
+
+    args = parser.parse_args()
+    process(processes=args.processes)
 
 
 if __name__ == '__main__':
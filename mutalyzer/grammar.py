@@ -23,6 +23,49 @@ from __future__ import unicode_literals
 
 from pyparsing import *
 
+from mutalyzer.config import settings
+from mutalyzer import stats
+from mutalyzer import util
+
+
+# Packrat speeds up parsing considerably. This is a global pyparsing setting.
+ParserElement.enablePackrat()
+
+
+# In-process cache of parse results, created on first use.
+_parse_cache = None
+
+
+def _get_parse_cache():
+    """
+    Get the in-process cache of parse results.
+
+    Parse results are keyed by the variant description and the cache size is
+    the number of descriptions (see the `PARSE_CACHE_SIZE` configuration
+    setting).
+
+    @return: The parse cache.
+    @rtype: util.LRUCache
+    """
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = util.LRUCache(settings.PARSE_CACHE_SIZE)
+    return _parse_cache
+#_get_parse_cache
+
+
+def _reset_parse_cache(value):
+    """
+    Discard the parse cache so that it is recreated on next use.
+    """
+    global _parse_cache
+    _parse_cache = None
+#_reset_parse_cache
+
+
+# Recreate the parse cache if configuration is updated.
+settings.on_update(_reset_parse_cache, 'PARSE_CACHE_SIZE')
+
 
 class Grammar():
     """
@@ -65,7 +108,10 @@ class Grammar():
     Nt = Word('acgturykmswbdhvnACGTURYKMSWBDHVN', exact=1)
 
     # BNF: NtString -> Nt+
-    NtString = Combine(OneOrMore(Nt))
+    # Note: This is equivalent to Combine(OneOrMore(Nt)), but matching the
+    #     string with one regular expression instead of one token per
+    #     nucleotide makes parsing long sequences (e.g., insertions) fast.
+    NtString = Regex('[acgturykmswbdhvnACGTURYKMSWBDHVN]+')
 
     # BNF: Number -> [0-9]+
     Number = Word(unicode(nums))
@@ -464,14 +510,13 @@ class Grammar():
 
     def __init__(self, output):
         """
-        Initialise the class and enable packrat parsing. Packrat speeds up
-        parsing considerably.
+        Initialise the class. The grammar itself is defined on the class and
+        shared by all instances.
 
         @arg output: The output object.
         @type output: mutalyzer.output.Output
         """
         self._output = output
-        ParserElement.enablePackrat()
     #__init__
 
     def parse(self, variant):
@@ -480,6 +525,9 @@ class Grammar():
         successful. Otherwise print the parse error and the position in
         the input where the error occurred (and return None).
 
+        Parse results are cached, so the returned parse tree may be shared
+        with other callers and must not be modified.
+
         @arg variant: The input string that needs to be parsed.
         @type variant: unicode
 
@@ -490,18 +538,48 @@ class Grammar():
         @todo: Use information in ParseException as described here:
             http://pyparsing.wikispaces.com/HowToUsePyparsing
         """
+        parse_cache = _get_parse_cache()
+
+        result = parse_cache.get(variant)
+        if result is not None:
+            stats.increment_counter_locally('parse-cache/hit')
+        else:
+            stats.increment_counter_locally('parse-cache/miss')
+            result = self._parse(variant)
+            for _ in range(parse_cache.put(variant, result)):
+                stats.increment_counter_locally('parse-cache/eviction')
+
+        parse_tree, error = result
+        if error is not None:
+            # Log parse error and the position where it occurred.
+            message, pos = error
+            self._output.addMessage(__file__, 4, 'EPARSE', message)
+            self._output.addOutput('parseError', variant)
+            self._output.addOutput('parseError', pos * ' ' + '^')
+        return parse_tree
+    #parse
+
+    def _parse(self, variant):
+        """
+        Parse the input string.
+
+        @arg variant: The input string that needs to be parsed.
+        @type variant: unicode
+
+        @return: Tuple of the parse tree (or None in case of a parsing error)
+                 and the parse error (or None). The parse error is a tuple of
+                 the error message and the position in the input where the
+                 error occurred.
+        @rtype: tuple(pyparsing.ParseResults, tuple(unicode, int))
+        """
         try:
-            return self.Var.parseString(variant, parseAll=True)
+            return self.Var.parseString(variant, parseAll=True), None
             # Todo: check .dump()
         except ParseException as err:
             #print err.line
             #print " "*(err.column-1) + "^"
             #print err
-            # Log parse error and the position where it occurred.
-            self._output.addMessage(__file__, 4, 'EPARSE', unicode(err))
             pos = int(unicode(err).split(':')[-1][:-1]) - 1
-            self._output.addOutput('parseError', variant)
-            self._output.addOutput('parseError', pos * ' ' + '^')
-            return None
-    #parse
+            return None, (unicode(err), pos)
+    #_parse
 #Grammar
@@ -19,7 +19,7 @@ from operator import attrgetter, itemgetter
 import binning
 import MySQLdb
 
-from mutalyzer.db import session
+from mutalyzer.db import queries, session
 from mutalyzer.db.models import Chromosome, TranscriptMapping
 from mutalyzer.grammar import Grammar
 from mutalyzer.models import SoapMessage, Mapping, Transcript
@@ -29,6 +29,12 @@ from mutalyzer import Retriever
 from mutalyzer import util
 
 
+#: Maximum distance (in bp) between the first positions of chromosomal
+#: variants for which :meth:`Converter.convert_batch` looks up the transcript
+#: mappings with one query.
+CONVERSION_BATCH_WINDOW = 1000000
+
+
 class MapviewSortError(Exception):
     pass
 
@@ -127,6 +133,10 @@ class Converter(object) :
         self.parseTree = None
         self.crossmap = None
         self.mapping = None
+
+        # Transcript mappings and crossmappers reused during batch conversion
+        self._mapping_cache = None
+        self._crossmap_cache = None
     #__init__
 
     def _reset(self) :
@@ -173,6 +183,11 @@ class Converter(object) :
         @kwarg selector_version: Optional transcript version selector.
         @type selector_version: int
         """
+        cache_key = acc, version, selector, selector_version
+        if self._mapping_cache is not None and cache_key in self._mapping_cache:
+            self.mapping = self._mapping_cache[cache_key]
+            return
+
         versions = [m.version for m in TranscriptMapping.query.filter(
                       TranscriptMapping.accession == acc,
                       TranscriptMapping.chromosome.has(assembly=self.assembly))]
@@ -225,6 +240,8 @@ class Converter(object) :
                     return
 
             self.mapping = mapping
+            if self._mapping_cache is not None:
+                self._mapping_cache[cache_key] = mapping
             return
 
         if not version:
@@ -264,15 +281,27 @@ class Converter(object) :
         if not self.mapping:
             return None
 
-        # Create Mutalyzer compatible exon list.
-        mrna = []
-        for exon in zip(self.mapping.exon_starts, self.mapping.exon_stops):
-            mrna.extend(exon)
+        if self._crossmap_cache is not None:
+            try:
+                self.crossmap = self._crossmap_cache[self.mapping.id]
+                return self.crossmap
+            except KeyError:
+                pass
+
+        # Create Mutalyzer compatible exon list, interleaving the packed exon
+        # starts and stops without converting them to lists.
+        starts = self.mapping.packed_exon_starts
+        stops = self.mapping.packed_exon_stops
+        mrna = starts + stops
+        mrna[::2] = starts
+        mrna[1::2] = stops
 
         cds = self.mapping.cds or []
         orientation = 1 if self.mapping.orientation == 'forward' else -1
 
-        self.crossmap = Crossmap.Crossmap(mrna, cds, orientation)
+        self.crossmap = Crossmap.get_crossmap(mrna, cds, orientation)
+        if self._crossmap_cache is not None:
+            self._crossmap_cache[self.mapping.id] = self.crossmap
         return self.crossmap
     #makeCrossmap
 
@@ -688,7 +717,31 @@ class Converter(object) :
         @return: HGVS_notatations ;
         @rtype: dictionary or list
         """
+        region = self._chromosomal_region(variant)
+        if not region:
+            return None
+        chromosome, variants, start, stop = region
 
+        if gene:
+            mappings = chromosome.transcript_mappings.filter_by(gene=gene)
+        else:
+            mappings = queries.get_transcript_mappings(chromosome, start, stop)
+
+        return self._chrom2c(variants, mappings, rt)
+    #chrom2c
+
+    def _chromosomal_region(self, variant):
+        """
+        Parse a variant in I{g.} or I{m.} notation and get the region around
+        it where we look for transcripts.
+
+        @arg variant: a variant description
+        @type variant: unicode
+
+        @return: chromosome, raw variants, start and stop of the region (None
+            on error)
+        @rtype: tuple(object, list, integer, integer)
+        """
         if not self._parseInput(variant) :
             return None
 
@@ -728,24 +781,25 @@ class Converter(object) :
             min_loc = min(min_loc, loc)
             max_loc = max(max_loc, loc2)
 
-        if gene:
-            mappings = chromosome.transcript_mappings.filter_by(gene=gene)
-        else:
-            start = max(min_loc - 5000, 1)
-            stop = min(max_loc + 5000, binning.MAX_POSITION + 1)
-            bins = binning.overlapping_bins(start - 1, stop)
-            mappings = chromosome.transcript_mappings.filter(
-                TranscriptMapping.bin.in_(bins),
-                TranscriptMapping.start <= stop,
-                TranscriptMapping.stop >= start
-            ).order_by(
-                TranscriptMapping.start,
-                TranscriptMapping.stop,
-                TranscriptMapping.gene,
-                TranscriptMapping.accession,
-                TranscriptMapping.version,
-                TranscriptMapping.transcript)
+        start = max(min_loc - 5000, 1)
+        stop = min(max_loc + 5000, binning.MAX_POSITION + 1)
+        return chromosome, variants, start, stop
+    #_chromosomal_region
 
+    def _chrom2c(self, variants, mappings, rt):
+        """
+        Convert parsed chromosomal variants to the given transcripts.
+
+        @arg variants: raw variants from the current parse tree
+        @type variants: list
+        @arg mappings: transcript mappings to convert to
+        @type mappings: iterable(TranscriptMapping)
+        @arg rt: the return type
+        @type rt: unicode
+
+        @return: HGVS_notatations ;
+        @rtype: dictionary or list
+        """
         HGVS_notatations = defaultdict(list)
         NM_list = []
         for mapping in mappings:
@@ -812,7 +866,100 @@ class Converter(object) :
         if rt == "list" :
             return NM_list
         return HGVS_notatations
-    #chrom2c
+    #_chrom2c
+
+    def convert_batch(self, variants, gene=None):
+        """
+        Convert many variants from I{c.} to I{g.} notation or vice versa.
+
+        Variants in I{g.} or I{m.} notation are processed sorted by chromosome
+        and position, such that the transcript mappings for neighbouring
+        variants are looked up once. Crossmappers and transcript mappings are
+        reused between variants on the same transcript.
+
+        @arg variants: variant descriptions in either I{c.} or I{g.} notation
+        @type variants: list(unicode)
+        @kwarg gene: Optional gene name. If given, convert variants in I{g.}
+            notation to all transcripts for this gene.
+        @type gene: unicode
+
+        @return: for each variant, the variant(s) in either I{g.} or I{c.}
+            notation, as returned by the numberConversion webservice method
+            (an empty list if the variant could not be converted)
+        @rtype: list(list(unicode))
+        """
+        results = [[] for _ in variants]
+        regions = []
+
+        self._mapping_cache = {}
+        self._crossmap_cache = {}
+
+        try:
+            for i, variant in enumerate(variants):
+                self._reset()
+                variant = self.correctChrVariant(variant)
+                if not variant:
+                    results[i] = [""]
+                elif "c." in variant or "n." in variant:
+                    results[i] = [self.c2chrom(variant)]
+                elif "g." in variant or "m." in variant:
+                    region = self._chromosomal_region(variant)
+                    if region:
+                        regions.append((i, self.parseTree) + region)
+                else:
+                    results[i] = [""]
+
+            # Sweep over the chromosomal variants by position, looking up the
+            # transcript mappings per window of neighbouring variants.
+            regions.sort(key=lambda r: (r[2].id, r[4]))
+            for _, chromosome_regions in groupby(regions,
+                                                 key=lambda r: r[2].id):
+                window = []
+                for region in chromosome_regions:
+                    if (window and not gene and
+                        region[4] - window[0][4] > CONVERSION_BATCH_WINDOW):
+                        self._chrom2c_window(window, gene, results)
+                        window = []
+                    window.append(region)
+                self._chrom2c_window(window, gene, results)
+        finally:
+            self._mapping_cache = None
+            self._crossmap_cache = None
+
+        return results
+    #convert_batch
+
+    def _chrom2c_window(self, regions, gene, results):
+        """
+        Convert parsed chromosomal variants on one chromosome to transcripts
+        using one transcript mappings lookup.
+
+        @arg regions: tuples of result index, parse tree, chromosome, raw
+            variants, start and stop of the region
+        @type regions: list(tuple)
+        @arg gene: optional gene name
+        @type gene: unicode
+        @arg results: list to store the results in
+        @type results: list
+        """
+        chromosome = regions[0][2]
+
+        if gene:
+            mappings = chromosome.transcript_mappings.filter_by(
+                gene=gene).all()
+        else:
+            index = queries.TranscriptMappingIndex(
+                queries.get_transcript_mappings(
+                    chromosome, min(r[4] for r in regions),
+                    max(r[5] for r in regions)))
+
+        for i, parse_tree, _, variants, start, stop in regions:
+            self._reset()
+            self.parseTree = parse_tree
+            if not gene:
+                mappings = index.overlapping(chromosome.id, start, stop)
+            results[i] = self._chrom2c(variants, mappings, "list") or []
+    #_chrom2c_window
 #Converter
 
 
@@ -863,6 +1010,7 @@ def import_from_ucsc_by_gene(assembly, gene):
         session.add(mapping)
 
     session.commit()
+    queries.invalidate_transcript_mappings()
 
 
 def import_from_reference(assembly, reference):
@@ -912,6 +1060,7 @@ def import_from_reference(assembly, reference):
         session.add(mapping)
 
     session.commit()
+    queries.invalidate_transcript_mappings()
 
 
 def import_from_mapview_file(assembly, mapview_file, group_label):
@@ -1063,6 +1212,7 @@ def import_from_mapview_file(assembly, mapview_file, group_label):
             session.add(mapping)
 
     session.commit()
+    queries.invalidate_transcript_mappings()
 
 
 def import_from_lrgmap_file(assembly, lrgmap_file):
@@ -1134,3 +1284,4 @@ def import_from_lrgmap_file(assembly, lrgmap_file):
         session.add(mapping)
 
     session.commit()
+    queries.invalidate_transcript_mappings()
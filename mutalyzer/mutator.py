@@ -15,9 +15,13 @@ The original as well as the mutated string are stored here.
 from __future__ import unicode_literals
 
 from collections import defaultdict
+import itertools
+import random
 
 from Bio import Restriction
+from Bio.Data import IUPACData
 
+from mutalyzer.config import settings
 from mutalyzer import util
 
 
@@ -31,6 +35,458 @@ VIS_MAX_LENGTH = 25
 # (because it exceeds VIS_MAX_LENGTH).
 VIS_CLIP_FLANK_LENGTH = 6
 
+# Minimum length of the original sequence for which the mutated sequence is
+# stored in a piece table instead of a string.
+PIECE_TABLE_MIN_LENGTH = 100000
+
+# Maximum length of the anchors used to select candidate restriction enzymes
+# for a sequence (see RestrictionSiteScanner).
+RESTRICTION_ANCHOR_LENGTH = 6
+
+
+class _Piece(object):
+    """
+    A piece of a PieceTable, as a node in a treap (a binary search tree
+    balanced by random heap priorities) ordered by position in the mutated
+    sequence. Each node stores the total length of its subtree, so positions
+    are found in logarithmic (expected) time.
+    """
+    __slots__ = ('source', 'start', 'stop', 'priority', 'left', 'right',
+                 'length')
+
+    def __init__(self, source, start, stop):
+        """
+        Create a piece without children.
+
+        @arg source: Sequence the piece is taken from.
+        @type source: Bio.Seq.Seq or unicode
+        @arg start: Start position of the piece in source.
+        @type start: int
+        @arg stop: Stop position of the piece in source.
+        @type stop: int
+        """
+        self.source = source
+        self.start = start
+        self.stop = stop
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.length = stop - start
+    #__init__
+
+    def update(self):
+        """
+        Update the subtree length after changing the children.
+        """
+        self.length = self.stop - self.start
+        if self.left is not None:
+            self.length += self.left.length
+        if self.right is not None:
+            self.length += self.right.length
+    #update
+#_Piece
+
+
+def _merge_pieces(left, right):
+    """
+    Concatenate two treaps of pieces.
+
+    @arg left: Root of the first treap (or None).
+    @type left: _Piece
+    @arg right: Root of the second treap (or None).
+    @type right: _Piece
+
+    @return: Root of the concatenated treap (or None).
+    @rtype: _Piece
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge_pieces(left.right, right)
+        left.update()
+        return left
+    right.left = _merge_pieces(left, right.left)
+    right.update()
+    return right
+#_merge_pieces
+
+
+def _split_pieces(node, position):
+    """
+    Split a treap of pieces at a position, splitting the piece containing
+    the position if needed.
+
+    @arg node: Root of the treap (or None).
+    @type node: _Piece
+    @arg position: Position in the sequence of the treap.
+    @type position: int
+
+    @return: Roots of the treaps before and from the position (or None).
+    @rtype: tuple(_Piece)
+    """
+    if node is None:
+        return None, None
+
+    left_length = node.left.length if node.left is not None else 0
+    if position <= left_length:
+        left, node.left = _split_pieces(node.left, position)
+        node.update()
+        return left, node
+
+    offset = node.start + position - left_length
+    if offset >= node.stop:
+        node.right, right = _split_pieces(node.right,
+                                          offset - node.stop)
+        node.update()
+        return node, right
+
+    right = _merge_pieces(_Piece(node.source, offset, node.stop), node.right)
+    node.stop = offset
+    node.right = None
+    node.update()
+    return node, right
+#_split_pieces
+
+
+def _iter_pieces(node, first, last):
+    """
+    Iterate over the parts of a treap of pieces between two positions.
+
+    @arg node: Root of the treap (or None).
+    @type node: _Piece
+    @arg first: First position in the sequence of the treap.
+    @type first: int
+    @arg last: Last position (exclusive) in the sequence of the treap.
+    @type last: int
+
+    @return: Tuples of source, start and stop per part.
+    @rtype: generator(tuple)
+    """
+    if node is None or first >= last:
+        return
+
+    left_length = node.left.length if node.left is not None else 0
+    if first < left_length:
+        for part in _iter_pieces(node.left, first, min(last, left_length)):
+            yield part
+
+    start = node.start + max(first - left_length, 0)
+    stop = min(node.start + last - left_length, node.stop)
+    if start < stop:
+        yield node.source, start, stop
+
+    offset = left_length + node.stop - node.start
+    if last > offset:
+        for part in _iter_pieces(node.right, max(first - offset, 0),
+                                 last - offset):
+            yield part
+#_iter_pieces
+
+
+class PieceTable(object):
+    """
+    A mutable sequence stored as a list of pieces of the original sequence
+    and of inserted sequences, such that a mutation does not copy the entire
+    sequence. Parts of the sequence are only materialised when they are
+    sliced.
+
+    The pieces are kept in a treap (see _Piece), so a mutation takes
+    logarithmic time in the number of pieces.
+
+    Slicing returns an object of the same type as slicing the original
+    sequence would, other sequence operations (e.g., `reverse_complement`)
+    work on the entire materialised sequence.
+    """
+    def __init__(self, sequence):
+        """
+        Initialise the piece table with the original sequence.
+
+        @arg sequence: The original sequence.
+        @type sequence: Bio.Seq.Seq
+        """
+        self._empty = sequence[:0]
+        self._root = (_Piece(sequence, 0, len(sequence)) if len(sequence)
+                      else None)
+    #__init__
+
+    def delins(self, pos1, pos2, ins):
+        """
+        Replace the part between interbase positions pos1 and pos2 by ins.
+
+        @arg pos1: First interbase position of the deleted sequence.
+        @type pos1: int
+        @arg pos2: Second interbase position of the deleted sequence.
+        @type pos2: int
+        @arg ins: Inserted sequence.
+        @type ins: unicode
+        """
+        pos1 = max(0, min(pos1, len(self)))
+        pos2 = max(pos1, min(pos2, len(self)))
+
+        left, rest = _split_pieces(self._root, pos1)
+        _, right = _split_pieces(rest, pos2 - pos1)
+        if ins:
+            left = _merge_pieces(left, _Piece(ins, 0, len(ins)))
+        self._root = _merge_pieces(left, right)
+    #delins
+
+    def __len__(self):
+        return self._root.length if self._root is not None else 0
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError('sequence index out of range')
+            node = self._root
+            while True:
+                left_length = node.left.length if node.left is not None else 0
+                if index < left_length:
+                    node = node.left
+                    continue
+                index -= left_length
+                if index < node.stop - node.start:
+                    return node.source[node.start + index]
+                index -= node.stop - node.start
+                node = node.right
+
+        first, last, step = index.indices(len(self))
+        if step != 1:
+            return self[:][index]
+
+        result = self._empty
+        for source, start, stop in _iter_pieces(self._root, first, last):
+            result += source[start:stop]
+        return result
+    #__getitem__
+
+    def __add__(self, other):
+        return self[:] + other
+
+    def __radd__(self, other):
+        return other + self[:]
+
+    def __str__(self):
+        return str(self[:])
+
+    def __unicode__(self):
+        return unicode(self[:])
+
+    def __getattr__(self, name):
+        # Delegate any other sequence functionality to the materialised
+        # sequence.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self[:], name)
+#PieceTable
+
+
+class _ShiftTree(object):
+    """
+    Shifts added at positions in the original string, summed with a sparse
+    Fenwick tree (binary indexed tree) over the positions. Both adding a
+    shift and summing the shifts up to a position take logarithmic time in
+    the length of the string.
+    """
+    def __init__(self, length):
+        """
+        Initialise an empty tree.
+
+        @arg length: Length of the original string.
+        @type length: int
+        """
+        # The tree covers indices 1 up to the size, a power of two, where
+        # index i holds the shift at position i - 1.
+        self._size = 1
+        while self._size < length + 2:
+            self._size *= 2
+        self._tree = {}
+    #__init__
+
+    def add(self, position, shift):
+        """
+        Add a shift at a position.
+
+        @arg position: Position in the original string.
+        @type position: int
+        @arg shift: Shift size.
+        @type shift: int
+        """
+        index = max(position + 1, 1)
+        while index > self._size:
+            # Double the size, the new root covers all existing indices.
+            self._tree[self._size * 2] = self.total(self._size - 1)
+            self._size *= 2
+        while index <= self._size:
+            self._tree[index] = self._tree.get(index, 0) + shift
+            index += index & -index
+    #add
+
+    def total(self, position):
+        """
+        Sum the shifts up to and including a position.
+
+        @arg position: Position in the original string.
+        @type position: int
+
+        @return: Sum of the shifts.
+        @rtype: int
+        """
+        index = min(position + 1, self._size)
+        total = 0
+        while index > 0:
+            total += self._tree.get(index, 0)
+            index -= index & -index
+        return total
+    #total
+#_ShiftTree
+
+
+class RestrictionSiteScanner(object):
+    """
+    Count restriction sites in a sequence for a fixed set of restriction
+    enzymes.
+
+    The result is the same as that of a `Bio.Restriction.Analysis`, but
+    instead of searching the sequence for every enzyme, the enzymes are
+    indexed once by anchors: short unambiguous parts of their recognition
+    sites (on both strands). Only enzymes with an anchor in the sequence are
+    searched.
+
+    Anchors are found with a table of all unambiguous sequences of length
+    RESTRICTION_ANCHOR_LENGTH (and shorter, for the end of a sequence),
+    giving the enzymes anchored at any of their prefixes. This way, the
+    sequence is scanned with one lookup per position.
+    """
+    def __init__(self, enzymes):
+        """
+        Build the anchor index.
+
+        @arg enzymes: The restriction enzymes.
+        @type enzymes: Bio.Restriction.RestrictionBatch
+        """
+        self._anchors = defaultdict(set)
+        # Enzymes without anchor (e.g., with a recognition site of only N)
+        # are always searched.
+        self._unanchored = set()
+
+        for enzyme in enzymes:
+            sites = set([enzyme.site, util.reverse_complement(enzyme.site)])
+            for site in sites:
+                anchors = self._site_anchors(site)
+                if not anchors:
+                    self._unanchored.add(enzyme)
+                    break
+                for anchor in anchors:
+                    self._anchors[anchor].add(enzyme)
+
+        self._windows = {}
+        for length in range(1, RESTRICTION_ANCHOR_LENGTH + 1):
+            for bases in itertools.product('ACGT', repeat=length):
+                window = ''.join(bases)
+                self._windows[window] = self._window_enzymes(window)
+    #__init__
+
+    def _site_anchors(self, site):
+        """
+        Choose an anchor in a recognition site, this is the longest part
+        (up to RESTRICTION_ANCHOR_LENGTH) without N with the least number of
+        unambiguous expansions.
+
+        @arg site: Recognition site, possibly with IUPAC ambiguity codes.
+        @type site: unicode
+
+        @return: All unambiguous expansions of the anchor, or an empty list
+            if the site has no anchor.
+        @rtype: list(unicode)
+        """
+        for length in range(min(len(site), RESTRICTION_ANCHOR_LENGTH), 0, -1):
+            windows = [site[i:i + length]
+                       for i in range(len(site) - length + 1)
+                       if 'N' not in site[i:i + length]]
+            if windows:
+                expansions = [
+                    [''.join(bases) for bases in itertools.product(
+                        *[IUPACData.ambiguous_dna_values[code]
+                          for code in window])]
+                    for window in windows]
+                return min(expansions, key=len)
+        return []
+    #_site_anchors
+
+    def _window_enzymes(self, window):
+        """
+        Get the enzymes with an anchor at the start of a sequence window.
+
+        @arg window: Sequence window (uppercase).
+        @type window: unicode
+
+        @return: The enzymes anchored at a prefix of the window.
+        @rtype: frozenset
+        """
+        return frozenset().union(*[self._anchors.get(window[:length], ())
+                                   for length in range(1, len(window) + 1)])
+    #_window_enzymes
+
+    def count(self, sequence):
+        """
+        Return the number of restriction sites per restriction enzyme that
+        can bind in a sequence.
+
+        @arg sequence: The sequence to be analysed.
+        @type sequence: Bio.Seq.Seq
+
+        @return: A mapping of restriction enzymes to counts (only enzymes
+            with at least one site).
+        @rtype: dict
+        """
+        # The formatted sequence data is uppercase and has a leading space.
+        formatted = Restriction.FormattedSeq(sequence)
+        data = formatted.data
+
+        candidates = set(self._unanchored)
+        for i in range(1, len(data)):
+            window = data[i:i + RESTRICTION_ANCHOR_LENGTH]
+            try:
+                candidates |= self._windows[window]
+            except KeyError:
+                # Window with ambiguous bases.
+                candidates |= self._window_enzymes(window)
+
+        counts = {}
+        for enzyme in candidates:
+            if not enzyme.compsite.search(data):
+                continue
+            sites = enzyme.search(formatted)
+            if sites:
+                counts[unicode(enzyme)] = len(sites)
+        return counts
+    #count
+#RestrictionSiteScanner
+
+
+# The restriction site scanner for all enzymes we analyse, created on first
+# use.
+_restriction_site_scanner = None
+
+
+def _get_restriction_site_scanner():
+    """
+    Get the restriction site scanner for all enzymes from New England
+    Biolabs.
+
+    @return: The restriction site scanner.
+    @rtype: RestrictionSiteScanner
+    """
+    global _restriction_site_scanner
+    if _restriction_site_scanner is None:
+        _restriction_site_scanner = RestrictionSiteScanner(
+            Restriction.RestrictionBatch([], ['N']))
+    return _restriction_site_scanner
+
 
 class Mutator():
     """
@@ -40,7 +496,7 @@ class Mutator():
     in the output object as 'visualisation', 'deletedRestrictionSites' and
     'addedRestrictionSites' respectively.
     """
-    def __init__(self, orig, output):
+    def __init__(self, orig, output, piece_table=None):
         """
         Initialise the instance with the original sequence.
 
@@ -48,17 +504,26 @@ class Mutator():
         @type orig: Bio.Seq.Seq
         @arg output: The output object.
         @type output: mutalyzer.Output.Output
+        @arg piece_table: Store the mutated sequence in a piece table instead
+            of a string. By default, this is done for sequences of at least
+            PIECE_TABLE_MIN_LENGTH.
+        @type piece_table: bool
         """
+        # Shifts per position, and their cumulative sums (for `shift_at`).
         self._shifts = defaultdict(int)
+        self._shift_tree = _ShiftTree(len(orig))
+
         self._removed_sites = set()
-        self._restriction_batch = Restriction.RestrictionBatch([], ['N'])
 
         self._output = output
         self.orig = orig
 
+        if piece_table is None:
+            piece_table = len(orig) >= PIECE_TABLE_MIN_LENGTH
+
         # Note that we don't need to create a copy here, since mutation
         # operations are not in place (`self._mutate`).
-        self.mutated = orig
+        self.mutated = PieceTable(orig) if piece_table else orig
     #__init__
 
     def _restriction_count(self, sequence):
@@ -72,8 +537,7 @@ class Mutator():
         @return: A mapping of restriction enzymes to counts.
         @rtype: dict
         """
-        analysis = Restriction.Analysis(self._restriction_batch, sequence)
-        return dict((unicode(k), len(v)) for k, v in analysis.with_sites().items())
+        return _get_restriction_site_scanner().count(sequence)
     #_restriction_count
 
     def _counts_diff(self, counts1, counts2):
@@ -139,11 +603,12 @@ class Mutator():
         # Todo: This part is for restriction site analysis. It doesn't really
         #     belong in this method, but since it uses many variables computed
         #     for the visualisation, we leave it here for the moment.
-        counts1 = self._restriction_count(loflank + delPart + roflank)
-        counts2 = self._restriction_count(lmflank + ins + rmflank)
-        self._output.addOutput('restrictionSites',
-                               [self._counts_diff(counts2, counts1),
-                                self._counts_diff(counts1, counts2)])
+        if settings.RESTRICTION_ANALYSIS:
+            counts1 = self._restriction_count(loflank + delPart + roflank)
+            counts2 = self._restriction_count(lmflank + ins + rmflank)
+            self._output.addOutput('restrictionSites',
+                                   [self._counts_diff(counts2, counts1),
+                                    self._counts_diff(counts1, counts2)])
 
         return visualisation
     #_visualise
@@ -158,6 +623,7 @@ class Mutator():
         @type shift: int
         """
         self._shifts[position] += shift
+        self._shift_tree.add(position, shift)
     #_add_shift
 
     def _shift_minus_at(self, position):
@@ -185,7 +651,7 @@ class Mutator():
         @return: Shift for the given position.
         @rtype: int
         """
-        return sum(s for p, s in self._shifts.items() if p <= position)
+        return self._shift_tree.total(position)
     #shift_at
 
     def shift(self, position):
@@ -342,9 +808,13 @@ class Mutator():
         @type ins: unicode
         """
         correct = 1 if pos1 == pos2 else 0
-        self.mutated = (self.mutated[:self.shift(pos1 + 1) - 1] +
-                        ins +
-                        self.mutated[self.shift(pos2 + correct) - correct:])
+        first = self.shift(pos1 + 1) - 1
+        last = self.shift(pos2 + correct) - correct
+
+        if isinstance(self.mutated, PieceTable):
+            self.mutated.delins(first, last, ins)
+        else:
+            self.mutated = self.mutated[:first] + ins + self.mutated[last:]
 
         self._add_shift(pos2 + 1, pos1 - pos2 + len(ins))
     #_mutate
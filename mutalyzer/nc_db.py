@@ -294,9 +294,8 @@ def _get_mutalyzer_record(reference, db_transcripts):
     # Get the sequence.
     seq_path = settings.SEQ_PATH + reference.checksum_sequence + '.sequence'
     try:
-        seq = Seq(_get_sequence_mmap(seq_path, 1, reference.length + 1),
-                  generic_dna)
-    except IOError:
+        seq = MappedSequence(seq_path, 1, reference.length + 1)
+    except (IOError, ValueError):
         return None
     else:
         record.seq = seq
@@ -485,15 +484,153 @@ def _get_transcripts(reference, position_start, position_end):
     return transcripts
 
 
-def _get_sequence_mmap(file_path, start, end):
+class MappedSequence(object):
     """
-    Sequence retrieval.
-    :param file_path: Path towards the sequence file.
-    :param start: Start position.
-    :param end: End position
-    :return: The sequence.
+    A DNA sequence backed by a memory-mapped sequence file.
+
+    Chromosomal sequences are too large to copy into memory for every
+    request. Instead, only the parts of the file that are indexed or sliced
+    are read. Slicing returns a `Bio.Seq.Seq` object with the selected part of
+    the sequence. Searching (e.g., `find` or `count`) works on the file
+    directly, and the common `Bio.Seq.Seq` operations that return a new
+    sequence (e.g., `reverse_complement` or `translate`) work on a slice of
+    the entire sequence that is not kept. Any other operation copies the
+    entire sequence into memory on first use and keeps it for the next ones,
+    so slice the sequence first where possible.
     """
-    with open(file_path, "r+b") as f:
-        # memory-map the file, size 0 means whole file
-        mm = mmap.mmap(f.fileno(), 0)
-        return mm[start - 1:end]
+    alphabet = generic_dna
+
+    def __init__(self, file_path, start, end):
+        """
+        :param file_path: Path towards the sequence file.
+        :param start: Start position.
+        :param end: End position.
+        """
+        with open(file_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offset = start - 1
+        self._length = max(0, min(end, len(self._mm)) - self._offset)
+        self._entire_seq = None
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1:
+                return Seq(self._mm[self._offset + start:
+                                    self._offset + max(start, stop)],
+                           generic_dna)
+            # Read the window spanned by the slice and take every step-th
+            # base from it, in reverse for a negative step.
+            count = len(xrange(start, stop, step))
+            if not count:
+                return Seq('', generic_dna)
+            last = start + (count - 1) * step
+            window = self._mm[self._offset + min(start, last):
+                              self._offset + max(start, last) + 1]
+            if step < 0:
+                window = window[::-1]
+            return Seq(window[::abs(step)], generic_dna)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('sequence index out of range')
+        return self._mm[self._offset + index]
+
+    def __iter__(self):
+        for index in xrange(self._length):
+            yield self._mm[self._offset + index]
+
+    def __add__(self, other):
+        return self._seq() + other
+
+    def __radd__(self, other):
+        return other + self._seq()
+
+    def __str__(self):
+        return self._mm[self._offset:self._offset + self._length]
+
+    def __unicode__(self):
+        return unicode(str(self))
+
+    def __repr__(self):
+        return '%s(%d bp)' % (self.__class__.__name__, self._length)
+
+    def _window(self, start, end):
+        """
+        :return: Tuple of the file positions of the window from `start` to
+            `end` (interpreted as in slice notation).
+        """
+        start, end, _ = slice(start, end).indices(self._length)
+        return self._offset + start, self._offset + max(start, end)
+
+    def find(self, sub, start=0, end=None):
+        start, end = self._window(start, end)
+        index = self._mm.find(str(sub), start, end)
+        return index if index < 0 else index - self._offset
+
+    def rfind(self, sub, start=0, end=None):
+        start, end = self._window(start, end)
+        index = self._mm.rfind(str(sub), start, end)
+        return index if index < 0 else index - self._offset
+
+    def count(self, sub, start=0, end=None):
+        # Non-overlapping occurrences, like `str.count`.
+        sub = str(sub)
+        start, end = self._window(start, end)
+        if not sub:
+            return end - start + 1
+        count = 0
+        index = self._mm.find(sub, start, end)
+        while index >= 0:
+            count += 1
+            index = self._mm.find(sub, index + len(sub), end)
+        return count
+
+    def startswith(self, prefix, start=0, end=None):
+        start, end = self._window(start, end)
+        prefix = str(prefix)
+        return (end - start >= len(prefix) and
+                self._mm[start:start + len(prefix)] == prefix)
+
+    def endswith(self, suffix, start=0, end=None):
+        start, end = self._window(start, end)
+        suffix = str(suffix)
+        return (end - start >= len(suffix) and
+                self._mm[end - len(suffix):end] == suffix)
+
+    def complement(self):
+        return self[:].complement()
+
+    def reverse_complement(self):
+        return self[:].reverse_complement()
+
+    def transcribe(self):
+        return self[:].transcribe()
+
+    def translate(self, *args, **kwargs):
+        return self[:].translate(*args, **kwargs)
+
+    def upper(self):
+        return self[:].upper()
+
+    def lower(self):
+        return self[:].lower()
+
+    def __getattr__(self, name):
+        # Delegate any other Bio.Seq.Seq functionality to the materialized
+        # sequence.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._seq(), name)
+
+    def _seq(self):
+        """
+        :return: The entire sequence as a `Bio.Seq.Seq` object.
+        """
+        if self._entire_seq is None:
+            self._entire_seq = Seq(str(self), generic_dna)
+        return self._entire_seq
+
@@ -3,16 +3,28 @@ Communication with the NCBI.
 """
 
 
+from collections import defaultdict
 import httplib
-from xml.dom import minidom
-from xml.parsers import expat
+import json
+import uuid
+from xml.etree import cElementTree as ElementTree
 
 from Bio import Entrez
 
 from .config import settings
+from .db import session
+from .db.models import TranscriptProteinLink
 from .redisclient import client as redis
 
 
+#: Number of dbSNP records to retrieve with one request.
+SNP_FETCH_BATCH_SIZE = 200
+
+#: Redis key of the transcript-protein links version (see
+#: :func:`links_version`).
+LINKS_VERSION_KEY = 'transcript-protein-links:version'
+
+
 class _NegativeLinkError(Exception):
     """
     Raised when no transcript-protein link exists (used for cached negative
@@ -153,6 +165,276 @@ def _get_link_from_ncbi(source_db, target_db, match_link_name,
     return target_accession, target_version
 
 
+def _get_accessions_from_ncbi(db, gis):
+    """
+    Retrieve the accession numbers for a list of GI numbers from the NCBI with
+    one request.
+
+    :arg str db: NCBI database.
+    :arg list(str) gis: GI numbers.
+
+    :raises NoLinkError: If the accession numbers could not be retrieved.
+
+    :returns: Accession numbers including version number, in the same order
+      as `gis`.
+    :rtype: list(str)
+    """
+    try:
+        handle = Entrez.efetch(db=db, id=gis, rettype='acc', retmode='text')
+    except (IOError, httplib.HTTPException):
+        # TODO: Log error.
+        raise NoLinkError()
+
+    accessions = unicode(handle.read()).split()
+    handle.close()
+
+    if len(accessions) != len(gis):
+        raise NoLinkError()
+    return accessions
+
+
+def _get_links_from_ncbi(source_db, target_db, match_link_name, sources):
+    """
+    Retrieve linked accession numbers for a list of sources from the NCBI.
+
+    Instead of the three requests per source done by
+    :func:`_get_link_from_ncbi`, we use four requests in total: one search
+    for all sources, one fetch for the accession numbers of the found
+    records, one link for all found records, and one fetch for the accession
+    numbers of the link targets.
+
+    :arg str source_db: NCBI source database.
+    :arg str target_db: NCBI target database.
+    :arg function match_link_name: For each link found, this function is
+      called with the link name (`str`) and it should return `True` iff the
+      link is to be used.
+    :arg sources: Accession numbers (without version number) and version
+      numbers for which we want to find links.
+    :type sources: list(tuple(str, int))
+
+    :returns: Dictionary with a tuple of `(target_accession, target_version)`
+      for every `(source_accession, source_version)` tuple for which a link
+      was found.
+    :rtype: dict
+    """
+    Entrez.email = settings.EMAIL
+
+    # Find source records.
+    try:
+        handle = Entrez.esearch(
+            db=source_db, retmax=len(sources),
+            term=' OR '.join('%s.%d[accn]' % source for source in sources))
+    except (IOError, httplib.HTTPException):
+        # TODO: Log error.
+        return {}
+
+    try:
+        result = Entrez.read(handle)
+    except Entrez.Parser.ValidationError:
+        # TODO: Log error.
+        return {}
+    finally:
+        handle.close()
+
+    source_gis = [unicode(gi) for gi in result['IdList']]
+    if not source_gis:
+        return {}
+
+    # The search result is not in the order of the search terms, so we need
+    # the accession numbers for the source records.
+    try:
+        source_accessions = _get_accessions_from_ncbi(source_db, source_gis)
+    except NoLinkError:
+        return {}
+
+    # Find links from source records to target records. Giving the ids as a
+    # list results in a separate link set per source record.
+    try:
+        handle = Entrez.elink(dbfrom=source_db, db=target_db, id=source_gis)
+    except (IOError, httplib.HTTPException):
+        # TODO: Log error.
+        return {}
+
+    try:
+        result = Entrez.read(handle)
+    except Entrez.Parser.ValidationError:
+        # TODO: Log error.
+        return {}
+    finally:
+        handle.close()
+
+    target_gis = {}
+    for linkset in result:
+        source_gi = unicode(linkset['IdList'][0])
+        for link in linkset['LinkSetDb']:
+            if match_link_name(unicode(link['LinkName'])):
+                target_gis[source_gi] = unicode(link['Link'][0]['Id'])
+                break
+
+    if not target_gis:
+        return {}
+
+    # Get target records.
+    linked_gis = [gi for gi in source_gis if gi in target_gis]
+    try:
+        target_accessions = _get_accessions_from_ncbi(
+            target_db, [target_gis[gi] for gi in linked_gis])
+    except NoLinkError:
+        return {}
+    target_accessions = dict(zip(linked_gis, target_accessions))
+
+    requested = set(sources)
+    links = {}
+    for gi, source in zip(source_gis, source_accessions):
+        if gi not in target_accessions or '.' not in source:
+            continue
+        source_accession, source_version = source.split('.')
+        source = source_accession, int(source_version)
+        if source not in requested:
+            continue
+        target_accession, target_version = target_accessions[gi].split('.')
+        links[source] = target_accession, int(target_version)
+
+    return links
+
+
+def _get_link_from_database(source, target, source_accession,
+                            source_version=None, match_version=True):
+    """
+    Retrieve a linked accession number from the local transcript-protein
+    links table.
+
+    :arg str source: Source type, either ``transcript`` or ``protein``.
+    :arg str target: Target type, either ``transcript`` or ``protein``.
+    :arg str source_accession: Accession number for which we want to find a
+      link (without version number).
+    :arg int source_version: Optional version number for `source_accession`.
+    :arg bool match_version: If `False`, the link does not have to match
+      `source_version`.
+
+    :raises NoLinkError: If no link could be found.
+
+    :returns: Tuple of `(target_accession, target_version)` representing the
+      link target. If `source_version` is not specified or `match_version` is
+      `False`, `target_version` can be `None`.
+    :rtype: tuple(str, int)
+    """
+    source_accession_column = getattr(TranscriptProteinLink,
+                                      '%s_accession' % source)
+    source_version_column = getattr(TranscriptProteinLink,
+                                    '%s_version' % source)
+    links = TranscriptProteinLink.query.filter(
+        source_accession_column == source_accession)
+
+    if source_version is not None:
+        # Query table for link with version.
+        link = links.filter(source_version_column == source_version).first()
+        if link is not None:
+            return (getattr(link, '%s_accession' % target),
+                    getattr(link, '%s_version' % target))
+
+    if source_version is None or not match_version:
+        # Query table for link without version.
+        link = links.order_by(source_version_column.desc()).first()
+        if link is not None:
+            return getattr(link, '%s_accession' % target), None
+
+    raise NoLinkError()
+
+
+def _get_links_from_database(source, target, sources, match_version=True):
+    """
+    Retrieve linked accession numbers for many sources from the local
+    transcript-protein links table.
+
+    This is equivalent to calling :func:`_get_link_from_database` for each
+    source, but the table is queried for all sources at once and version
+    numbers are matched afterwards.
+
+    :arg str source: Source type, either ``transcript`` or ``protein``.
+    :arg str target: Target type, either ``transcript`` or ``protein``.
+    :arg sources: Accession numbers (without version number) and version
+      numbers (can be `None`) for which we want to find links.
+    :type sources: list(tuple(str, int))
+    :arg bool match_version: If `False`, the links do not have to match the
+      source versions.
+
+    :returns: Dictionary with for each source that could be linked a tuple
+      of `(target_accession, target_version)` representing the link target.
+      If the source version is `None` or `match_version` is `False`,
+      `target_version` can be `None`.
+    :rtype: dict
+    """
+    source_accession_column = getattr(TranscriptProteinLink,
+                                      '%s_accession' % source)
+
+    accessions = sorted(set(accession for accession, _ in sources))
+    rows = defaultdict(list)
+    # Stay well below the maximum number of SQL variables of SQLite.
+    for i in range(0, len(accessions), 500):
+        for link in TranscriptProteinLink.query.filter(
+                source_accession_column.in_(accessions[i:i + 500])):
+            rows[getattr(link, '%s_accession' % source)].append(link)
+
+    links = {}
+    for accession, version in sources:
+        if accession not in rows:
+            continue
+        versions = dict((getattr(link, '%s_version' % source), link)
+                        for link in rows[accession])
+
+        if version is not None and version in versions:
+            link = versions[version]
+            links[accession, version] = (
+                getattr(link, '%s_accession' % target),
+                getattr(link, '%s_version' % target))
+
+        elif version is None or not match_version:
+            # The link with the highest version, as for ordering by version
+            # in the database.
+            link = versions[max(versions)]
+            links[accession, version] = (
+                getattr(link, '%s_accession' % target), None)
+
+    return links
+
+
+def _cache_keys(forward_key, source_accession, source_version=None,
+                match_version=True):
+    """
+    Cache keys to query for a link, in order of preference.
+    """
+    keys = []
+    if source_version is not None:
+        # Link with version.
+        keys.append(forward_key %
+                    ('%s.%d' % (source_accession, source_version)))
+    if source_version is None or not match_version:
+        # Link without version.
+        keys.append(forward_key % source_accession)
+    return keys
+
+
+def _link_from_cache_values(source_version, values):
+    """
+    Interpret the cache values for the keys given by :func:`_cache_keys`.
+
+    :raises _NegativeLinkError: If a negative link was found.
+    :raises NoLinkError: If no link could be found.
+    """
+    for i, target in enumerate(values):
+        if target == '':
+            raise _NegativeLinkError()
+        if target is None:
+            continue
+        if i == 0 and source_version is not None:
+            target_accession, target_version = target.split('.')
+            return target_accession, int(target_version)
+        return target, None
+
+    raise NoLinkError()
+
+
 def _get_link_from_cache(forward_key, reverse_key, source_accession,
                          source_version=None, match_version=True):
     """
@@ -176,70 +458,110 @@ def _get_link_from_cache(forward_key, reverse_key, source_accession,
       `False`, `target_version` can be `None`.
     :rtype: tuple(str, int)
     """
-    if source_version is not None:
-        # Query cache for link with version.
-        target = redis.get(forward_key %
-                           ('%s.%d' % (source_accession, source_version)))
-        if target == '':
-            raise _NegativeLinkError()
-        if target:
-            target_accession, target_version = target.split('.')
-            return target_accession, int(target_version)
-
-    if source_version is None or not match_version:
-        # Query cache for link without version.
-        target = redis.get(forward_key % source_accession)
-        if target == '':
-            raise _NegativeLinkError()
-        if target is not None:
-            return target, None
-
-    raise NoLinkError()
+    # Query the cache for the link with and without version at once.
+    keys = _cache_keys(forward_key, source_accession,
+                       source_version=source_version,
+                       match_version=match_version)
+    return _link_from_cache_values(source_version, redis.mget(keys))
 
 
 def _cache_negative_link(forward_key, source_accession, source_version=None,
-                         match_version=True):
+                         match_version=True, pipeline=None):
     """
     Store a negative transcript-protein link (a "no link found" result) in the
     cache.
 
     The cache value for a negative link is the empty string and expires in
     `NEGATIVE_LINK_CACHE_EXPIRATION` seconds.
+
+    If `pipeline` is given, the commands are added to it and it is up to the
+    caller to execute it.
     """
-    if source_version is not None:
-        # Store a negative forward link with version.
-        redis.setex(forward_key %
-                    ('%s.%d' % (source_accession, source_version)),
-                    settings.NEGATIVE_LINK_CACHE_EXPIRATION, '')
-    if source_version is None or not match_version:
-        # Store a negative forward link without version.
-        redis.setex(forward_key % source_accession,
-                    settings.NEGATIVE_LINK_CACHE_EXPIRATION, '')
+    client = pipeline
+    if pipeline is None:
+        client = redis.pipeline(transaction=False)
+
+    for key in _cache_keys(forward_key, source_accession,
+                           source_version=source_version,
+                           match_version=match_version):
+        client.setex(key, settings.NEGATIVE_LINK_CACHE_EXPIRATION, '')
+
+    if pipeline is None:
+        client.execute()
+
+
+def links_version():
+    """
+    Get the current version of the transcript-protein links.
+
+    The version changes whenever links are imported in the local table or
+    retrieved from the NCBI, so users of resolved links can cheaply check if
+    they may be outdated. Negative links expiring from the cache do not
+    change the version.
+
+    :returns: Version of the transcript-protein links, or `None` if they
+      have not changed since the cache was emptied.
+    :rtype: unicode
+    """
+    return redis.get(LINKS_VERSION_KEY)
+
+
+def _update_links_version(pipeline=None):
+    """
+    Change the version of the transcript-protein links.
+
+    If `pipeline` is given, the command is added to it and it is up to the
+    caller to execute it.
+    """
+    client = redis if pipeline is None else pipeline
+    client.set(LINKS_VERSION_KEY, uuid.uuid4().hex)
 
 
 def _cache_link(forward_key, reverse_key, source_accession, target_accession,
-                source_version=None, target_version=None):
+                source_version=None, target_version=None, pipeline=None):
     """
     Store a transcript-protein link in the cache.
+
+    If `pipeline` is given, the commands are added to it and it is up to the
+    caller to execute it.
     """
+    client = pipeline
+    if pipeline is None:
+        client = redis.pipeline(transaction=False)
+
     # Store the link without version in both directions.
-    redis.set(forward_key % source_accession, target_accession)
-    redis.set(reverse_key % target_accession, source_accession)
+    client.set(forward_key % source_accession, target_accession)
+    client.set(reverse_key % target_accession, source_accession)
 
     if source_version is not None and target_version is not None:
         # Store the link with version in both directions.
-        redis.set(forward_key % ('%s.%d' % (source_accession, source_version)),
-                  '%s.%d' % (target_accession, target_version))
-        redis.set(reverse_key % ('%s.%d' % (target_accession, target_version)),
-                  '%s.%d' % (source_accession, source_version))
+        client.set(forward_key % ('%s.%d' % (source_accession, source_version)),
+                   '%s.%d' % (target_accession, target_version))
+        client.set(reverse_key % ('%s.%d' % (target_accession, target_version)),
+                   '%s.%d' % (source_accession, source_version))
 
+    _update_links_version(pipeline=client)
 
-def _get_link(forward_key, reverse_key, source_db, target_db, match_link_name,
-              source_accession, source_version=None, match_version=True):
+    if pipeline is None:
+        client.execute()
+
+
+def _get_link(source, target, forward_key, reverse_key, source_db, target_db,
+              match_link_name, source_accession, source_version=None,
+              match_version=True):
     """
     Combines :func:`_get_link_from_ncbi` with :func:`_get_link_from_cache` to
-    add caching to transcript-protein-link retrieval.
+    add caching to transcript-protein-link retrieval. Links in the local
+    table (:func:`_get_link_from_database`) take precedence over both.
     """
+    try:
+        return _get_link_from_database(
+            source, target, source_accession, source_version=source_version,
+            match_version=match_version)
+    except NoLinkError:
+        # If no link was in the table, we continue by querying the cache.
+        pass
+
     try:
         return _get_link_from_cache(
             forward_key, reverse_key, source_accession,
@@ -276,9 +598,11 @@ def transcript_to_protein(transcript_accession, transcript_version=None,
     """
     Try to find the protein linked to a transcript.
 
-    Links are retrieved from the NCBI using their Entrez API and cached in
-    Redis. Negative results (accession or link could not be found) are also
-    cached, but expire after `NEGATIVE_LINK_CACHE_EXPIRATION` seconds.
+    Links are looked up in the local transcript-protein links table (see
+    :func:`import_links_from_gene2refseq`), or else retrieved from the NCBI
+    using their Entrez API and cached in Redis. Negative results (accession
+    or link could not be found) are also cached, but expire after
+    `NEGATIVE_LINK_CACHE_EXPIRATION` seconds.
 
     :arg str transcript_accession: Accession number of the transcript for
       which we want to find the protein (without version number).
@@ -296,6 +620,7 @@ def transcript_to_protein(transcript_accession, transcript_version=None,
     :rtype: tuple(str, int)
     """
     return _get_link(
+        'transcript', 'protein',
         'ncbi:transcript-to-protein:%s', 'ncbi:protein-to-transcript:%s',
         'nucleotide', 'protein',
         lambda link: link in ('nuccore_protein', 'nuccore_protein_cds'),
@@ -303,14 +628,113 @@ def transcript_to_protein(transcript_accession, transcript_version=None,
         match_version=match_version)
 
 
+def transcripts_to_proteins(transcripts, match_version=True):
+    """
+    Try to find the proteins linked to a list of transcripts.
+
+    This is equivalent to calling :func:`transcript_to_protein` for each
+    transcript, but the cache is queried with one request for all
+    transcripts and links that are not in the local table or the cache are
+    retrieved from the NCBI with a fixed number of requests. Only transcripts
+    for which this fails are retrieved one by one. All new links are stored
+    in the cache at once.
+
+    :arg transcripts: Accession numbers (without version number) and version
+      numbers (can be `None`) of the transcripts.
+    :type transcripts: list(tuple(str, int))
+    :arg bool match_version: If `False`, the links do not have to match the
+      transcript versions.
+
+    :returns: For each transcript, a tuple of `(protein_accession,
+      protein_version)` representing the linked protein, or `None` if no link
+      could be found.
+    :rtype: list(tuple(str, int))
+    """
+    forward_key = 'ncbi:transcript-to-protein:%s'
+    reverse_key = 'ncbi:protein-to-transcript:%s'
+
+    match_link_name = lambda link: link in ('nuccore_protein',
+                                            'nuccore_protein_cds')
+
+    links = _get_links_from_database('transcript', 'protein', transcripts,
+                                     match_version=match_version)
+    uncached = []
+    for transcript in transcripts:
+        if transcript not in links:
+            links[transcript] = None
+            uncached.append(transcript)
+
+    # Query the cache for all remaining transcripts at once.
+    keys = [_cache_keys(forward_key, accession, source_version=version,
+                        match_version=match_version)
+            for accession, version in uncached]
+    values = iter(redis.mget(sum(keys, []))) if uncached else iter([])
+
+    unresolved = []
+    for transcript, transcript_keys in zip(uncached, keys):
+        try:
+            links[transcript] = _link_from_cache_values(
+                transcript[1], [next(values) for _ in transcript_keys])
+        except _NegativeLinkError:
+            pass
+        except NoLinkError:
+            unresolved.append(transcript)
+
+    if not unresolved:
+        return [links[transcript] for transcript in transcripts]
+
+    versioned = [transcript for transcript in unresolved
+                 if transcript[1] is not None]
+    if versioned:
+        found = _get_links_from_ncbi('nucleotide', 'protein',
+                                     match_link_name, versioned)
+    else:
+        found = {}
+
+    pipeline = redis.pipeline(transaction=False)
+
+    for (accession, version), (protein_accession, protein_version) \
+            in found.items():
+        _cache_link(forward_key, reverse_key, accession, protein_accession,
+                    source_version=version, target_version=protein_version,
+                    pipeline=pipeline)
+        links[accession, version] = protein_accession, protein_version
+
+    # Anything not found in the batch is retrieved from the NCBI one by one,
+    # including retrying without version and caching negative results.
+    for transcript in unresolved:
+        if transcript in found:
+            continue
+        accession, version = transcript
+        try:
+            protein_accession, protein_version = _get_link_from_ncbi(
+                'nucleotide', 'protein', match_link_name, accession,
+                source_version=version, match_version=match_version)
+        except NoLinkError:
+            _cache_negative_link(
+                forward_key, accession, source_version=version,
+                match_version=match_version, pipeline=pipeline)
+            continue
+        _cache_link(forward_key, reverse_key, accession, protein_accession,
+                    source_version=version, target_version=protein_version,
+                    pipeline=pipeline)
+        links[transcript] = protein_accession, protein_version
+
+    pipeline.execute()
+
+    return [links[transcript] for transcript in transcripts]
+
+
 def protein_to_transcript(protein_accession, protein_version=None,
                           match_version=True):
     """
     Try to find the transcript linked to a protein.
 
-    Links are retrieved from the NCBI using their Entrez API and cached in
-    Redis. Negative results (accession or link could not be found) are also
-    cached, but expire after `NEGATIVE_LINK_CACHE_EXPIRATION` seconds.
+    Links are looked up in the local transcript-protein links table (see
+    :func:`import_links_from_gene2refseq`), or else retrieved from the NCBI
+    using their Entrez API and cached in Redis. Negative results (accession
+    or link could not be found) are also cached, but expire after
+    `NEGATIVE_LINK_CACHE_EXPIRATION` seconds.
 
     :arg str protein_accession: Accession number of the protein for which we
       want to find the transcript (without version number).
@@ -329,43 +753,217 @@ def protein_to_transcript(protein_accession, protein_version=None,
     :rtype: tuple(str, int)
     """
     return _get_link(
+        'protein', 'transcript',
         'ncbi:protein-to-transcript:%s', 'ncbi:transcript-to-protein:%s',
         'protein', 'nucleotide', lambda link: link == 'protein_nuccore_mrna',
         protein_accession, source_version=protein_version,
         match_version=match_version)
 
 
-def _get_snp_from_ncbi(rsid):
+def import_links_from_gene2refseq(gene2refseq_file, taxonomy_id=9606):
     """
-    Connects to the Entrez DB to fetch the annotated SNP records.
+    Import transcript-protein links from an NCBI gene2refseq file into the
+    local transcript-protein links table, replacing all existing links.
 
-    :param rsid: The rs# of the dbSNP record (e.g., `rs9919552`).
-    :return: response_text(str)
+    Only links between versioned RNA and protein accession numbers for the
+    given taxonomy are imported. If a transcript is linked to more than one
+    protein, the first link is used.
+
+    :arg gene2refseq_file: Open handle to the (uncompressed) gene2refseq file
+      from ftp://ftp.ncbi.nlm.nih.gov/gene/DATA/.
+    :type gene2refseq_file: file-like object
+    :arg int taxonomy_id: Import only links for this NCBI taxonomy id.
+
+    :returns: Number of links imported.
+    :rtype: int
     """
-    Entrez.email = settings.EMAIL
+    taxonomy_id = unicode(taxonomy_id)
+    table = TranscriptProteinLink.__table__
+
+    def read_links():
+        seen = set()
+        for line in gene2refseq_file:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) < 6 or fields[0] != taxonomy_id:
+                continue
+            transcript, protein = fields[3], fields[5]
+            if '.' not in transcript or '.' not in protein:
+                continue
+            transcript_accession, transcript_version = transcript.split('.')
+            protein_accession, protein_version = protein.split('.')
+            if (transcript_accession, transcript_version) in seen:
+                continue
+            seen.add((transcript_accession, transcript_version))
+            yield {'transcript_accession': transcript_accession,
+                   'transcript_version': int(transcript_version),
+                   'protein_accession': protein_accession,
+                   'protein_version': int(protein_version)}
+
+    TranscriptProteinLink.query.delete()
+
+    # Insert a few thousand links at a time, the file is read lazily.
+    count = 0
+    chunk = []
+    for link in read_links():
+        chunk.append(link)
+        if len(chunk) >= 5000:
+            session.execute(table.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        session.execute(table.insert(), chunk)
+        count += len(chunk)
+
+    session.commit()
+    _update_links_version()
+    return count
+
+
+def _local_name(tag):
+    """
+    Strip the namespace from an ElementTree tag.
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_snps(response):
+    """
+    Parse a dbSNP XML document with one or more SNP records.
+
+    The document is parsed incrementally and every record is discarded after
+    its descriptions have been extracted.
+
+    :arg file response: File-like object with the dbSNP XML document.
+
+    :raises ServiceError: If the document could not be parsed.
+
+    :returns: For each SNP record in the document, a tuple of the rs#s of the
+      record (including merged rs#s) and the list of HGVS descriptions.
+    :rtype: list(tuple(list(str), list(str)))
+    """
+    snps = []
+    started = False
 
     try:
-        response = Entrez.efetch(db='snp', id=rsid[2:], retmode='xml')
+        for event, element in ElementTree.iterparse(response,
+                                                    events=('start', 'end')):
+            started = True
+            if event != 'end' or _local_name(element.tag) != 'Rs':
+                continue
+            rsids = ['rs' + element.get('rsId')]
+            descriptions = []
+            for child in element.iter():
+                name = _local_name(child.tag)
+                if name == 'MergeHistory' and child.get('rsId'):
+                    rsids.append('rs' + child.get('rsId'))
+                elif name == 'hgvs':
+                    descriptions.append(unicode(child.text))
+            snps.append((rsids, descriptions))
+            element.clear()
+    except SyntaxError:
+        # This is apparently what dbSNP returns for non-existing rs#, an
+        # empty document.
+        if started:
+            # TODO: Log error.
+            raise ServiceError()
     except (IOError, httplib.HTTPException):
         # TODO: Log error.
         raise ServiceError()
 
+    return snps
+
+
+def _get_snps_from_ncbi(rsids):
+    """
+    Connects to the Entrez DB to fetch the annotated SNP records.
+
+    :arg list(str) rsids: The rs#s of the dbSNP records (e.g., `rs9919552`).
+
+    :raises ServiceError: On error in Entrez communication.
+
+    :returns: For each SNP record found, a tuple of the rs#s of the record
+      (including merged rs#s) and the list of HGVS descriptions.
+    :rtype: list(tuple(list(str), list(str)))
+    """
+    Entrez.email = settings.EMAIL
+
     try:
-        response_text = response.read()
-    except httplib.HTTPException:
+        response = Entrez.efetch(db='snp', id=[rsid[2:] for rsid in rsids],
+                                 retmode='xml')
+    except (IOError, httplib.HTTPException):
         # TODO: Log error.
         raise ServiceError()
 
-    return response_text
+    try:
+        return _parse_snps(response)
+    finally:
+        response.close()
+
+
+def _cache_snp(rsid, descriptions, pipeline):
+    """
+    Store the HGVS descriptions for a dbSNP rs# in the cache. If
+    `descriptions` is `None`, a negative result ("rs# not found") is stored.
+
+    Cache values expire in `SNP_CACHE_EXPIRATION` seconds (positive results)
+    or `NEGATIVE_SNP_CACHE_EXPIRATION` seconds (negative results).
+    """
+    if descriptions is None:
+        pipeline.setex('ncbi:snp:%s' % rsid,
+                       settings.NEGATIVE_SNP_CACHE_EXPIRATION, '')
+    else:
+        pipeline.setex('ncbi:snp:%s' % rsid, settings.SNP_CACHE_EXPIRATION,
+                       json.dumps(descriptions))
+
+
+def fetch_rsid_descriptions(rsids):
+    """
+    Retrieve the annotated HGVS descriptions for many dbSNP rs#s and store
+    them in the cache, so subsequent calls to :func:`rsid_to_descriptions`
+    for these rs#s do not contact the NCBI.
+
+    Uncached rs#s are fetched with one request per `SNP_FETCH_BATCH_SIZE`
+    records. Malformed rs#s and errors in Entrez communication are ignored,
+    these are reported by :func:`rsid_to_descriptions`.
+
+    :arg list(str) rsids: The rs#s of the dbSNP records (e.g., `rs9919552`).
+    """
+    rsids = sorted(set(rsid for rsid in rsids
+                       if rsid.startswith('rs') and rsid[2:].isdigit()))
+    if not rsids:
+        return
+
+    cached = redis.mget(['ncbi:snp:%s' % rsid for rsid in rsids])
+    rsids = [rsid for rsid, value in zip(rsids, cached) if value is None]
+
+    pipeline = redis.pipeline(transaction=False)
+
+    for i in range(0, len(rsids), SNP_FETCH_BATCH_SIZE):
+        batch = rsids[i:i + SNP_FETCH_BATCH_SIZE]
+        try:
+            snps = _get_snps_from_ncbi(batch)
+        except ServiceError:
+            continue
+
+        found = {}
+        for snp_rsids, descriptions in snps:
+            for rsid in snp_rsids:
+                found[rsid] = descriptions
+        for rsid in batch:
+            _cache_snp(rsid, found.get(rsid), pipeline)
+
+    pipeline.execute()
 
 
 def rsid_to_descriptions(rsid, output):
     """
     Return all annotated HGVS descriptions for a given dbSNP rs#.
 
-    :arg str rsid: The rs# of the dbSNP record (e.g., `rs9919552`).
+    Results are cached (see :func:`fetch_rsid_descriptions`).
 
-    :raises ServiceError: On error in Entrez communication.
+    :arg str rsid: The rs# of the dbSNP record (e.g., `rs9919552`).
 
     :returns: List of HGVS descriptions.
     :rtype: list(str)
@@ -377,32 +975,33 @@ def rsid_to_descriptions(rsid, output):
                           'Incorrect RSID input format.')
         return []
 
-    # Get the NCBI Entrez DB response.
-    try:
-        response_text = _get_snp_from_ncbi(rsid)
-    except ServiceError:
-        output.addMessage(__file__, 4, 'EENTREZ',
-                          'An error occured while communicating with dbSNP.')
-        return []
-
-    if response_text.strip() == b'\n':
-        # This is apparently what dbSNP returns for non-existing rs#.
-        output.addMessage(__file__, 2, 'EENTREZ',
-                          'Non existing %s in the DB.' % rsid)
-        return []
+    cached = redis.get('ncbi:snp:%s' % rsid)
 
-    try:
-        # Parse the output.
-        doc = minidom.parseString(response_text)
-        rs = doc.getElementsByTagName('Rs')[0]
-    except expat.ExpatError:
-        # TODO: Log error.
-        raise ServiceError()
-    except IndexError:
-        # The expected root element is not present, this has also been
-        # observed as a response for non-existing rs#.
+    if cached is not None:
+        descriptions = json.loads(cached) if cached else None
+    else:
+        # Get the NCBI Entrez DB response.
+        try:
+            snps = _get_snps_from_ncbi([rsid])
+        except ServiceError:
+            output.addMessage(__file__, 4, 'EENTREZ',
+                              'An error occured while communicating with '
+                              'dbSNP.')
+            return []
+
+        # The record we get can be for another rs# if ours was merged into
+        # it, so we just use the first record.
+        descriptions = snps[0][1] if snps else None
+
+        pipeline = redis.pipeline(transaction=False)
+        _cache_snp(rsid, descriptions, pipeline)
+        pipeline.execute()
+
+    if descriptions is None:
+        # The expected root element is not present, this has been observed
+        # as a response for non-existing rs#.
         output.addMessage(__file__, 2, 'EENTREZ',
                           'Non existing %s in the DB or no root element.' % rsid)
         return []
 
-    return [hgvs.lastChild.data for hgvs in rs.getElementsByTagName('hgvs')]
+    return descriptions
@@ -54,6 +54,9 @@ class Output() :
         - getMessages()           ; Print all messages that exceed the
                                     configured output level.
         - addOutput(name, data)   ; Add output to the output dictionary.
+        - addLazyOutput(name, function) ; Add output to the output
+                                          dictionary that is computed on
+                                          retrieval.
         - getOutput(name)         ; Retrieve data from the output dictionary.
         - Summary()               ; Print a summary of the number of errors
                                     and warnings.
@@ -208,6 +211,48 @@ class Output() :
             self._outputData[name] = [data]
     #addOutput
 
+    def addLazyOutput(self, name, function) :
+        """
+        Add output that is only computed when it is retrieved. This is
+        useful for large data (e.g., sequences) that many callers never
+        look at.
+
+        The function is called at most once, on the first call of getOutput
+        or getIndexedOutput for this name, and its result is stored in place
+        of the lazy output.
+
+        @arg name: Name of a node in the output dictionary
+        @type name: unicode
+        @arg function: Function without arguments computing the data to be
+            stored at this node
+        @type function: callable
+        """
+        self.addOutput(name, _LazyOutput(function))
+    #addLazyOutput
+
+    def _resolveOutput(self, name, index=None) :
+        """
+        Compute lazy output stored at a node in the output dictionary.
+
+        Private variables:
+            - _outputData ; The output dictionary.
+
+        @arg name: Name of a node in the output dictionary
+        @type name: unicode
+        @arg index: Only compute the element at this index (default: all
+            elements)
+        @type index: int
+        """
+        data = self._outputData[name]
+        if index is None :
+            indices = range(len(data))
+        else :
+            indices = [index]
+        for i in indices :
+            if isinstance(data[i], _LazyOutput) :
+                data[i] = data[i].function()
+    #_resolveOutput
+
     def getOutput(self, name) :
         """
         Return a list of data from the output dictionary.
@@ -222,6 +267,7 @@ class Output() :
         @rtype: dictionary
         """
         if self._outputData.has_key(name) :
+            self._resolveOutput(name)
             return self._outputData[name]
         return []
     #getOutput
@@ -245,6 +291,7 @@ class Output() :
         """
         if self._outputData.has_key(name) :
             if 0 <= index < len(self._outputData[name]) :
+                self._resolveOutput(name, index)
                 return self._outputData[name][index]
         return default
     #getIndexedOutput
@@ -276,6 +323,20 @@ class Output() :
     #Summary
 #Output
 
+class _LazyOutput(object) :
+    """
+    Container for output data that is computed on retrieval (see
+    Output.addLazyOutput).
+    """
+    def __init__(self, function) :
+        """
+        @arg function: Function without arguments computing the data.
+        @type function: callable
+        """
+        self.function = function
+    #__init__
+#_LazyOutput
+
 class Message() :
     """
     Container class for message variables.
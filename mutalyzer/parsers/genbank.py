@@ -57,6 +57,21 @@ class GBparser():
     """
     @todo: documentation
     """
+    def __init__(self):
+        """
+        Initialise the class.
+
+        Private variables (altered):
+            - __proteinLinks ; Protein accession numbers found for the
+                               transcripts while linking, by transcript
+                               accession number and version.
+            - __proteinLinksVersion ; Version of the transcript-protein
+                                      links used while linking.
+        """
+        self.__proteinLinks = {}
+        self.__proteinLinksVersion = None
+    #__init__
+
     def __location2pos(self, location, require_exact=True):
         """
         Convert a location object to a tuple of integers.
@@ -210,6 +225,8 @@ class GBparser():
         """
 
         productList = []
+        transcripts = []
+        transcriptLoci = []
         for i in locusList :
             # Transfer some variables from the dictionary to the locus object.
             self.__tagByDict(i, "locus_tag")
@@ -228,13 +245,10 @@ class GBparser():
                     i.proteinLink = i.protein_id.split('.')[0]
             #if
             else :                # Tag an mRNA with the protein id too.
+                # The links are resolved for all mRNAs at once below.
                 accession, version = i.transcript_id.split('.')
-                try:
-                    # We ignore the version.
-                    i.proteinLink = ncbi.transcript_to_protein(
-                        accession, int(version), match_version=False)[0]
-                except ncbi.NoLinkError:
-                    pass
+                transcripts.append((accession, int(version)))
+                transcriptLoci.append(i)
             i.original_location = i.location
             if i.ref:
                 # This is a workaround for a bug in BioPython.
@@ -254,6 +268,20 @@ class GBparser():
                 i.usable = False
         #for
 
+        if transcripts :
+            # We ignore the version.
+            links = ncbi.transcripts_to_proteins(transcripts,
+                                                 match_version=False)
+            for i, transcript, link in zip(transcriptLoci, transcripts,
+                                           links) :
+                if link :
+                    i.proteinLink = link[0]
+                self.__proteinLinks[transcript] = i.proteinLink
+            # Read after resolving, since newly retrieved links change the
+            # version too.
+            self.__proteinLinksVersion = ncbi.links_version()
+        #if
+
         if productList :
             # Find the defining words in the product list.
             a, b = self._find_mismatch(productList)
@@ -467,6 +495,11 @@ class GBparser():
         record = Record()
         record.seq = biorecord.seq
 
+        # The record depends on the transcript-protein links, so we keep
+        # them with the record to be able to detect outdated records.
+        self.__proteinLinks = record.proteinLinks
+        self.__proteinLinksVersion = None
+
         # Note: The .source_* values may be different from the values we are
         #     working with, e.g. for UD slices where these values (taken from
         #     the genbank file) are from the original NC reference. We try to
@@ -677,6 +710,8 @@ class GBparser():
         record.geneList = [gene for gene in record.geneList
                            if gene.transcriptList]
 
+        record.proteinLinksVersion = self.__proteinLinksVersion
+
         return record
     #create_record
 #GBparser
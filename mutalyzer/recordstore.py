@@ -0,0 +1,160 @@
+"""
+Shared storage of reference sequence files.
+
+Every host keeps the reference files it uses in its own cache directory (see
+the `CACHE_DIR` configuration setting). If a shared record store is
+configured (see the `RECORD_STORE` configuration setting), files written to
+the cache directory are also written to the record store and files missing
+from the cache directory are restored from the record store before they are
+retrieved again from their source.
+
+Files in a record store are addressed by the checksum of their contents, as
+stored in the `Reference.checksum` database field. Since the database is
+shared between all hosts, a reference retrieved once is available to every
+host.
+"""
+
+
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+import redis
+
+from mutalyzer.config import settings
+
+
+class RecordStore(object):
+    """
+    Base class for record stores.
+
+    Errors in communicating with the store are not raised, a file that could
+    not be read is reported missing and a file that could not be written is
+    silently skipped. The local cache directory is always authoritative.
+    """
+    def get(self, checksum):
+        """
+        Read a file from the store.
+
+        :arg unicode checksum: Checksum of the file contents.
+
+        :returns: The (compressed) file contents, or `None` if the file is
+          not in the store.
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def put(self, checksum, data):
+        """
+        Write a file to the store.
+
+        :arg unicode checksum: Checksum of the file contents.
+        :arg str data: The (compressed) file contents.
+        """
+        raise NotImplementedError()
+
+
+class DirectoryRecordStore(RecordStore):
+    """
+    Record store in a directory, for example on a network file system.
+
+    Files are stored in subdirectories named by the first two characters of
+    their checksum.
+    """
+    def __init__(self, path):
+        """
+        :arg unicode path: Path to the store directory.
+        """
+        self.path = path
+
+    def _checksum_to_file(self, checksum):
+        return os.path.join(self.path, checksum[:2], '{}.bz2'.format(checksum))
+
+    def get(self, checksum):
+        try:
+            with open(self._checksum_to_file(checksum), 'rb') as handle:
+                return handle.read()
+        except IOError:
+            return None
+
+    def put(self, checksum, data):
+        filename = self._checksum_to_file(checksum)
+        if os.path.isfile(filename):
+            return
+
+        # The file is written under a temporary name and then renamed, so
+        # readers on other hosts never see a partially written file.
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            handle = tempfile.NamedTemporaryFile(
+                dir=directory, prefix='.{}.'.format(checksum), delete=False)
+            with handle:
+                handle.write(data)
+            os.rename(handle.name, filename)
+        except (IOError, OSError):
+            pass
+
+
+class RedisRecordStore(RecordStore):
+    """
+    Record store in Redis.
+
+    This uses its own Redis connection (not :mod:`mutalyzer.redisclient`),
+    since the file contents are binary data.
+    """
+    def __init__(self, client):
+        """
+        :arg client: Redis client, not decoding responses.
+        :type client: redis.StrictRedis
+        """
+        self.client = client
+
+    def get(self, checksum):
+        try:
+            return self.client.get('record:{}'.format(checksum))
+        except redis.RedisError:
+            return None
+
+    def put(self, checksum, data):
+        try:
+            self.client.setnx('record:{}'.format(checksum), data)
+        except redis.RedisError:
+            pass
+
+
+# The shared record store, created on first use.
+_record_store = None
+
+
+def get_record_store():
+    """
+    Get the shared record store as configured by the `RECORD_STORE`
+    configuration setting.
+
+    :returns: The record store, or `None` if no record store is configured.
+    :rtype: RecordStore
+    """
+    global _record_store
+    if _record_store is None and settings.RECORD_STORE:
+        if settings.RECORD_STORE.startswith(('redis://', 'rediss://',
+                                             'unix://')):
+            _record_store = RedisRecordStore(
+                redis.StrictRedis.from_url(settings.RECORD_STORE))
+        else:
+            _record_store = DirectoryRecordStore(settings.RECORD_STORE)
+    return _record_store
+
+
+def _reset_record_store(value):
+    """
+    Discard the record store so that it is recreated on next use.
+    """
+    global _record_store
+    _record_store = None
+
+
+# Recreate the record store if configuration is updated.
+settings.on_update(_reset_record_store, 'RECORD_STORE')
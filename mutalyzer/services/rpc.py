@@ -13,6 +13,7 @@ from __future__ import unicode_literals
 
 import binning
 from datetime import datetime
+import gzip
 from spyne.decorator import rpc, srpc
 from spyne.service import ServiceBase
 from spyne.model.primitive import Integer, Boolean, DateTime, Unicode
@@ -29,7 +30,7 @@ import extractor
 
 import mutalyzer
 from mutalyzer.config import settings
-from mutalyzer.db import session
+from mutalyzer.db import queries, session
 from mutalyzer.db import session as sessiongb
 from mutalyzer.db.models import (Assembly, Chromosome, BatchJob,
                                  BatchQueueItem, TranscriptMapping)
@@ -201,6 +202,10 @@ class MutalyzerService(ServiceBase):
         if left > 0:
             raise Fault('EBATCHNOTREADY', 'Batch job result is not yet ready.')
 
+        filename, compressed = Scheduler.get_result_file(job_id)
+        if compressed:
+            return gzip.open(filename, 'rb')
+
         filename = 'batch-job-%s.txt' % job_id
         handle = open(os.path.join(settings.CACHE_DIR, filename), 'rb')
         return handle
@@ -251,18 +256,7 @@ class MutalyzerService(ServiceBase):
                             "chromosome name." % chrom)
 
         pos = max(min(pos, binning.MAX_POSITION + 1), 1)
-        bins = binning.overlapping_bins(pos - 1, pos)
-        mappings = chromosome.transcript_mappings.filter(
-            TranscriptMapping.bin.in_(bins),
-            TranscriptMapping.start <= pos,
-            TranscriptMapping.stop >= pos
-        ).order_by(
-            TranscriptMapping.start,
-            TranscriptMapping.stop,
-            TranscriptMapping.gene,
-            TranscriptMapping.accession,
-            TranscriptMapping.version,
-            TranscriptMapping.transcript)
+        mappings = queries.get_transcript_mappings(chromosome, pos, pos)
 
         L.addMessage(__file__, -1, "INFO",
                      "Finished processing getTranscripts(%s %s %s %s)"
@@ -362,24 +356,8 @@ class MutalyzerService(ServiceBase):
             raise Fault("EARG", "The chrom argument (%s) was not a valid " \
                             "chromosome name." % chrom)
 
-        if method:
-            bins = binning.overlapping_bins(pos1 - 1, pos2)
-            range_filter = (TranscriptMapping.bin.in_(bins),
-                            TranscriptMapping.start <= pos2,
-                            TranscriptMapping.stop >= pos1)
-        else:
-            bins = binning.contained_bins(pos1 - 1, pos2)
-            range_filter = (TranscriptMapping.bin.in_(bins),
-                            TranscriptMapping.start >= pos1,
-                            TranscriptMapping.stop <= pos2)
-
-        mappings = chromosome.transcript_mappings.filter(*range_filter).order_by(
-            TranscriptMapping.start,
-            TranscriptMapping.stop,
-            TranscriptMapping.gene,
-            TranscriptMapping.accession,
-            TranscriptMapping.version,
-            TranscriptMapping.transcript)
+        mappings = queries.get_transcript_mappings(
+            chromosome, pos1, pos2, contained=not method)
 
         L.addMessage(__file__, -1, "INFO",
             "Finished processing getTranscriptsRange(%s %s %s %s %s)" % (
@@ -459,24 +437,8 @@ class MutalyzerService(ServiceBase):
             raise Fault("EARG", "The chrom argument (%s) was not a valid " \
                             "chromosome name." % chrom)
 
-        if method:
-            bins = binning.overlapping_bins(pos1 - 1, pos2)
-            range_filter = (TranscriptMapping.bin.in_(bins),
-                            TranscriptMapping.start <= pos2,
-                            TranscriptMapping.stop >= pos1)
-        else:
-            bins = binning.contained_bins(pos1 - 1, pos2)
-            range_filter = (TranscriptMapping.bin.in_(bins),
-                            TranscriptMapping.start >= pos1,
-                            TranscriptMapping.stop <= pos2)
-
-        mappings = chromosome.transcript_mappings.filter(*range_filter).order_by(
-            TranscriptMapping.start,
-            TranscriptMapping.stop,
-            TranscriptMapping.gene,
-            TranscriptMapping.accession,
-            TranscriptMapping.version,
-            TranscriptMapping.transcript)
+        mappings = queries.get_transcript_mappings(
+            chromosome, pos1, pos2, contained=not method)
 
         transcripts = []
 
@@ -828,6 +790,54 @@ class MutalyzerService(ServiceBase):
         return result
     #numberConversion
 
+    @srpc(Mandatory.Unicode, Array(Mandatory.Unicode), Unicode,
+          _returns=Array(Array(Unicode)))
+    def numberConversionBatch(build, variants, gene=None):
+        """
+        Converts many variants from I{c.} to I{g.} notation or vice versa.
+
+        This gives the same results as calling numberConversion for each
+        variant, but is faster for large numbers of variants.
+
+        @arg build: The genome build (hg19, hg18, mm10).
+        @type build: string
+        @arg variants: The variants in either I{c.} or I{g.} notation, full
+            HGVS notation, including NM_, NC_, or LRG_ accession number.
+        @type variants: list
+        @kwarg gene: Optional gene name. If given, return variant descriptions
+            on all transcripts for this gene.
+        @type gene: string
+
+        @return: For each variant, the variant(s) in either I{g.} or I{c.}
+            notation.
+        @rtype: list
+        """
+        variants = variants or []
+
+        O = Output(__file__)
+        O.addMessage(__file__, -1, "INFO",
+            "Received request numberConversionBatch(%s, %d variants)"
+            % (build, len(variants)))
+
+        stats.increment_counter('position-converter/webservice')
+
+        try:
+            assembly = Assembly.by_name_or_alias(build)
+        except NoResultFound:
+            O.addMessage(__file__, 4, "EARG", "EARG %s" % build)
+            raise Fault("EARG",
+                        "The build argument (%s) was not a valid " \
+                            "build name." % build)
+
+        converter = Converter(assembly, O)
+        result = converter.convert_batch(variants, gene=gene)
+
+        O.addMessage(__file__, -1, "INFO",
+            "Finished processing numberConversionBatch(%s, %d variants)"
+            % (build, len(variants)))
+        return result
+    #numberConversionBatch
+
     @srpc(Mandatory.Unicode, _returns=CheckSyntaxOutput)
     def checkSyntax(variant):
         """
@@ -19,6 +19,10 @@ module much more.
 
 from __future__ import unicode_literals
 
+import atexit
+from collections import defaultdict
+import os
+import threading
 import time
 
 from .redisclient import client as redis
@@ -29,27 +33,97 @@ INTERVALS = [('minute', '%Y-%m-%d_%H:%M', 60 * 60),
              ('hour', '%Y-%m-%d_%H', 60 * 60 * 24),
              ('day', '%Y-%m-%d', 60 * 60 * 24 * 30)]
 
+#: Maximum time that local counts are kept before they are added to the
+#: counters (in seconds).
+LOCAL_COUNTS_INTERVAL = 60
 
-def increment_counter(counter):
+
+# Local counts by counter, with the process they were counted in and the
+# time of the last flush.
+_local_counts = defaultdict(int)
+_local_counts_pid = os.getpid()
+_local_counts_flushed = time.time()
+_local_counts_lock = threading.Lock()
+
+
+def _increment(pipe, counter, amount):
     """
-    Increment the specified counter.
+    Queue the increments of the specified counter by `amount` on a pipeline.
     """
-    pipe = redis.pipeline(transaction=False)
-    pipe.incr('counter:%s:total' % counter)
+    pipe.incr('counter:%s:total' % counter, amount)
 
     for label, bucket, expire in INTERVALS:
         key = 'counter:%s:%s:%s' % (counter, label,
                                     unicode(time.strftime(bucket)))
-        pipe.incr(key)
+        pipe.incr(key, amount)
 
         # It's safe to just keep on expiring the counter, even if it already
         # had an expiration, since it is bounded by the current day. We don't
         # really mind at what time of the day the expiration will be exactly.
         pipe.expire(key, expire)
 
+
+def increment_counter(counter):
+    """
+    Increment the specified counter.
+    """
+    pipe = redis.pipeline(transaction=False)
+    _increment(pipe, counter, 1)
     pipe.execute()
 
 
+def _forget_parent_counts():
+    """
+    Discard the local counts if they were inherited from a parent process,
+    since the parent adds them to the counters. Call with the lock held.
+    """
+    global _local_counts_pid
+    if os.getpid() != _local_counts_pid:
+        _local_counts.clear()
+        _local_counts_pid = os.getpid()
+
+
+def increment_counter_locally(counter):
+    """
+    Increment the specified counter in this process only. Local counts are
+    added to the counters with one request at most `LOCAL_COUNTS_INTERVAL`
+    seconds later (see :func:`flush_local_counts`).
+
+    Use this for frequent events, such as cache hits, where a request per
+    event would be too expensive. The counts per minute can be off by the
+    flush interval.
+    """
+    with _local_counts_lock:
+        _forget_parent_counts()
+        _local_counts[counter] += 1
+
+    if time.time() - _local_counts_flushed >= LOCAL_COUNTS_INTERVAL:
+        flush_local_counts()
+
+
+def flush_local_counts():
+    """
+    Add all local counts of this process to the counters.
+    """
+    global _local_counts_flushed
+
+    with _local_counts_lock:
+        _local_counts_flushed = time.time()
+        _forget_parent_counts()
+        counts = _local_counts.items()
+        _local_counts.clear()
+
+    if counts:
+        pipe = redis.pipeline(transaction=False)
+        for counter, amount in counts:
+            _increment(pipe, counter, amount)
+        pipe.execute()
+
+
+# Don't lose the local counts of the last interval.
+atexit.register(flush_local_counts)
+
+
 def get_totals():
     """
     Get the total for all known counters.
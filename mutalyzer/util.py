@@ -21,12 +21,14 @@ General utility functions.
 
 from __future__ import unicode_literals
 
+from collections import OrderedDict
 from functools import wraps
 import inspect
 from itertools import izip_longest
 import math
 import operator
 import sys
+import threading
 import time
 
 from Bio import Seq
@@ -284,12 +286,18 @@ def longest_common_prefix(s1, s2):
     @todo: This is mostly used just for the length of the returned string,
            and we could also return that directly.
     """
-    pos = 0
-
-    while pos < min(len(s1), len(s2)) and s1[pos] == s2[pos]:
-        pos += 1
+    # Find the length by bisection, comparing slices is much faster than
+    # comparing characters one by one for long strings (e.g., proteins).
+    low, high = 0, min(len(s1), len(s2))
+
+    while low < high:
+        middle = (low + high + 1) // 2
+        if s1[low:middle] == s2[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
 
-    return s1[:pos]
+    return s1[:low]
 #longest_common_prefix
 
 
@@ -310,7 +318,18 @@ def longest_common_suffix(s1, s2):
     @return: The longest common suffix of s1 and s2.
     @rtype: unicode
     """
-    return longest_common_prefix(s1[::-1], s2[::-1])[::-1]
+    # See longest_common_prefix, but we count from the end.
+    low, high = 0, min(len(s1), len(s2))
+
+    while low < high:
+        middle = (low + high + 1) // 2
+        if s1[len(s1) - middle:len(s1) - low] == \
+               s2[len(s2) - middle:len(s2) - low]:
+            low = middle
+        else:
+            high = middle - 1
+
+    return s1[len(s1) - low:]
 #longest_common_suffix
 
 
@@ -969,6 +988,98 @@ class LazyObject(object):
     __contains__ = _new_method_proxy(operator.contains)
 
 
+class LRUCache(object):
+    """
+    A bounded, size-aware least recently used cache.
+
+    Every entry has a size as given by the `weigh` function (default: 1 per
+    entry), and the least recently used entries are evicted whenever the total
+    size exceeds `max_size`. Entries that are larger than `max_size` by
+    themselves are never stored. A `max_size` of 0 disables the cache.
+
+    The `hits`, `misses`, and `evictions` attributes count the cache events
+    since creation (or the last call to :meth:`clear`).
+
+    Access is serialized with a lock, so instances can be shared among
+    threads.
+    """
+    def __init__(self, max_size, weigh=None):
+        self.max_size = max_size
+        self._weigh = weigh or (lambda value: 1)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Get the value for `key` and mark it as most recently used, or
+        `default` if there is no such entry.
+        """
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value, size
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store `value` for `key` and evict least recently used entries as
+        needed.
+
+        :returns: The number of evicted entries.
+        :rtype: int
+        """
+        size = self._weigh(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_size:
+                return 0
+
+            self._entries[key] = value, size
+            self.size += size
+
+            evicted = 0
+            while self.size > self.max_size:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.size -= old_size
+                evicted += 1
+            self.evictions += evicted
+            return evicted
+
+    def resize(self, max_size):
+        """
+        Change the maximum total size, evicting entries if needed.
+        """
+        with self._lock:
+            self.max_size = max_size
+            while self.size > self.max_size:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
 # We try to minimize non-trivial dependencies for non-critical features. The
 # setproctitle package is implemented as a C extension and hence requires a C
 # compiler and the Python development headers. Here we use it as an optional
@@ -18,6 +18,7 @@ Notes about string representations:
 
 from __future__ import unicode_literals
 
+import copy
 from operator import attrgetter
 
 from Bio.Data import CodonTable
@@ -1318,13 +1319,15 @@ def _add_static_transcript_info(transcript, output):
     output.addOutput('transcriptReverse', transcript.CM.orientation == -1)
 
 
-def _add_transcript_info(mutator, transcript, output):
+def _add_transcript_info(mutator, record, transcript, output):
     """
     Add transcript-specific information (including protein prediction) to
     the {output} object.
 
     @arg mutator: A Mutator instance.
     @type mutator: mutalyzer.mutator.Mutator
+    @arg record: A GenRecord object.
+    @type record: Modules.GenRecord.GenRecord
     @arg transcript: A transcript object.
     @type transcript: Modules.GenRecord.Locus
     @arg output: The Output object.
@@ -1334,13 +1337,14 @@ def _add_transcript_info(mutator, transcript, output):
     @todo: Don't generate the fancy HTML protein descriptions here.
     @todo: Add mutated transcript and CDS info.
     """
-    # Add transcript info to output.
+    # Add transcript info to output. The sequences are only computed if they
+    # are retrieved from the output object.
     if transcript.transcribe:
         output.addOutput('myTranscriptDescription', transcript.description or '=')
-        output.addOutput('origMRNA',
-            unicode(util.splice(mutator.orig, transcript.mRNA.positionList)))
-        output.addOutput('mutatedMRNA',
-            unicode(util.splice(mutator.mutated,
+        output.addLazyOutput('origMRNA', lambda: unicode(
+            util.splice(mutator.orig, transcript.mRNA.positionList)))
+        output.addLazyOutput('mutatedMRNA', lambda: unicode(
+            util.splice(mutator.mutated,
                         mutator.shift_sites(transcript.mRNA.positionList))))
 
     # Add protein prediction to output.
@@ -1369,8 +1373,9 @@ def _add_transcript_info(mutator, transcript, output):
         # - oldProteinFancyText, newProteinFancyText, altProteinFancyText:
         #     Versions of the protein sequences formatted for plaintext.
 
-        cds_original = util.splice(mutator.orig, transcript.CDS.positionList)
-        cds_original.alphabet = IUPAC.unambiguous_dna
+        # The reference CDS and protein are shared between requests.
+        reference_cds = record.record.reference_cds(transcript)
+        cds_original = reference_cds.cds
 
         if not _verify_alphabet(cds_original):
             output.addMessage(__file__, 4, 'ENODNA',
@@ -1384,10 +1389,9 @@ def _add_transcript_info(mutator, transcript, output):
         cds_variant.alphabet = IUPAC.unambiguous_dna
 
         if transcript.CM.orientation == -1:
-            cds_original = cds_original.reverse_complement()
             cds_variant = cds_variant.reverse_complement()
 
-        protein_original = cds_original.translate(table=transcript.txTable)
+        protein_original = reference_cds.translate()
 
         if not protein_original.endswith('*'):
             output.addMessage(__file__, 3, 'ESTOP',
@@ -1405,20 +1409,15 @@ def _add_transcript_info(mutator, transcript, output):
                               'Reference protein translated from alternative '
                               'start codon %s.' % (unicode(cds_original[:3])))
 
-        protein_variant = cds_variant.translate(table=transcript.txTable)
+        # Up to and including the first '*', or the entire string.
+        protein_variant = reference_cds.translate_variant(cds_variant)
 
         if protein_variant:
             protein_variant = 'M' + protein_variant[1:]
 
-        # Up to and including the first '*', or the entire string.
-        try:
-            stop = unicode(protein_variant).index('*')
-            protein_variant = protein_variant[:stop + 1]
-        except ValueError:
-            pass
-
-        output.addOutput('origCDS', unicode(cds_original))
-        output.addOutput("newCDS", unicode(cds_variant[:len(protein_variant) * 3]))
+        output.addLazyOutput('origCDS', lambda: unicode(cds_original))
+        output.addLazyOutput('newCDS', lambda: unicode(
+            cds_variant[:len(protein_variant) * 3]))
 
         # Under which name to store the variant protein sequence. Can be:
         # - 'new': Normal case.
@@ -1705,11 +1704,11 @@ def process_variant(mutator, description, record, output):
 
     # Add transcript-specific variant information.
     if transcript and record.record.geneList:
-        _add_transcript_info(mutator, transcript, output)
+        _add_transcript_info(mutator, record, transcript, output)
 #process_variant
 
 
-def check_variant(description, output):
+def check_variant(description, output, records=None):
     """
     Check the variant described by {description} according to the HGVS variant
     nomenclature and populate the {output} object with various information
@@ -1719,6 +1718,10 @@ def check_variant(description, output):
     @type description: string
     @arg output: An output object.
     @type output: Modules.Output.Output
+    @arg records: Optional dictionary of loaded records by record id, to be
+        shared between calls. Records are loaded only if they are not in the
+        dictionary and we work on a copy, so the dictionary is left intact.
+    @type records: dict
 
     @todo: Documentation.
     @todo: Raise exceptions on failure instead of just return.
@@ -1782,7 +1785,12 @@ def check_variant(description, output):
         retrieved_record = None
 
     if retrieved_record is None:
-        retrieved_record = retriever.loadrecord(record_id)
+        if records is not None and record_id in records:
+            retrieved_record = copy.deepcopy(records[record_id])
+        else:
+            retrieved_record = retriever.loadrecord(record_id)
+            if records is not None and retrieved_record:
+                records[record_id] = copy.deepcopy(retrieved_record)
     else:
         # To remove the download link text from the name checker page.
         filetype = 'GB_NC'
@@ -1860,10 +1868,15 @@ def check_variant(description, output):
                                       transcript.proteinProduct,
                                       transcript.linkMethod])
 
+    # Transcripts not near any of the variants are not described.
+    record.cancelDistantDescriptions()
+
+    # The sequences are only converted if they are retrieved from the output
+    # object.
     if not output.getOutput('add_original_sequence_to_output'):
-        output.addOutput('original', unicode(mutator.orig))
+        output.addLazyOutput('original', lambda: unicode(mutator.orig))
     if not output.getOutput('add_mutated_sequence_to_output'):
-        output.addOutput('mutated', unicode(mutator.mutated))
+        output.addLazyOutput('mutated', lambda: unicode(mutator.mutated))
 
     # Chromosomal region (only for GenBank human transcript references).
     # This is still quite ugly code, and should be cleaned up once we have
@@ -1905,8 +1918,10 @@ def check_variant(description, output):
                 transcript.proteinDescription = 'p.?'
                 continue
 
-            cds_original = util.splice(mutator.orig, transcript.CDS.positionList)
-            cds_original.alphabet = IUPAC.unambiguous_dna
+            # The reference CDS and protein are shared between requests, so
+            # only the variant CDS is spliced and translated here.
+            reference_cds = record.record.reference_cds(transcript)
+            cds_original = reference_cds.cds
 
             cds_variant = util.__nsplice(mutator.mutated,
                                          mutator.shift_sites(transcript.mRNA.positionList),
@@ -1915,7 +1930,6 @@ def check_variant(description, output):
             cds_variant.alphabet = IUPAC.unambiguous_dna
 
             if transcript.CM.orientation == -1:
-                cds_original = cds_original.reverse_complement()
                 cds_variant = cds_variant.reverse_complement()
 
             #if '*' in cds_original.translate()[:-1]:
@@ -1930,7 +1944,7 @@ def check_variant(description, output):
             if not len(cds_original) % 3:
                 try:
                     # FIXME this is a bit of a rancid fix.
-                    protein_original = cds_original.translate(table=transcript.txTable, cds=True)
+                    protein_original = reference_cds.translate(cds=True)
                 except CodonTable.TranslationError:
                     if transcript.current:
                         output.addMessage(
@@ -1953,17 +1967,12 @@ def check_variant(description, output):
                     # with `cds=True`, but not otherwise.
                     # So we manually translate the first codon to M. But only
                     # if it was not affected by the variant.
-                    protein_variant = cds_variant.translate(table=transcript.txTable)
+                    # Only the changed part of `cds_variant` is translated,
+                    # up to and including the first '*'.
+                    protein_variant = reference_cds.translate_variant(cds_variant)
                     if protein_variant and unicode(cds_variant[:3]) == unicode(cds_original[:3]):
                         protein_variant = protein_original[0] + protein_variant[1:]
 
-                        # Up to and including the first '*', or the entire string.
-                        try:
-                            stop = unicode(protein_variant).index('*')
-                            protein_variant = protein_variant[:stop + 1]
-                        except ValueError:
-                            pass
-
                         try:
                             cds_length = util.cds_length(
                                 mutator.shift_sites(transcript.CDS.positionList))
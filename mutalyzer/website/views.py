@@ -6,6 +6,7 @@ Mutalyzer website views.
 from __future__ import unicode_literals
 
 import bz2
+import gzip
 import os
 import pkg_resources
 import re
@@ -979,8 +980,8 @@ def batch_job_progress():
         # Only now, the job can be complete. But since we don't keep completed
         # jobs in the database, we can only see if it ever existed by checking
         # the result file.
-        path = os.path.join(settings.CACHE_DIR, 'batch-job-%s.txt' % result_id)
-        if os.path.isfile(path):
+        path, _ = Scheduler.get_result_file(result_id)
+        if path is not None:
             if json:
                 return jsonify(items_left=1, complete=True)
             return render_template('batch-job-progress.html',
@@ -1010,10 +1011,32 @@ def batch_job_result(result_id):
         # If the batch job exists, it is not done yet.
         abort(404)
 
-    return send_from_directory(settings.CACHE_DIR,
-                               'batch-job-%s.txt' % result_id,
-                               mimetype='text/plain; charset=utf-8',
-                               as_attachment=True)
+    path, compressed = Scheduler.get_result_file(result_id)
+    if path is None:
+        abort(404)
+
+    if not compressed:
+        return send_from_directory(settings.CACHE_DIR,
+                                   os.path.basename(path),
+                                   mimetype='text/plain; charset=utf-8',
+                                   as_attachment=True)
+
+    # Compressed result files are served as is to clients accepting gzip
+    # encoding, for other clients we decompress them.
+    if 'gzip' in request.accept_encodings:
+        response = send_from_directory(settings.CACHE_DIR,
+                                       os.path.basename(path),
+                                       mimetype='text/plain; charset=utf-8')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with gzip.open(path, 'rb') as f:
+            response = make_response(f.read())
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Content-Disposition'] = (
+        'attachment; filename="batch-job-%s.txt"' % result_id)
+    return response
 
 
 # Todo: Is this obsolete?
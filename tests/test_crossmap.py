@@ -5,7 +5,11 @@ Tests for the mutalyzer.Crossmap module.
 
 from __future__ import unicode_literals
 
-from mutalyzer.Crossmap import Crossmap
+import time
+
+import pytest
+
+from mutalyzer.Crossmap import Crossmap, get_crossmap
 
 
 def test_splice_sites():
@@ -374,3 +378,73 @@ def test_cds_is_exon_reverse():
     cds = [58661, 58762]
     cm = Crossmap(rna, cds, -1)
     assert cm._Crossmap__crossmapping == [297, 103, 102, 1, -1, -88]
+
+
+@pytest.mark.usefixtures('settings')
+def test_get_crossmap():
+    """
+    Crossmap objects are shared between transcripts with the same splice
+    sites, CDS and orientation.
+    """
+    rna = [27745, 27939, 58661, 58762, 74680, 74767]
+    cds = [58661, 58762]
+    cm = get_crossmap(rna, cds, 1)
+    assert cm._Crossmap__crossmapping == [-195, -1, 1, 102, 103, 190]
+    assert get_crossmap(list(rna), list(cds), 1) is cm
+    assert get_crossmap(rna, cds, -1) is not cm
+    assert get_crossmap(rna, [], 1) is not cm
+
+
+def test_get_crossmap_disabled(request, settings):
+    """
+    Crossmap objects are not shared if the cache is disabled.
+    """
+    cache_size = settings.CROSSMAP_CACHE_SIZE
+    settings.configure({'CROSSMAP_CACHE_SIZE': 0})
+    request.addfinalizer(
+        lambda: settings.configure({'CROSSMAP_CACHE_SIZE': cache_size}))
+
+    rna = [27745, 27939, 58661, 58762, 74680, 74767]
+    cds = [58661, 58762]
+    assert get_crossmap(rna, cds, 1) is not get_crossmap(rna, cds, 1)
+
+
+@pytest.mark.parametrize('orientation', [1, -1])
+def test_many(orientation):
+    """
+    Translating many positions at once gives the same results as translating
+    them one by one.
+    """
+    rna = [5002, 5125, 27745, 27939, 58661, 58762, 74680, 74767, 103409,
+           103528, 119465, 119537, 144687, 144810, 148418, 149215]
+    cds = [27925, 74736]
+    cm = Crossmap(rna, cds, orientation)
+    positions = range(4900, 149300, 7)
+    coding = cm.g2x_many(positions)
+    assert coding == [cm.g2x(g) for g in positions]
+    assert cm.x2g_many(coding) == positions
+
+
+@pytest.mark.parametrize('orientation', [1, -1])
+def test_many_exons_time(orientation):
+    """
+    Translating positions on a transcript with many exons should not take
+    much longer than on a transcript with a few exons.
+    """
+    def translate_time(exons):
+        rna = []
+        for exon in range(exons):
+            rna.extend([1000 * exon + 1, 1000 * exon + 100])
+        cm = Crossmap(rna, [150, 1000 * exons - 950], orientation)
+        positions = range(1, 1000 * exons, 1000 * exons // 1000)
+        timings = []
+        for _ in range(3):
+            start = time.time()
+            coding = cm.g2x_many(positions)
+            cm.x2g_many(coding)
+            timings.append(time.time() - start)
+        return min(timings)
+
+    few = translate_time(4)
+    many = translate_time(2000)
+    assert many < 5 * few
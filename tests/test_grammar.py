@@ -5,8 +5,11 @@ Tests for the mutalyzer.grammar module.
 
 from __future__ import unicode_literals
 
+import time
+
 import pytest
 
+from mutalyzer import grammar as grammar_module
 from mutalyzer.grammar import Grammar
 
 
@@ -162,3 +165,43 @@ def test_parse_minus_in_gene_symbol(parser):
     Gene symbol is allowed to contain a minus character.
     """
     parser('UD_132464528477(KRTAP2-4_v001):c.100del')
+
+
+@pytest.mark.parametrize('length', [1000, 5000])
+def test_parse_long_insertion(grammar, length):
+    """
+    Parsing a long inserted sequence should not take much longer than
+    parsing a short one.
+    """
+    def parse_time(sequence):
+        description = 'NM_002001.2:c.15_16ins' + sequence
+        timings = []
+        for _ in range(3):
+            start = time.time()
+            # Bypass the parse cache.
+            result, _ = grammar._parse(description)
+            timings.append(time.time() - start)
+        assert result.RawVar.Seq.Sequence == sequence
+        return min(timings)
+
+    short = parse_time('ACGT')
+    long_ = parse_time('ACGT' * (length // 4))
+    assert long_ < 10 * short
+
+
+def test_parse_cache(output, grammar):
+    """
+    Parse results are cached and parse errors are reported again.
+    """
+    cache = grammar_module._get_parse_cache()
+    cache.clear()
+
+    assert grammar.parse('NM_002001.2:c.12del') is \
+        grammar.parse('NM_002001.2:c.12del')
+
+    assert grammar.parse('NM_002001.2:c.12delx') is None
+    assert grammar.parse('NM_002001.2:c.12delx') is None
+    assert len(output.getMessagesWithErrorCode('EPARSE')) == 2
+    assert output.getOutput('parseError') == [
+        'NM_002001.2:c.12delx', ' ' * 19 + '^'] * 2
+    assert (cache.hits, cache.misses) == (2, 2)
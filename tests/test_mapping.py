@@ -5,11 +5,14 @@ Tests for the mutalyzer.mapping module.
 
 from __future__ import unicode_literals
 
+import array
 import codecs
 import os
+import struct
 
 import pytest
 
+from mutalyzer.db import queries, session
 from mutalyzer.db.models import TranscriptMapping
 from mutalyzer import mapping
 
@@ -50,8 +53,14 @@ LRG_348_T1_POSITIONS = [
 pytestmark = pytest.mark.usefixtures('hg19_transcript_mappings')
 
 
-@pytest.fixture
-def converter(output, hg19):
+@pytest.fixture(params=[False, True], ids=['database', 'index'])
+def converter(request, settings, output, hg19):
+    # Run all converter tests with and without the transcript mapping index.
+    transcript_mapping_index = settings.TRANSCRIPT_MAPPING_INDEX
+    settings.configure({'TRANSCRIPT_MAPPING_INDEX': request.param})
+    request.addfinalizer(lambda: settings.configure(
+        {'TRANSCRIPT_MAPPING_INDEX': transcript_mapping_index}))
+
     return mapping.Converter(hg19, output)
 
 
@@ -562,3 +571,182 @@ def test_import_lrgmap(hg19):
     assert new.orientation == 'reverse'
     assert new.reference_type == 'lrg'
     assert new.source == 'ebi'
+
+
+def test_convert_batch(converter):
+    """
+    Batch conversion gives the same results as converting the variants one
+    by one.
+    """
+    variants = ['NC_000011.9:g.111959695G>T',
+                'NM_003002.2:c.274G>T',
+                'NC_000006.11:g.32006291C>T',
+                'NC_000011.9:g.[111959695G>T;111959699A>G]',
+                'NM_000500.5:c.92C>T',
+                'chrM:m.1000A>T',
+                'NM_003002.2:c.[274G>T;278A>G]',
+                'NC_000011.9:g.111959695_111959690del',
+                'NC_000011.9:g.111959693G>T',
+                'chr7:g.345T>C',
+                'NM_003002.2:c.?',
+                'NM_003002.2:274G>T',
+                'NM_003002.2:c.274G>T']
+
+    expected = []
+    for variant in variants:
+        variant = converter.correctChrVariant(variant)
+        if 'c.' in variant or 'n.' in variant:
+            expected.append([converter.c2chrom(variant)])
+        elif 'g.' in variant or 'm.' in variant:
+            expected.append(converter.chrom2c(variant, 'list') or [])
+        else:
+            expected.append([''])
+        converter._reset()
+
+    assert converter.convert_batch(variants) == expected
+    assert expected[0] and expected[2]
+
+
+def test_convert_batch_invalid(converter):
+    """
+    Batch conversion gives an empty list for variants that cannot be
+    converted.
+    """
+    variants = ['NC_000011.9:g.111959695G>T',
+                'NC_000011.9:g.111959695_111959690del',
+                'NC_000011.9:g.111959695G>',
+                'NC_000099.1:g.1000A>T',
+                'NM_003002.2:c.274G>T']
+    coding = converter.convert_batch(variants)
+    assert len(coding) == 5
+    assert 'NM_003002.2:c.274G>T' in coding[0]
+    assert coding[1:4] == [[], [], []]
+    assert coding[4] == ['NC_000011.9:g.111959695G>T']
+
+
+def test_convert_batch_gene(converter):
+    """
+    Batch conversion to all transcripts for a gene.
+    """
+    variants = ['NC_000023.10:g.32827640G>A', 'NC_000023.10:g.32827640G>C']
+    coding = converter.convert_batch(variants, gene='DMD')
+    assert 'NM_004007.2:c.250C>T' in coding[0]
+    assert 'NM_004011.3:c.-397314C>T' in coding[0]
+    assert 'NM_004007.2:c.250C>G' in coding[1]
+
+
+def test_convert_batch_crossmap_reuse(request, settings, converter,
+                                      monkeypatch):
+    """
+    Batch conversion creates one crossmapper per transcript, also without
+    the crossmapper cache.
+    """
+    cache_size = settings.CROSSMAP_CACHE_SIZE
+    settings.configure({'CROSSMAP_CACHE_SIZE': 0})
+    request.addfinalizer(
+        lambda: settings.configure({'CROSSMAP_CACHE_SIZE': cache_size}))
+
+    crossmaps = []
+    original_crossmap = mapping.Crossmap.Crossmap
+
+    def crossmap(*args):
+        crossmaps.append(args)
+        return original_crossmap(*args)
+
+    monkeypatch.setattr(mapping.Crossmap, 'Crossmap', crossmap)
+
+    coding = converter.convert_batch(
+        ['NM_003002.2:c.%dG>T' % position for position in range(270, 280)])
+    assert len(coding) == 10
+    assert len(crossmaps) == 1
+
+
+def test_transcript_mapping_positions(hg19):
+    """
+    Exon positions are stored as packed 32-bit integers.
+    """
+    chromosome = hg19.chromosomes.filter_by(name='chr1').one()
+    exon_starts = [1, 70000, 249250000]
+    exon_stops = [2, 70100, 249250621]
+    session.add(TranscriptMapping(
+        chromosome, 'refseq', 'NM_999999', 'TEST', 'forward', 1, 249250621,
+        exon_starts, exon_stops, 'ncbi', version=1))
+    session.commit()
+    session.expire_all()
+
+    mapping = TranscriptMapping.query.filter_by(accession='NM_999999').one()
+    assert mapping.exon_starts == exon_starts
+    assert mapping.exon_stops == exon_stops
+    assert mapping.packed_exon_starts == array.array(b'i', exon_starts)
+    assert mapping.packed_exon_stops == array.array(b'i', exon_stops)
+
+    packed = session.execute(
+        'SELECT exon_starts FROM transcript_mappings WHERE id = :id',
+        {'id': mapping.id}).scalar()
+    assert bytes(packed) == struct.pack('<3i', *exon_starts)
+
+
+def test_crossmap_packed_positions(converter, monkeypatch):
+    """
+    The crossmapper is built from the packed exon positions, without
+    converting them to lists.
+    """
+    monkeypatch.setattr(TranscriptMapping, 'exon_starts', None)
+    monkeypatch.setattr(TranscriptMapping, 'exon_stops', None)
+
+    genomic = converter.c2chrom('NM_003002.2:c.274G>T')
+    assert genomic == 'NC_000011.9:g.111959695G>T'
+
+    exons = zip(converter.mapping.packed_exon_starts,
+                converter.mapping.packed_exon_stops)
+    assert isinstance(converter.crossmap.RNA, array.array)
+    assert converter.crossmap.RNA.tolist() == [position for exon in exons
+                                               for position in exon]
+
+
+def test_transcript_mapping_index(request, settings, hg19):
+    """
+    Range queries on the transcript mapping index give the same results as
+    on the database.
+    """
+    chromosome = hg19.chromosomes.filter_by(name='chr11').one()
+    ranges = [(111955524, 111955524), (111957500, 111957600),
+              (111950000, 111970000), (111957571, 111966518), (1, 1000)]
+
+    def query(contained):
+        return [[mapping.reference for mapping in
+                 queries.get_transcript_mappings(
+                     chromosome, start, stop, contained=contained)]
+                for start, stop in ranges]
+
+    expected = query(False), query(True)
+
+    request.addfinalizer(
+        lambda: settings.configure({'TRANSCRIPT_MAPPING_INDEX': False}))
+    settings.configure({'TRANSCRIPT_MAPPING_INDEX': True})
+
+    assert (query(False), query(True)) == expected
+    assert expected[0][2]
+
+
+def test_transcript_mapping_index_invalidate(request, settings, hg19):
+    """
+    The transcript mapping index is reloaded after importing transcript
+    mappings.
+    """
+    request.addfinalizer(
+        lambda: settings.configure({'TRANSCRIPT_MAPPING_INDEX': False}))
+    settings.configure({'TRANSCRIPT_MAPPING_INDEX': True})
+
+    chromosome = hg19.chromosomes.filter_by(name='chr11').one()
+    before = queries.get_transcript_mappings(chromosome, 1, 1000)
+    assert before == []
+
+    session.add(TranscriptMapping(
+        chromosome, 'refseq', 'NM_999999', 'TEST', 'forward', 100, 200,
+        [100], [200], 'ncbi', version=1))
+    session.commit()
+    queries.invalidate_transcript_mappings()
+
+    after = queries.get_transcript_mappings(chromosome, 1, 1000)
+    assert [mapping.reference for mapping in after] == ['NM_999999.1']
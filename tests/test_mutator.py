@@ -7,9 +7,11 @@ from __future__ import unicode_literals
 
 import pytest
 import random
+from Bio import Restriction
 from Bio.Seq import Seq
 
-from mutalyzer.mutator import Mutator
+from mutalyzer.mutator import (Mutator, PieceTable, RestrictionSiteScanner,
+                               _ShiftTree)
 
 
 @pytest.fixture
@@ -23,9 +25,9 @@ def sequence(length):
     return Seq(''.join(random.choice('ACGT') for _ in range(length)))
 
 
-@pytest.fixture
-def mutator(output, sequence):
-    return Mutator(sequence, output)
+@pytest.fixture(params=[False, True], ids=['string', 'piece-table'])
+def mutator(request, output, sequence):
+    return Mutator(sequence, output, piece_table=request.param)
 
 
 def test_shift_no_change(length, mutator):
@@ -1294,3 +1296,102 @@ def test_adjecent_ins_inv_2(mutator):
     mutator.insertion(2, 'G')
     mutator.inversion(2, 2)
     assert unicode(mutator.mutated) == unicode(Seq('AAGCGATCG'))
+
+
+@pytest.mark.parametrize('sequence', [Seq('ATCGATCGATCG')])
+def test_piece_table_slicing(output, sequence):
+    """
+    Slicing the mutated sequence in piece table mode after several mutations.
+    """
+    mutator = Mutator(sequence, output, piece_table=True)
+    mutator.deletion(2, 3)        # g.2_3del
+    mutator.insertion(6, 'TTT')   # g.6_7insTTT
+    mutator.substitution(10, 'C') # g.10G>C
+    expected = 'AGATTTTCGACCG'
+    assert unicode(mutator.mutated) == expected
+    assert len(mutator.mutated) == len(expected)
+    for i in range(len(expected)):
+        assert mutator.mutated[i] == expected[i]
+        for j in range(i, len(expected) + 1):
+            assert unicode(mutator.mutated[i:j]) == expected[i:j]
+
+
+def test_piece_table_random(sequence):
+    """
+    Random replacements in a piece table give the same sequence as on a
+    string.
+    """
+    expected = unicode(sequence)
+    piece_table = PieceTable(sequence)
+    for _ in range(200):
+        pos1 = random.randint(0, len(expected))
+        pos2 = random.randint(pos1, min(pos1 + 5, len(expected)))
+        ins = ''.join(random.choice('ACGT')
+                      for _ in range(random.randint(0, 5)))
+        piece_table.delins(pos1, pos2, ins)
+        expected = expected[:pos1] + ins + expected[pos2:]
+        assert len(piece_table) == len(expected)
+    assert unicode(piece_table) == expected
+    for i in range(len(expected)):
+        assert piece_table[i] == expected[i]
+        assert unicode(piece_table[i:i + 7]) == expected[i:i + 7]
+
+
+def test_shift_tree_random():
+    """
+    Sums of random shifts, also beyond the initial length of the tree.
+    """
+    shifts = []
+    shift_tree = _ShiftTree(30)
+    for _ in range(200):
+        position = random.randint(0, 100)
+        shift = random.randint(-5, 5)
+        shift_tree.add(position, shift)
+        shifts.append((position, shift))
+    for position in range(-1, 110):
+        assert shift_tree.total(position) == sum(
+            s for p, s in shifts if p <= position)
+
+
+@pytest.mark.parametrize('alphabet', ['ACGT', 'ACGTN', 'acgtRY'])
+def test_restriction_site_scanner(alphabet):
+    """
+    Restriction site counts should equal those of a restriction analysis by
+    BioPython.
+    """
+    enzymes = Restriction.RestrictionBatch([], ['N'])
+    scanner = RestrictionSiteScanner(enzymes)
+    for length in [0, 1, 5, 20, 51, 100]:
+        for _ in range(20):
+            sequence = Seq(''.join(random.choice(alphabet)
+                                   for _ in range(length)))
+            analysis = Restriction.Analysis(enzymes, sequence)
+            expected = dict((unicode(k), len(v))
+                            for k, v in analysis.with_sites().items())
+            assert scanner.count(sequence) == expected
+
+
+@pytest.mark.parametrize('sequence', [Seq('ATCGATCGGAATTCATCG')])
+def test_restriction_sites(output, sequence, mutator):
+    """
+    Deleting an EcoRI site.
+    """
+    mutator.deletion(10, 10)
+    created, deleted = output.getIndexedOutput('restrictionSites', 0)
+    assert 'EcoRI' in deleted
+    assert 'EcoRI' not in created
+
+
+@pytest.mark.parametrize('sequence', [Seq('ATCGATCGGAATTCATCG')])
+def test_restriction_sites_disabled(request, settings, output, sequence,
+                                    mutator):
+    """
+    No restriction site analysis if it is disabled.
+    """
+    restriction_analysis = settings.RESTRICTION_ANALYSIS
+    settings.configure({'RESTRICTION_ANALYSIS': False})
+    request.addfinalizer(lambda: settings.configure(
+        {'RESTRICTION_ANALYSIS': restriction_analysis}))
+
+    mutator.deletion(10, 10)
+    assert output.getOutput('restrictionSites') == []
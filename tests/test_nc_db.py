@@ -0,0 +1,156 @@
+"""
+Tests for the mutalyzer.nc_db module.
+"""
+
+
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from mutalyzer import dbgb
+from mutalyzer.dbgb.models import Reference, Transcript
+from mutalyzer.nc_db import MappedSequence
+from mutalyzer import util
+from mutalyzer.variantchecker import check_variant
+
+
+@pytest.fixture
+def sequence(tmpdir):
+    path = tmpdir.join('chr.sequence')
+    path.write('ACGTACGTTTGA')
+    return MappedSequence(unicode(path), 1, 13)
+
+
+def test_mapped_sequence_slicing(sequence):
+    """
+    Indexing and slicing a memory-mapped sequence.
+    """
+    assert len(sequence) == 12
+    assert sequence[0] == 'A'
+    assert sequence[-1] == 'A'
+    assert unicode(sequence[2:6]) == 'GTAC'
+    assert unicode(sequence[10:20]) == 'GA'
+    assert unicode(sequence[:0]) == ''
+    assert unicode(sequence[1:9:3]) == 'CAT'
+    assert unicode(sequence[::-1]) == 'AGTTTGCATGCA'
+    assert unicode(sequence[9:2:-2]) == 'TTCT'
+    assert unicode(sequence[3:9:-1]) == ''
+    with pytest.raises(IndexError):
+        sequence[12]
+
+
+def test_mapped_sequence_operations(sequence):
+    """
+    Sequence operations on a memory-mapped sequence.
+    """
+    assert unicode(sequence) == 'ACGTACGTTTGA'
+    assert unicode(sequence.reverse_complement()) == 'TCAAACGTACGT'
+    assert unicode(sequence.translate()) == 'TYV*'
+    assert unicode(util.splice(sequence, [2, 4, 9, 10])) == 'CGTTT'
+
+
+def test_mapped_sequence_window_operations(monkeypatch, sequence):
+    """
+    Searching and common operations on a memory-mapped sequence do not copy
+    the entire sequence.
+    """
+    def entire_sequence(self):
+        raise AssertionError('entire sequence should not be used')
+
+    monkeypatch.setattr(MappedSequence, '_seq', entire_sequence)
+    monkeypatch.setattr(MappedSequence, '__str__', entire_sequence)
+    monkeypatch.setattr(MappedSequence, '__unicode__', entire_sequence)
+
+    assert sequence.find('TTT') == 7
+    assert sequence.find('ACG', 1) == 4
+    assert sequence.find('ACG', 1, 6) == -1
+    assert sequence.find('CCC') == -1
+    assert sequence.rfind('ACG') == 4
+    assert sequence.rfind('ACG', 0, -6) == 0
+    assert sequence.count('T') == 4
+    assert sequence.count('ACG') == 2
+    assert sequence.count('TT', 7) == 1
+    assert sequence.startswith('ACGT')
+    assert not sequence.startswith('ACGT', 1)
+    assert sequence.endswith('TGA')
+    assert not sequence.endswith('TGA', 0, -1)
+    assert unicode(sequence.complement()) == 'TGCATGCAAACT'
+    assert unicode(sequence.reverse_complement()) == 'TCAAACGTACGT'
+    assert unicode(sequence.translate(to_stop=True)) == 'TYV'
+    assert unicode(sequence.lower().upper()) == 'ACGTACGTTTGA'
+
+
+def test_mapped_sequence_entire_once(monkeypatch, sequence):
+    """
+    Operations on the entire memory-mapped sequence copy it only once.
+    """
+    copies = []
+    monkeypatch.setattr(MappedSequence, '__str__',
+                        lambda self: copies.append(None) or 'ACGTACGTTTGA')
+
+    assert unicode(sequence + 'C') == 'ACGTACGTTTGAC'
+    assert unicode('C' + sequence) == 'CACGTACGTTTGA'
+    assert sequence.tomutable()[0] == 'A'
+    assert len(copies) == 1
+
+
+@pytest.fixture
+def nc_reference(request, tmpdir, settings):
+    """
+    A chromosomal reference in the gbparser database, with one transcript
+    on a memory-mapped sequence.
+    """
+    seq_path = tmpdir.mkdir('sequences')
+    request.addfinalizer(lambda: settings._wrapped.pop('SEQ_PATH', None))
+    request.addfinalizer(dbgb.session.remove)
+    settings.configure({'DATABASE_GB_URI': 'sqlite://',
+                        'SEQ_PATH': unicode(seq_path) + '/'})
+
+    # Transcript at 5001_5300 with CDS 5051_5149.
+    random.seed(0)
+    codons = [c for c in (''.join(random.choice('ACGT') for _ in range(3))
+                          for _ in range(100))
+              if c not in ('TAA', 'TAG', 'TGA')][:31]
+    sequence = ''.join(random.choice('ACGT') for _ in range(5050))
+    sequence += 'ATG' + ''.join(codons) + 'TAA'
+    sequence += ''.join(random.choice('ACGT') for _ in range(5000))
+    seq_path.join('checksum.sequence').write(sequence)
+
+    reference = Reference('NC_000001', '11', 'checksum', 'checksum', 'ncbi',
+                          '01-JAN-2017', len(sequence), 'genomic DNA', '1')
+    dbgb.session.add(reference)
+    dbgb.session.flush()
+    transcript = Transcript('NM_000001', '1', 'NP_000001', '1', 'GENE', None,
+                            '+', 5001, 5300, 5051, 5149, '5001', '5300',
+                            None, '1', None, None)
+    transcript.reference_id = reference.id
+    dbgb.session.add(transcript)
+    dbgb.session.commit()
+    return sequence
+
+
+@pytest.mark.usefixtures('hg19')
+def test_check_variant_mapped_sequence(monkeypatch, output, nc_reference):
+    """
+    Checking variants on a chromosomal reference should only read the parts
+    of the sequence it needs, never the entire sequence.
+    """
+    def entire_sequence(self):
+        raise AssertionError('entire sequence should not be used')
+
+    monkeypatch.setattr(MappedSequence, '_seq', entire_sequence)
+    monkeypatch.setattr(MappedSequence, '__str__', entire_sequence)
+    monkeypatch.setattr(MappedSequence, '__unicode__', entire_sequence)
+
+    check_variant('NC_000001.11:g.5060del', output)
+    assert output.getOutput('descriptions') == [
+        'NC_000001.11(GENE_v001):c.10del']
+
+    check_variant('NC_000001.11(NM_000001.1):c.10del', output)
+    assert output.getOutput('genomicDescription')[-1] == \
+        'NC_000001.11:g.5060del'
+    assert output.getOutput('oldProtein') == [
+        'MFRSVLLFVHVLADYIHVGCGAQGIFCALCVR*']
+    assert output.getOutput('newProtein') == ['MFRPCCFSCTFSLTTFT*']
@@ -5,23 +5,36 @@ Tests for the mutalyzer.ncbi module.
 
 from __future__ import unicode_literals
 
+import BaseHTTPServer
+import bz2
+import io
+import os
+import re
+import threading
+import urlparse
+
 import Bio.Entrez
 import pytest
+from sqlalchemy import event
 
 from mutalyzer import ncbi
+from mutalyzer.db.models import TranscriptProteinLink
 from mutalyzer.redisclient import client as redis
 
 from fixtures import with_links
 
 
 @pytest.fixture
-def entrez(request, monkeypatch):
+def entrez(request, monkeypatch, db):
     """
     Fixture monkey-patching the NCBI Entrez API to return transcript-protein
     links defined in the fixture parameter.
 
     The fixture is similar to the :func:`fixtures.links` fixture, but instead
     of storing the links in the cache, the API is monkey-patched.
+
+    Links are looked up in the database before querying the cache or the
+    Entrez API, so this fixture depends on the database fixture.
     """
     try:
         links = request.param
@@ -411,3 +424,388 @@ def test_protein_to_transcript_cache(accession, version, match_version,
     reverse = [(redis.get(key) or None, key.split(':')[-1])
                for key in redis.keys('ncbi:protein-to-transcript:*')]
     assert sorted(reverse) == sorted(expected_reverse)
+
+
+GENE2REFSEQ = """\
+#tax_id\tGeneID\tstatus\tRNA_nucleotide_accession.version\tRNA_nucleotide_gi\tprotein_accession.version\tprotein_gi\tgenomic_nucleotide_accession.version
+9606\t1\tREVIEWED\tNM_11111.2\t1\tNP_11111.2\t2\tNC_000019.10
+9606\t1\tREVIEWED\tNM_11111.2\t1\tNP_11111.2\t2\tNG_000001.1
+9606\t2\tREVIEWED\tNM_22222.3\t3\tNP_22222.3\t4\t-
+9606\t3\tVALIDATED\tNR_33333.1\t5\t-\t-\tNC_000001.11
+10090\t4\tPROVISIONAL\tNM_44444.1\t6\tNP_44444.1\t7\t-
+"""
+
+
+@with_entrez(('NM_11111.2', 'NP_11111.9'),
+             ('NM_22222.3', 'NP_22222.9'))
+@pytest.mark.parametrize('accession,version,match_version,expected', [
+    ('NM_11111', None, False, ('NP_11111', None)),
+    ('NM_11111', 2, True, ('NP_11111', 2)),
+    ('NM_11111', 1, False, ('NP_11111', None)),
+    ('NM_22222', 3, True, ('NP_22222', 3))])
+def test_transcript_to_protein_table(accession, version, match_version,
+                                     expected):
+    """
+    Get protein for transcript from links imported from a gene2refseq file.
+
+    Links in the table take precedence over the Entrez API and are not
+    cached.
+    """
+    count = ncbi.import_links_from_gene2refseq(GENE2REFSEQ.splitlines(True))
+    assert count == 2
+    assert TranscriptProteinLink.query.count() == 2
+
+    assert ncbi.transcript_to_protein(
+        accession, version, match_version) == expected
+    assert not redis.keys('ncbi:*')
+
+
+@with_entrez(('NM_11111.2', 'NP_11111.9'),
+             ('NM_22222.3', 'NP_22222.9'))
+@pytest.mark.parametrize('match_version', [True, False])
+def test_transcripts_to_proteins_table(db, match_version):
+    """
+    Get proteins for many transcripts from links imported from a gene2refseq
+    file with one query.
+    """
+    ncbi.import_links_from_gene2refseq(GENE2REFSEQ.splitlines(True))
+    transcripts = [('NM_11111', None), ('NM_11111', 2), ('NM_22222', 3),
+                   ('NM_11111', 2)]
+    if not match_version:
+        transcripts.append(('NM_11111', 1))
+    expected = [ncbi.transcript_to_protein(accession, version, match_version)
+                for accession, version in transcripts]
+
+    statements = []
+    engine = db.session.get_bind()
+    record = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        links = ncbi.transcripts_to_proteins(transcripts, match_version)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert links == expected
+    assert len(statements) == 1
+    assert not redis.keys('ncbi:*')
+
+
+@pytest.mark.usefixtures('db')
+def test_protein_to_transcript_table():
+    """
+    Get transcript for protein from links imported from a gene2refseq file.
+    """
+    count = ncbi.import_links_from_gene2refseq(GENE2REFSEQ.splitlines(True),
+                                               taxonomy_id=10090)
+    assert count == 1
+    assert ncbi.protein_to_transcript('NP_44444', 1) == ('NM_44444', 1)
+    assert ncbi.protein_to_transcript('NP_44444') == ('NM_44444', None)
+
+
+@pytest.fixture
+def entrez_server(request, monkeypatch, db):
+    """
+    Fixture running a local HTTP stand-in for the NCBI Entrez API serving
+    transcript-protein links defined in the fixture parameter.
+
+    Unlike the :func:`entrez` fixture, this goes through the Entrez module
+    of Biopython, so we can count the number of requests. The requested
+    paths are returned.
+    """
+    links = request.param
+    requests = []
+
+    # Records by GI, and GIs by accession.
+    records = {}
+    gis = {}
+    for i, (transcript, protein) in enumerate(links):
+        records['1%04d' % i] = transcript
+        gis[transcript] = '1%04d' % i
+        if protein is not None:
+            records['2%04d' % i] = protein
+            gis[protein] = '2%04d' % i
+
+    def esearch(query):
+        term = query['term'][0]
+        ids = [gis[accession] for accession in
+               re.findall(r'(\S+)\[accn\]', term) or [term]
+               if accession in gis]
+        # Search results are not in the order of the search terms.
+        ids.reverse()
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN"'
+            ' "https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+            '<eSearchResult><Count>%d</Count><RetMax>%d</RetMax>'
+            '<RetStart>0</RetStart><IdList>%s</IdList>'
+            '<TranslationSet/><QueryTranslation/></eSearchResult>\n'
+            % (len(ids), len(ids), ''.join('<Id>%s</Id>' % id for id in ids)))
+
+    def elink(query):
+        linksets = []
+        for id in query['id']:
+            transcript = records[id]
+            linkset = ''
+            if links[transcript] is not None:
+                linkset = (
+                    '<LinkSetDb><DbTo>protein</DbTo>'
+                    '<LinkName>nuccore_protein</LinkName>'
+                    '<Link><Id>%s</Id></Link></LinkSetDb>'
+                    % gis[links[transcript]])
+            linksets.append(
+                '<LinkSet><DbFrom>nuccore</DbFrom><IdList><Id>%s</Id></IdList>'
+                '%s</LinkSet>' % (id, linkset))
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE eLinkResult PUBLIC'
+            ' "-//NLM//DTD eLinkResult, 23 November 2010//EN"'
+            ' "https://www.ncbi.nlm.nih.gov/entrez/query/DTD/eLink_101123.dtd">'
+            '\n'
+            '<eLinkResult>%s</eLinkResult>\n' % ''.join(linksets))
+
+    def efetch(query):
+        return ''.join('%s\n' % records[id]
+                       for id in query['id'][0].split(','))
+
+    handlers = {'esearch': esearch, 'elink': elink, 'efetch': efetch}
+    links = dict(links)
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def handle_query(self, query):
+            utility = self.path.split('?')[0].split('/')[-1].split('.')[0]
+            requests.append(utility)
+            body = handlers[utility](urlparse.parse_qs(query)).encode('utf-8')
+            self.send_response(200)
+            self.send_header(b'Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.handle_query(urlparse.urlparse(self.path).query)
+
+        def do_POST(self):
+            self.handle_query(self.rfile.read(
+                int(self.headers.getheader('Content-Length'))))
+
+        def log_message(self, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    request.addfinalizer(server.shutdown)
+
+    url = 'http://127.0.0.1:%d/' % server.server_port
+    urlopen = Bio.Entrez._urlopen
+
+    def local_urlopen(cgi, *args, **kwargs):
+        return urlopen(cgi.replace(
+            'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/', url),
+                       *args, **kwargs)
+
+    monkeypatch.setattr(Bio.Entrez, '_urlopen', local_urlopen)
+    return requests
+
+
+@pytest.mark.parametrize('entrez_server', [
+    [('NM_%05d.%d' % (i, i % 3 + 1), 'NP_%05d.%d' % (i, i % 5 + 1))
+     for i in range(50)] +
+    [('NM_99999.1', None)]], indirect=True)
+def test_transcripts_to_proteins(entrez_server):
+    """
+    Get proteins for many transcripts with a fixed number of requests to the
+    Entrez API.
+    """
+    transcripts = [('NM_%05d' % i, i % 3 + 1) for i in range(50)]
+    expected = [('NP_%05d' % i, i % 5 + 1) for i in range(50)]
+
+    assert ncbi.transcripts_to_proteins(transcripts) == expected
+    assert entrez_server == ['esearch', 'efetch', 'elink', 'efetch']
+
+    # All links are cached in both directions, with and without version.
+    assert len(redis.keys('ncbi:transcript-to-protein:*')) == 100
+    assert len(redis.keys('ncbi:protein-to-transcript:*')) == 100
+
+    del entrez_server[:]
+    assert ncbi.transcripts_to_proteins(transcripts) == expected
+    assert ncbi.transcript_to_protein('NM_00007', 2) == ('NP_00007', 3)
+    assert entrez_server == []
+
+
+@pytest.mark.parametrize('entrez_server', [
+    [('NM_11111.1', 'NP_11111.1'),
+     ('NM_22222.2', None)]], indirect=True)
+def test_transcripts_to_proteins_missing(entrez_server):
+    """
+    Transcripts that could not be linked in one batch are retried
+    separately, and not found links are cached negatively.
+    """
+    assert ncbi.transcripts_to_proteins(
+        [('NM_11111', 1), ('NM_22222', 2), ('NM_11111', 1)]) == [
+            ('NP_11111', 1), None, ('NP_11111', 1)]
+    assert entrez_server == ['esearch', 'efetch', 'elink', 'efetch',
+                             'esearch', 'elink']
+    assert redis.get('ncbi:transcript-to-protein:NM_22222.2') == ''
+
+    del entrez_server[:]
+    assert ncbi.transcripts_to_proteins([('NM_22222', 2)]) == [None]
+    assert entrez_server == []
+
+
+@pytest.fixture
+def redis_requests(monkeypatch):
+    """
+    Fixture counting the requests sent to Redis. Commands in a pipeline are
+    counted as one request.
+
+    The mock Redis client implements some commands by calling others, so we
+    only count the outermost calls.
+    """
+    requests = []
+    depth = [0]
+
+    def counting(name, method):
+        def counting_method(*args, **kwargs):
+            if not depth[0]:
+                requests.append(name)
+            depth[0] += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return counting_method
+
+    for name in ('get', 'mget', 'set', 'setex'):
+        monkeypatch.setattr(redis, name, counting(name, getattr(redis, name)))
+
+    pipeline = redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        p = pipeline(*args, **kwargs)
+        p.execute = counting('pipeline', p.execute)
+        return p
+
+    monkeypatch.setattr(redis, 'pipeline', counting_pipeline)
+    return requests
+
+
+@with_links(('NM_11111', 'NP_11111'),
+            ('NM_22222.2', 'NP_22222.2'),
+            ('NM_33333.3', None),
+            ('NM_44444', None))
+def test_transcripts_to_proteins_cache(redis_requests):
+    """
+    Get proteins for many transcripts from the cache with one request.
+    """
+    assert ncbi.transcripts_to_proteins(
+        [('NM_11111', 1), ('NM_22222', 2), ('NM_33333', 3), ('NM_44444', 4),
+         ('NM_22222', 2)], match_version=False) == [
+             ('NP_11111', None), ('NP_22222', 2), None, None, ('NP_22222', 2)]
+    assert redis_requests == ['mget']
+
+
+@with_entrez(('NM_11111.1', 'NP_11111.1'),
+             ('NM_22222', None),
+             ('NM_22222.2', None))
+def test_transcript_to_protein_cache_requests(redis_requests):
+    """
+    Get protein for transcript with one request to query the cache and one
+    request to store the result.
+    """
+    assert ncbi.transcript_to_protein('NM_11111', 1) == ('NP_11111', 1)
+    assert redis_requests == ['mget', 'pipeline']
+
+    del redis_requests[:]
+    with pytest.raises(ncbi.NoLinkError):
+        ncbi.transcript_to_protein('NM_22222', 2, match_version=False)
+    assert redis_requests == ['mget', 'pipeline']
+    assert redis.get('ncbi:transcript-to-protein:NM_22222.2') == ''
+    assert redis.get('ncbi:transcript-to-protein:NM_22222') == ''
+
+
+SNPS = """<?xml version="1.0"?>
+<ExchangeSet xmlns="https://www.ncbi.nlm.nih.gov/SNP/docsum">
+<Rs rsId="11111"><hgvs>NM_11111.1:c.1A&gt;G</hgvs><Assembly><Component><MapLoc><hgvs>NC_000001.10:g.1A&gt;G</hgvs></MapLoc></Component></Assembly></Rs>
+<Rs rsId="22222"><MergeHistory rsId="33333"/><hgvs>NM_22222.2:c.2del</hgvs></Rs>
+<Rs rsId="55555"/>
+</ExchangeSet>
+"""
+
+
+@pytest.fixture
+def snp_requests(monkeypatch):
+    """
+    Fixture monkey-patching the NCBI Entrez API to return dbSNP records from
+    the `SNPS` document (one record per line, filtered by the requested rs#s).
+    The requested lists of rs#s are returned.
+    """
+    requests = []
+
+    def mock_efetch(db=None, id=None, retmode=None):
+        requests.append(id)
+        document = '\n'.join(line for line in SNPS.splitlines()
+                              if not line.startswith('<Rs rsId=')
+                              or line.split('"')[1] in id
+                              or line.split('"')[1] == '22222' and '33333' in id)
+        return io.BytesIO(document.encode('utf-8'))
+
+    monkeypatch.setattr(Bio.Entrez, 'efetch', mock_efetch)
+    return requests
+
+
+@pytest.mark.usefixtures('settings')
+def test_rsid_to_descriptions(monkeypatch, output):
+    """
+    Get HGVS descriptions for an rs# from the cache after the first request.
+    """
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        'data', 'rs9919552.xml.bz2')
+    monkeypatch.setattr(Bio.Entrez, 'efetch',
+                        lambda *args, **kwargs: bz2.BZ2File(path))
+
+    descriptions = ncbi.rsid_to_descriptions('rs9919552', output)
+    assert len(descriptions) == 12
+    assert 'NM_003002.3:c.204C>T' in descriptions
+
+    monkeypatch.setattr(Bio.Entrez, 'efetch', None)
+    assert ncbi.rsid_to_descriptions('rs9919552', output) == descriptions
+    assert not output.getMessages()
+
+
+@pytest.mark.usefixtures('settings')
+def test_rsid_to_descriptions_negative(snp_requests, output):
+    """
+    Non-existing rs#s are cached negatively.
+    """
+    assert ncbi.rsid_to_descriptions('rs44444', output) == []
+    assert ncbi.rsid_to_descriptions('rs44444', output) == []
+    assert snp_requests == [['44444']]
+    assert [m.code for m in output.getMessages()] == ['EENTREZ', 'EENTREZ']
+    assert 0 < redis.ttl('ncbi:snp:rs44444') <= 60 * 60 * 24
+
+
+@pytest.mark.usefixtures('settings')
+def test_fetch_rsid_descriptions(snp_requests, output):
+    """
+    Retrieve HGVS descriptions for many rs#s with one request.
+    """
+    ncbi.fetch_rsid_descriptions(
+        ['rs11111', 'rs22222', 'rs33333', 'rs44444', 'rs55555', 'rs11111',
+         'r66666'])
+    assert snp_requests == [['11111', '22222', '33333', '44444', '55555']]
+
+    assert ncbi.rsid_to_descriptions('rs11111', output) == [
+        'NM_11111.1:c.1A>G', 'NC_000001.10:g.1A>G']
+    assert ncbi.rsid_to_descriptions('rs22222', output) == [
+        'NM_22222.2:c.2del']
+    assert ncbi.rsid_to_descriptions('rs33333', output) == [
+        'NM_22222.2:c.2del']
+    assert ncbi.rsid_to_descriptions('rs55555', output) == []
+    assert not output.getMessages()
+    assert ncbi.rsid_to_descriptions('rs44444', output) == []
+    assert len(output.getMessages()) == 1
+    assert len(snp_requests) == 1
+
+    ncbi.fetch_rsid_descriptions(['rs11111', 'rs44444'])
+    assert len(snp_requests) == 1
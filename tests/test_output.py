@@ -0,0 +1,38 @@
+"""
+Tests for the mutalyzer.output module.
+"""
+
+
+from __future__ import unicode_literals
+
+
+def test_lazy_output(output):
+    """
+    Lazy output should only be computed on retrieval, and only once.
+    """
+    calls = []
+
+    def compute():
+        calls.append(None)
+        return 'computed'
+
+    output.addOutput('data', 'first')
+    output.addLazyOutput('data', compute)
+    assert calls == []
+
+    assert output.getIndexedOutput('data', 0) == 'first'
+    assert calls == []
+    assert output.getOutput('data') == ['first', 'computed']
+    assert output.getIndexedOutput('data', 1) == 'computed'
+    assert calls == [None]
+
+
+def test_lazy_output_missing(output):
+    """
+    Retrieving a missing index should not compute lazy output.
+    """
+    calls = []
+    output.addLazyOutput('data', lambda: calls.append(None))
+
+    assert output.getIndexedOutput('data', 1, 'default') == 'default'
+    assert calls == []
@@ -0,0 +1,45 @@
+"""
+Tests for the mutalyzer.recordstore module.
+"""
+
+
+from __future__ import unicode_literals
+
+import mockredis
+import pytest
+
+from mutalyzer import recordstore
+
+
+@pytest.fixture(params=['directory', 'redis'])
+def store(request, tmpdir):
+    if request.param == 'directory':
+        return recordstore.DirectoryRecordStore(unicode(tmpdir))
+    return recordstore.RedisRecordStore(mockredis.MockRedis(strict=True))
+
+
+def test_get_put(store):
+    """
+    Files are stored by checksum.
+    """
+    assert store.get('0123456789abcdef') is None
+    store.put('0123456789abcdef', b'BZh91AY&SY\x00\xff')
+    assert store.get('0123456789abcdef') == b'BZh91AY&SY\x00\xff'
+    assert store.get('fedcba9876543210') is None
+
+
+def test_get_record_store(request, tmpdir, settings):
+    """
+    The record store is configured with the `RECORD_STORE` setting.
+    """
+    assert recordstore.get_record_store() is None
+
+    request.addfinalizer(lambda: settings.configure({'RECORD_STORE': None}))
+    settings.configure({'RECORD_STORE': unicode(tmpdir)})
+    store = recordstore.get_record_store()
+    assert isinstance(store, recordstore.DirectoryRecordStore)
+    assert store.path == unicode(tmpdir)
+
+    settings.configure({'RECORD_STORE': 'redis://localhost'})
+    assert isinstance(recordstore.get_record_store(),
+                      recordstore.RedisRecordStore)
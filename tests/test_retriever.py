@@ -0,0 +1,209 @@
+"""
+Tests for the mutalyzer.Retriever module.
+"""
+
+
+from __future__ import unicode_literals
+
+import bz2
+import os
+
+from Bio import Entrez
+
+from mutalyzer import ncbi
+from mutalyzer import Retriever
+from mutalyzer import recordstore
+from mutalyzer.parsers import genbank
+
+from fixtures import with_references
+
+
+@with_references('AB026906.1')
+def test_loadrecord_cached(output, references):
+    """
+    Loading a record twice should use the in-memory record cache and yield
+    independent copies.
+    """
+    accession = references[0].accession
+    retriever = Retriever.GenBankRetriever(output)
+
+    record = retriever.loadrecord(accession)
+    record.geneList = []
+
+    cache = Retriever._get_record_cache()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cached_record = retriever.loadrecord(accession)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached_record is not record
+    assert cached_record.id == accession
+    assert len(cached_record.geneList) == 1
+
+
+@with_references('AB026906.1')
+def test_loadrecord_cache_disabled(request, settings, output, references):
+    """
+    With a zero record cache size, records are not cached.
+    """
+    record_cache_size = settings.RECORD_CACHE_SIZE
+    request.addfinalizer(lambda: settings.configure(
+        {'RECORD_CACHE_SIZE': record_cache_size}))
+    settings.configure({'RECORD_CACHE_SIZE': 0})
+    accession = references[0].accession
+    retriever = Retriever.GenBankRetriever(output)
+
+    retriever.loadrecord(accession)
+    retriever.loadrecord(accession)
+
+    cache = Retriever._get_record_cache()
+    assert len(cache) == 0
+    assert cache.misses == 2
+
+
+@with_references('AB026906.1')
+def test_loadrecord_parsed_record(monkeypatch, settings, output, references):
+    """
+    Loading a record stores the parsed record, which is used on subsequent
+    loads instead of parsing the GenBank file.
+    """
+    reference = references[0]
+    retriever = Retriever.GenBankRetriever(output)
+
+    record = retriever.loadrecord(reference.accession)
+    assert os.path.isfile(Retriever.parsed_record_file(reference.accession))
+
+    def create_record(self, filename):
+        raise AssertionError('GenBank file should not be parsed')
+
+    monkeypatch.setattr(genbank.GBparser, 'create_record', create_record)
+    Retriever._get_record_cache().clear()
+
+    stored_record = retriever.loadrecord(reference.accession)
+    assert unicode(stored_record.seq) == unicode(record.seq)
+    assert ([gene.name for gene in stored_record.geneList] ==
+            [gene.name for gene in record.geneList])
+
+
+@with_references('AB026906.1')
+def test_read_parsed_record_outdated(settings, output, references):
+    """
+    A stored parsed record is not used if the checksum does not match.
+    """
+    reference = references[0]
+    retriever = Retriever.GenBankRetriever(output)
+
+    retriever.loadrecord(reference.accession)
+    assert Retriever.read_parsed_record(
+        reference.accession, reference.checksum) is not None
+    assert Retriever.read_parsed_record(
+        reference.accession, 'outdated') is None
+
+
+@with_references('NG_008939.1')
+def test_loadrecord_links_changed(monkeypatch, output, references):
+    """
+    Cached and stored parsed records are not used if their
+    transcript-protein links changed since they were parsed.
+    """
+    reference = references[0]
+    retriever = Retriever.GenBankRetriever(output)
+
+    record = retriever.loadrecord(reference.accession)
+    assert record.proteinLinks.values() == ['NP_000523']
+    transcript = record.proteinLinks.keys()[0]
+
+    parsed = []
+    create_record = genbank.GBparser.create_record
+
+    def create_record_counted(self, filename):
+        parsed.append(filename)
+        return create_record(self, filename)
+
+    monkeypatch.setattr(genbank.GBparser, 'create_record',
+                        create_record_counted)
+
+    # Checking the links of a cached record does not resolve them again.
+    transcripts_to_proteins = ncbi.transcripts_to_proteins
+
+    def transcripts_to_proteins_forbidden(*args, **kwargs):
+        raise AssertionError('links resolved')
+
+    monkeypatch.setattr(ncbi, 'transcripts_to_proteins',
+                        transcripts_to_proteins_forbidden)
+
+    retriever.loadrecord(reference.accession)
+    Retriever._get_record_cache().clear()
+    retriever.loadrecord(reference.accession)
+    assert len(parsed) == 0
+
+    monkeypatch.setattr(ncbi, 'transcripts_to_proteins',
+                        transcripts_to_proteins)
+
+    ncbi.import_links_from_gene2refseq(
+        ['9606\t1\tREVIEWED\t%s.%d\t1\tNP_999999.1\t2\n' % transcript])
+
+    record = retriever.loadrecord(reference.accession)
+    assert len(parsed) == 1
+    assert record.proteinLinks[transcript] == 'NP_999999'
+
+    Retriever._get_record_cache().clear()
+    retriever.loadrecord(reference.accession)
+    assert len(parsed) == 1
+
+
+@with_references('AB026906.1')
+def test_loadrecord_record_store(request, monkeypatch, tmpdir, settings,
+                                 output, references):
+    """
+    A record missing from the cache directory is restored from the record
+    store.
+    """
+    request.addfinalizer(lambda: settings.configure({'RECORD_STORE': None}))
+    settings.configure({'RECORD_STORE': unicode(tmpdir.mkdir('store'))})
+
+    reference = references[0]
+    retriever = Retriever.GenBankRetriever(output)
+    filename = retriever._name_to_file(reference.accession)
+
+    with open(filename, 'rb') as handle:
+        data = handle.read()
+    recordstore.get_record_store().put(reference.checksum, data)
+    os.unlink(filename)
+
+    def efetch(*args, **kwargs):
+        raise AssertionError('Record should not be fetched')
+
+    monkeypatch.setattr(Entrez, 'efetch', efetch)
+
+    record = retriever.loadrecord(reference.accession)
+    assert record.id == reference.accession
+    assert os.path.isfile(filename)
+
+
+@with_references('AB026906.1')
+def test_uploadrecord_record_store(request, tmpdir, settings, output,
+                                   references):
+    """
+    An uploaded record is written to the record store and restored from it
+    on another host.
+    """
+    request.addfinalizer(lambda: settings.configure({'RECORD_STORE': None}))
+    settings.configure({'RECORD_STORE': unicode(tmpdir.mkdir('store'))})
+
+    retriever = Retriever.GenBankRetriever(output)
+    raw_data = bz2.BZ2File(
+        retriever._name_to_file(references[0].accession)).read()
+    # Make it a different record than the one in the fixture.
+    raw_data = raw_data.replace(b'Homo sapiens', b'Homo sapiens sapiens')
+
+    ud = retriever.uploadrecord(raw_data)
+    assert ud
+
+    # Another host with an empty cache directory.
+    settings.configure({'CACHE_DIR': unicode(tmpdir.mkdir('other'))})
+    retriever = Retriever.GenBankRetriever(output)
+    assert not os.path.isfile(retriever._name_to_file(ud))
+
+    record = retriever.loadrecord(ud)
+    assert record.id == ud
+    assert not output.getMessagesWithErrorCode('ERETR')
@@ -18,6 +18,7 @@ from mutalyzer.config import settings
 from mutalyzer.db.models import BatchJob
 from mutalyzer import File
 from mutalyzer import output
+from mutalyzer import Retriever
 from mutalyzer import Scheduler
 
 from fixtures import with_references
@@ -26,9 +27,9 @@ from fixtures import with_references
 pytestmark = pytest.mark.usefixtures('db')
 
 
-def _batch_job(batch_file, expected, job_type, argument=None):
+def _batch_job(batch_file, expected, job_type, argument=None, processes=1):
     file_instance = File.File(output.Output('test'))
-    scheduler = Scheduler.Scheduler()
+    scheduler = Scheduler.Scheduler(processes=processes)
 
     job, columns = file_instance.parseBatchFile(batch_file)
     result_id = scheduler.addJob('test@test.test', job, columns,
@@ -52,9 +53,11 @@ def _batch_job(batch_file, expected, job_type, argument=None):
     assert expected == [line.strip().split('\t') for line in result]
 
 
-def _batch_job_plain_text(variants, expected, job_type, argument=None):
+def _batch_job_plain_text(variants, expected, job_type, argument=None,
+                          processes=1):
     batch_file = io.BytesIO(('\n'.join(variants) + '\n').encode('utf-8'))
-    _batch_job(batch_file, expected, job_type, argument=argument)
+    _batch_job(batch_file, expected, job_type, argument=argument,
+               processes=processes)
 
 
 def test_syntax_checker():
@@ -70,6 +73,168 @@ def test_syntax_checker():
     _batch_job_plain_text(variants, expected, 'syntax-checker')
 
 
+def test_empty_job(db):
+    """
+    Finishing a batch job without results should not create a result file.
+    """
+    batch_job = BatchJob('syntax-checker', email='test@test.test')
+    db.session.add(batch_job)
+    db.session.commit()
+    result_id = batch_job.result_id
+
+    Scheduler.Scheduler().process()
+
+    assert BatchJob.query.filter_by(result_id=result_id).count() == 0
+    assert Scheduler.get_result_file(result_id) == (None, False)
+
+
+def test_syntax_checker_processes():
+    """
+    Syntax checker batch job processed by worker processes.
+    """
+    variants = ['AB026906.1:c.%dG>T' % i if i % 3 else 'AB026906.1:c.%dG>' % i
+                for i in range(1, 51)]
+    expected = [[variant, 'OK'] if i % 3 else
+                [variant, '(grammar): Expected W:(acgt...) (at char %d), '
+                 '(line:1, col:%d)' % (len(variant), len(variant) + 1)]
+                for i, variant in enumerate(variants, 1)]
+    _batch_job_plain_text(variants, expected, 'syntax-checker', processes=2)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """
+    Fixture replacing the worker pool by a pool processing its tasks in the
+    scheduler process. It records the batch queue items of each task.
+    """
+    tasks = []
+
+    class Result(object):
+        def __init__(self, value):
+            self.value = value
+
+        def get(self):
+            return self.value
+
+    class Pool(object):
+        def __init__(self, processes, initializer=None):
+            assert processes > 1
+
+        def apply_async(self, func, args):
+            tasks.append([item for _, item, _ in args[1]])
+            return Result(func(*args))
+
+        def close(self):
+            pass
+
+        def join(self):
+            pass
+
+    monkeypatch.setattr(Scheduler.multiprocessing, 'Pool', Pool)
+    return tasks
+
+
+def test_syntax_checker_pool(request, monkeypatch, pool):
+    """
+    Syntax checker batch job items are processed by the worker pool one per
+    task, in chunks of at most `BATCH_CHUNK_SIZE` items.
+    """
+    chunk_size = settings.BATCH_CHUNK_SIZE
+    settings.configure({'BATCH_CHUNK_SIZE': 20})
+    request.addfinalizer(
+        lambda: settings.configure({'BATCH_CHUNK_SIZE': chunk_size}))
+
+    chunks = []
+    get_batch_queue_items = Scheduler.queries.get_batch_queue_items
+
+    def get_chunk(batch_job, count):
+        chunk = get_batch_queue_items(batch_job, count)
+        chunks.append(len(chunk))
+        return chunk
+
+    monkeypatch.setattr(Scheduler.queries, 'get_batch_queue_items',
+                        get_chunk)
+
+    variants = ['AB026906.1:c.%dG>T' % i for i in range(1, 51)]
+    expected = [[variant, 'OK'] for variant in variants]
+    _batch_job_plain_text(variants, expected, 'syntax-checker', processes=2)
+
+    assert pool == [[variant] for variant in variants]
+    assert chunks == [20, 20, 10, 0]
+
+
+@with_references('AB026906.1', 'NM_003002.2')
+def test_name_checker_pool(request, pool):
+    """
+    Name checker batch job items are processed by the worker pool in one
+    task per reference sequence per chunk.
+    """
+    chunk_size = settings.BATCH_CHUNK_SIZE
+    settings.configure({'BATCH_CHUNK_SIZE': 6})
+    request.addfinalizer(
+        lambda: settings.configure({'BATCH_CHUNK_SIZE': chunk_size}))
+
+    variants = ['AB026906.1:c.274G>T', 'NM_003002.2:c.274G>T'] * 4
+    batch_file = io.BytesIO(('\n'.join(variants) + '\n').encode('utf-8'))
+    file_instance = File.File(output.Output('test'))
+    scheduler = Scheduler.Scheduler(processes=2)
+    job, columns = file_instance.parseBatchFile(batch_file)
+    scheduler.addJob('test@test.test', job, columns, 'name-checker')
+    scheduler.process()
+
+    assert pool == [['AB026906.1:c.274G>T'] * 3,
+                    ['NM_003002.2:c.274G>T'] * 3,
+                    ['AB026906.1:c.274G>T'],
+                    ['NM_003002.2:c.274G>T']]
+
+
+def test_syntax_checker_stopped(request):
+    """
+    Stop the scheduler halfway a chunk of batch queue items and continue
+    processing the remaining items later.
+    """
+    chunk_size = settings.BATCH_CHUNK_SIZE
+    settings.configure({'BATCH_CHUNK_SIZE': 5})
+    request.addfinalizer(
+        lambda: settings.configure({'BATCH_CHUNK_SIZE': chunk_size}))
+
+    variants = ['AB026906.1:c.%dG>T' % i for i in range(1, 11)]
+    batch_file = io.BytesIO(('\n'.join(variants) + '\n').encode('utf-8'))
+
+    file_instance = File.File(output.Output('test'))
+    scheduler = Scheduler.Scheduler()
+    job, columns = file_instance.parseBatchFile(batch_file)
+    result_id = scheduler.addJob('test@test.test', job, columns,
+                                 'syntax-checker')
+    batch_job = BatchJob.query.filter_by(result_id=result_id).one()
+
+    process_item = scheduler._processItem
+
+    def stop_after_item(*args):
+        if scheduler.stopped():
+            assert False, 'processed an item after stopping'
+        result = process_item(*args)
+        if result.startswith('AB026906.1:c.3G>T'):
+            scheduler.stop()
+        return result
+
+    with patch.object(scheduler, '_processItem', side_effect=stop_after_item):
+        scheduler.process()
+
+    assert batch_job.batch_queue_items.count() == 7
+
+    Scheduler.Scheduler().process()
+    assert BatchJob.query.filter_by(result_id=result_id).count() == 0
+
+    filename = 'batch-job-%s.txt' % result_id
+    result = io.open(os.path.join(settings.CACHE_DIR, filename),
+                     encoding='utf-8')
+
+    next(result)  # Header.
+    assert [[variant, 'OK'] for variant in variants] == \
+        [line.strip().split('\t') for line in result]
+
+
 def test_snp_converter():
     """
     Simple SNP converter batch job.
@@ -211,6 +376,64 @@ def test_name_checker():
     _batch_job_plain_text(variants, expected, 'name-checker')
 
 
+@with_references('AB026906.1', 'NM_000059.3')
+def test_name_checker_grouped():
+    """
+    Name checker batch job with several entries per reference, each reference
+    is loaded once and results are in the original order.
+    """
+    variants = ['AB026906.1:c.274G>T',
+                'NM_000059.3:c.670G>T',
+                'AB026906.1:c.274G>T',
+                'NM_000059.3:c.670G>T']
+    ab026906 = ['AB026906.1:c.274G>T',
+                '(GenRecord): No mRNA field found for gene SDHD, '
+                'transcript variant 001 in record, constructing it from '
+                'CDS. Please note that descriptions exceeding CDS '
+                'boundaries are invalid.',
+                'AB026906.1',
+                'SDHD_v001',
+                'c.274G>T',
+                'g.7872G>T',
+                'c.274G>T',
+                'p.(Asp92Tyr)',
+                'SDHD_v001:c.274G>T',
+                'SDHD_v001:p.(Asp92Tyr)',
+                '',
+                '',
+                'BAA81889.1',
+                'AB026906.1(SDHD_v001):c.274G>T',
+                'AB026906.1(SDHD_i001):p.(Asp92Tyr)',
+                'CviQI,RsaI',
+                'BccI']
+    nm_000059 = ['NM_000059.3:c.670G>T',
+                 '',
+                 'NM_000059.3',
+                 'BRCA2_v001',
+                 'c.670G>T',
+                 'n.897G>T',
+                 'c.670G>T',
+                 'p.(Asp224Tyr)',
+                 'BRCA2_v001:c.670G>T',
+                 'BRCA2_v001:p.(Asp224Tyr)',
+                 '',
+                 'NM_000059.3',
+                 'NP_000050.2',
+                 'NM_000059.3(BRCA2_v001):c.670G>T',
+                 'NM_000059.3(BRCA2_i001):p.(Asp224Tyr)',
+                 '',
+                 'BspHI,CviAII,FatI,Hpy188III,NlaIII']
+    expected = [ab026906, nm_000059, ab026906, nm_000059]
+
+    loadrecord = Retriever.GenBankRetriever.loadrecord
+
+    with patch.object(Retriever.GenBankRetriever, 'loadrecord',
+                      autospec=True, side_effect=loadrecord) as mock_load:
+        _batch_job_plain_text(variants, expected, 'name-checker')
+
+    assert mock_load.call_count == 2
+
+
 def test_name_checker_altered():
     """
     Name checker job with altered entries.
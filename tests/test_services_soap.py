@@ -142,6 +142,20 @@ def test_numberconversion_gtoc_gene(api):
     assert 'NM_004019.2:c.-1542694C>T' in r.string
 
 
+@pytest.mark.usefixtures('hg19_transcript_mappings')
+def test_numberconversionbatch(api):
+    """
+    Running numberConversionBatch with valid variants should give a list of
+    converted variant names for each of them.
+    """
+    r = api('numberConversionBatch',
+            build='hg19', variants=['NC_000001.10:g.159272155del',
+                                    'NM_002001.2:c.1del'])
+    assert len(r.stringArray) == 2
+    assert 'NM_002001.2:c.1del' in r.stringArray[0].string
+    assert r.stringArray[1].string == ['NC_000001.10:g.159272155del']
+
+
 @pytest.mark.usefixtures('hg19_transcript_mappings')
 def test_numberconversion_gtoc_no_transcripts(api):
     """
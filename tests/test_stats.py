@@ -0,0 +1,50 @@
+"""
+Tests for the mutalyzer.stats module.
+"""
+
+
+from __future__ import unicode_literals
+
+from mutalyzer import stats
+from mutalyzer.redisclient import client as redis
+
+
+def test_increment_counter():
+    """
+    Increment a counter.
+    """
+    stats.increment_counter('test')
+    stats.increment_counter('test')
+    assert stats.get_totals()['test'] == 2
+
+
+def test_increment_counter_locally(monkeypatch):
+    """
+    Local counts are only added to the counters after the flush interval.
+    """
+    stats.flush_local_counts()
+
+    for _ in range(3):
+        stats.increment_counter_locally('test')
+    assert redis.get('counter:test:total') is None
+
+    monkeypatch.setattr(stats, 'LOCAL_COUNTS_INTERVAL', 0)
+    stats.increment_counter_locally('test')
+    assert stats.get_totals()['test'] == 4
+    assert len(redis.keys('counter:test:*')) == 4
+    assert all(redis.get(key) == '4' for key in redis.keys('counter:test:*'))
+
+
+def test_flush_local_counts():
+    """
+    Flushing adds all local counts to the counters.
+    """
+    stats.flush_local_counts()
+    stats.increment_counter_locally('test-a')
+    stats.increment_counter_locally('test-b')
+    stats.increment_counter_locally('test-a')
+    assert 'test-a' not in stats.get_totals()
+
+    stats.flush_local_counts()
+    totals = stats.get_totals()
+    assert (totals['test-a'], totals['test-b']) == (2, 1)
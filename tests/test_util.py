@@ -35,3 +35,52 @@ def test_out_of_frame_description(ref, var, descr, first, last_ref, last_var):
     """
     assert util.out_of_frame_description(ref, var) == (
         descr, first, last_ref, last_var)
+
+
+@pytest.mark.parametrize('s1,s2,prefix,suffix', [
+    ('abcdefg', 'abcabcdefg', 'abc', 'abcdefg'),
+    ('abcdefg', 'abcdefg', 'abcdefg', 'abcdefg'),
+    ('abcdefg', 'abcefg', 'abc', 'efg'),
+    ('abc', 'xyz', '', ''),
+    ('', 'abc', '', ''),
+    ('a' * 1000 + 'b', 'a' * 1000 + 'c', 'a' * 1000, '')])
+def test_longest_common_prefix_suffix(s1, s2, prefix, suffix):
+    """
+    Longest common prefix and suffix of two strings.
+    """
+    assert util.longest_common_prefix(s1, s2) == prefix
+    assert util.longest_common_prefix(s2, s1) == prefix
+    assert util.longest_common_suffix(s1, s2) == suffix
+    assert util.longest_common_suffix(s2, s1) == suffix
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    Least recently used entries are evicted when the cache is full.
+    """
+    cache = util.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    assert cache.put('c', 3) == 1
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
+
+
+def test_lru_cache_size_aware():
+    """
+    Entry sizes are taken into account and oversized entries are not stored.
+    """
+    cache = util.LRUCache(10, weigh=len)
+    cache.put('a', 'aaaa')
+    cache.put('b', 'bbbb')
+    assert cache.put('c', 'cccc') == 1
+    assert cache.size == 8
+    assert cache.put('d', 'd' * 11) == 0
+    assert 'd' not in cache
+    assert len(cache) == 2
+    cache.resize(4)
+    assert len(cache) == 1
+    assert cache.get('c') == 'cccc'
@@ -7,6 +7,8 @@ from __future__ import unicode_literals
 
 import pytest
 
+from mutalyzer import GenRecord
+from mutalyzer import Retriever
 from mutalyzer.variantchecker import check_variant
 
 from fixtures import with_references
@@ -17,6 +19,25 @@ from fixtures import with_references
 #   module, including a test for fetching a CONTIG RefSeq reference.
 
 
+@pytest.fixture(autouse=True)
+def differential_translation(monkeypatch):
+    """
+    Check for all tests in this module that incremental prediction of the
+    variant protein gives the same result as translating the entire variant
+    sequence.
+    """
+    translate_variant = GenRecord.ReferenceCDS.translate_variant
+
+    def checked_translate_variant(self, cds_variant, incremental=True):
+        protein = translate_variant(self, cds_variant, incremental)
+        assert unicode(protein) == unicode(
+            translate_variant(self, cds_variant, incremental=False))
+        return protein
+
+    monkeypatch.setattr(GenRecord.ReferenceCDS, 'translate_variant',
+                        checked_translate_variant)
+
+
 @pytest.fixture
 def checker(output):
     def check(description):
@@ -40,6 +61,104 @@ def test_deletion_in_frame(output, checker):
     assert output.getOutput('newProtein')
 
 
+@with_references('AL449423.14')
+def test_deletion_distant_transcript(output, checker):
+    """
+    Variant far from a transcript should not be described on it.
+    """
+    checker('AL449423.14(CDKN2A_v001):c.161_163del')
+    assert 'AL449423.14(CDKN2A_v001):c.161_163del' \
+           in output.getOutput('descriptions')
+    assert 'AL449423.14(CDKN2B_v001):c.?' \
+           in output.getOutput('descriptions')
+    assert 'AL449423.14(CDKN2B_i001):p.?' \
+           in output.getOutput('protDescriptions')
+
+
+@with_references('AL449423.14')
+def test_deletion_all_transcripts(request, settings, output, checker):
+    """
+    Variant should be described on all transcripts if there is no transcript
+    flank.
+    """
+    flank = settings.TRANSCRIPT_FLANK
+    settings.configure({'TRANSCRIPT_FLANK': None})
+    request.addfinalizer(
+        lambda: settings.configure({'TRANSCRIPT_FLANK': flank}))
+
+    checker('AL449423.14(CDKN2A_v001):c.161_163del')
+    assert 'AL449423.14(CDKN2A_v001):c.161_163del' \
+           in output.getOutput('descriptions')
+    assert 'AL449423.14(CDKN2B_v001):c.*34789_*34791del' \
+           in output.getOutput('descriptions')
+
+
+@with_references('AL449423.14')
+def test_overlapping_transcripts_record_order(output, references):
+    """
+    Transcripts overlapping a range should be in the order of the record, not
+    by position.
+    """
+    record = GenRecord.GenRecord(output)
+    record.record = Retriever.GenBankRetriever(output).loadrecord(
+        references[0].accession)
+    record.checkRecord()
+
+    transcripts = [(gene, transcript)
+                   for gene in record.record.geneList
+                   for transcript in gene.transcriptList if transcript.CM]
+    assert transcripts[0][0].name != 'MTAP'
+    assert record.record.overlapping_transcripts(1, 100000) == transcripts
+    assert record.record.overlapping_transcripts(21000, 21100) == [
+        (gene, transcript) for gene, transcript in transcripts
+        if gene.name == 'MTAP']
+
+
+@with_references('AL449423.14')
+def test_allele_distant_transcripts(output, checker):
+    """
+    Transcripts near any of the variants in an allele should be described
+    with all variants.
+    """
+    checker('AL449423.14:g.[61937_61939del;97000del]')
+    assert 'AL449423.14(CDKN2A_v001):c.[161_163del;-31432del]' \
+           in output.getOutput('descriptions')
+    assert 'AL449423.14(CDKN2B_v001):c.[*34789_*34791del;157-12del]' \
+           in output.getOutput('descriptions')
+
+
+@with_references('AL449423.14')
+def test_reference_cds_cache(output, checker):
+    """
+    Reference CDS and protein should be shared between checks.
+    """
+    checker('AL449423.14(CDKN2A_v001):c.161_163del')
+    cache = GenRecord._get_cds_cache()
+    misses = cache.misses
+    hits = cache.hits
+    checker('AL449423.14(CDKN2A_v001):c.161_162insATC')
+    assert cache.misses == misses
+    assert cache.hits > hits
+    assert 'AL449423.14(CDKN2A_i001):p.(Met54delinsIleSer)' \
+           in output.getOutput('protDescriptions')
+
+
+@with_references('AL449423.14')
+def test_reference_cds_cache_disabled(request, settings, output, checker):
+    """
+    Protein prediction without reference CDS cache.
+    """
+    cache_size = settings.CDS_CACHE_SIZE
+    settings.configure({'CDS_CACHE_SIZE': 0})
+    request.addfinalizer(
+        lambda: settings.configure({'CDS_CACHE_SIZE': cache_size}))
+
+    checker('AL449423.14(CDKN2A_v001):c.161_163del')
+    assert GenRecord._get_cds_cache().size == 0
+    assert 'AL449423.14(CDKN2A_i001):p.(Met54_Gly55delinsSer)' \
+           in output.getOutput('protDescriptions')
+
+
 @with_references('AL449423.14')
 def test_insertion_in_frame(output, checker):
     """
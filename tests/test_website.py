@@ -6,6 +6,7 @@ Tests for the mutalyzer.website module.
 from __future__ import unicode_literals
 
 import bz2
+import gzip
 from mock import patch
 import os
 from io import BytesIO
@@ -523,6 +524,41 @@ def test_batch_syntaxchecker(website):
            header='Input\tStatus')
 
 
+@pytest.mark.usefixtures('db')
+def test_batch_syntaxchecker_gzip(request, settings, website):
+    """
+    Submit the batch syntax checker form and download the gzip compressed
+    result.
+    """
+    gzip_results = settings.BATCH_RESULTS_GZIP
+    settings.configure({'BATCH_RESULTS_GZIP': True})
+    request.addfinalizer(
+        lambda: settings.configure({'BATCH_RESULTS_GZIP': gzip_results}))
+
+    variants = ['AB026906.1(SDHD):g.7872G>T',
+                'NM_003002.1:c.3_4insG',
+                'AL449423.14(CDKN2A_v002):c.5_400del']
+    data = _batch(website,
+                  'syntax-checker',
+                  file='\n'.join(variants),
+                  size=len(variants),
+                  header='Input\tStatus')
+
+    filenames = [filename for filename in os.listdir(settings.CACHE_DIR)
+                 if filename.startswith('batch-job-')]
+    assert len(filenames) == 1 and filenames[0].endswith('.txt.gz')
+
+    result_url = '/batch-job-result/' + filenames[0][:-len('.gz')]
+
+    r = website.get(result_url, headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert gzip.GzipFile(fileobj=BytesIO(r.data)).read() == data
+
+    r = website.get(result_url)
+    assert 'Content-Encoding' not in r.headers
+    assert r.data == data
+
+
 @pytest.mark.usefixtures('hg19')
 def test_batch_positionconverter(website):
     """